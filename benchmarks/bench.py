@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+offline benchmarks for modelgen's text, naming and rewrite hot paths
+
+usage (from the repository root):
+
+    PYTHONPATH=src python benchmarks/bench.py --output bench.json
+    PYTHONPATH=src python benchmarks/bench.py --baseline bench.json
+
+everything runs from the checked-in fixtures; the documentation page is served to
+the real HTTPCache through a stubbed requests transport adapter, so no network
+access is needed
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess  # nosec: considered
+import sys
+import tempfile
+import timeit
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import libcst as cst
+import requests
+from requests.adapters import BaseAdapter
+
+from modelgen.cache import HTTPCache
+from modelgen.config import Config
+from modelgen.datastructures import flatten
+from modelgen.manifest import tool_versions
+from modelgen.rewrite import ModelRewriter
+from modelgen.rtfm import (
+    get_omopcdm_descriptions,
+    parse_descriptions,
+    parse_descriptions_bs4,
+)
+from modelgen.utils import camel_to_snake, normalize_text, wrap_text
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DOC_URL = "https://fixtures.invalid/cdm54.html"
+
+Benchmark = Tuple[str, Callable[[], Any]]
+
+
+class FixtureAdapter(BaseAdapter):
+    """requests transport adapter which serves files from the fixtures directory"""
+
+    def send(  # pylint: disable=too-many-arguments
+        self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None
+    ):
+        path = os.path.join(FIXTURES_DIR, os.path.basename(request.path_url))
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        try:
+            with open(path, "rb") as fh:
+                content = fh.read()
+            response.status_code = 200
+        except FileNotFoundError:
+            content = b""
+            response.status_code = 404
+        response.raw = _BytesRaw(content)
+        response.headers["Content-Length"] = str(len(content))
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class _BytesRaw:
+    """the minimal urllib3-response interface used by Response.iter_content"""
+
+    def __init__(self, content: bytes) -> None:
+        self.content = content
+
+    def stream(self, chunk_size: int, decode_content: bool = True):
+        """yield the content in chunks"""
+        del decode_content  # the fixtures are served without a content-encoding
+        for offset in range(0, len(self.content), chunk_size):
+            yield self.content[offset : offset + chunk_size]
+
+    def release_conn(self) -> None:
+        """nothing to release"""
+
+    def close(self) -> None:
+        """nothing to close"""
+
+
+def stub_cache(cache_dir: str) -> HTTPCache:
+    """return an HTTPCache in the given dir which downloads from the fixtures"""
+    cache = HTTPCache(cache_dir)
+    cache.session.mount("https://", FixtureAdapter())
+    cache.session.mount("http://", FixtureAdapter())
+    return cache
+
+
+def fixture_table_names() -> List[str]:
+    """return the table names documented in the cdm54 fixture"""
+    with open(os.path.join(FIXTURES_DIR, "cdm54.html"), "rt", encoding="utf8") as fh:
+        return re.findall(r"<h3>(\w+)</h3>", fh.read())
+
+
+def synthetic_model(table_names: Sequence[str], columns: int = 18) -> str:
+    """
+    return a sqlacodegen-style declarative model with one class per table name;
+    each table has an integer primary key, a mix of column types, foreign keys to
+    concept (with relationships on both sides) and an index
+    """
+    lines = [
+        "from typing import Optional",
+        "import datetime",
+        "",
+        "from sqlalchemy import Date, DateTime, ForeignKeyConstraint, Index, "
+        "Integer, PrimaryKeyConstraint, String",
+        "from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, "
+        "relationship",
+        "",
+        "class Base(DeclarativeBase):",
+        "    pass",
+        "",
+    ]
+    types = (
+        ("int", "Integer"),
+        ("str", "String(50)"),
+        ("datetime.date", "Date"),
+        ("datetime.datetime", "DateTime"),
+    )
+    back_refs: List[str] = []
+    for table in table_names:
+        class_name = "".join(part.title() for part in table.split("_"))
+        concept_columns = [f"{table}_type{i}_concept_id" for i in range(3)]
+        lines += [
+            "",
+            f"class {class_name}(Base):",
+            f"    __tablename__ = '{table}'",
+            "    __table_args__ = (",
+            *(
+                f"        ForeignKeyConstraint(['{column}'], ['concept.concept_id'], "
+                f"name='fpk_{table}_{column}'),"
+                for column in concept_columns
+            ),
+            f"        PrimaryKeyConstraint('{table}_id', name='xpk_{table}'),",
+            f"        Index('idx_{table}_id', '{table}_id'),",
+            "    )",
+            "",
+            f"    {table}_id: Mapped[int] = mapped_column(Integer, primary_key=True)",
+            *(
+                f"    {column}: Mapped[int] = mapped_column(Integer)"
+                for column in concept_columns
+            ),
+        ]
+        for i in range(columns - len(concept_columns) - 1):
+            annotation, sa_type = types[i % len(types)]
+            lines.append(
+                f"    {table}_value{i}: Mapped[Optional[{annotation}]] = "
+                f"mapped_column({sa_type})"
+            )
+        lines.append("")
+        for column in concept_columns:
+            name = column.removesuffix("_id")
+            back_ref = f"{table}_{name}"
+            lines.append(
+                f"    {name}: Mapped['Concept'] = relationship('Concept', "
+                f"foreign_keys=[{column}], back_populates='{back_ref}')"
+            )
+            back_refs.append(
+                f"    {back_ref}: Mapped[list['{class_name}']] = relationship("
+                f"'{class_name}', foreign_keys='[{class_name}.{column}]', "
+                f"back_populates='{name}')"
+            )
+    lines += ["", "class Concept(Base):", "    __tablename__ = 'concept'", ""]
+    lines += ["    concept_id: Mapped[int] = mapped_column(Integer, primary_key=True)"]
+    lines += ["", *back_refs, ""]
+    return "\n".join(lines)
+
+
+def python_command(*args: str) -> Callable[[], Any]:
+    """return a callable which runs a fresh python interpreter with the given args"""
+    command = [sys.executable, *args]
+    return lambda: subprocess.run(command, check=True)  # nosec: considered
+
+
+def benchmarks(cache_dir: str) -> List[Benchmark]:
+    """return the (name, callable) pairs to time"""
+    text = (
+        "The \u201cPERSON\u201d table contains records that uniquely identify "
+        "each person or patient \u2013 and some demographic information.\u200b\u00a0"
+    ) * 40
+    paragraphs = "\n\n".join([text] * 5)
+    class_names = [
+        "".join(part.title() for part in name.split("_"))
+        for name in fixture_table_names()
+    ] + ["HTTPCache", "CDMSource", "CdmSource", "ConceptClass"]
+    deep: Any = list(range(10))
+    for _ in range(200):
+        deep = [deep, list(range(5)), "leaf"]
+    wide = [[[i, [i, str(i)]] for i in range(100)] for _ in range(20)]
+
+    with open(os.path.join(FIXTURES_DIR, "cdm54.html"), "rb") as fh:
+        page = fh.read()
+
+    cache = stub_cache(cache_dir)
+    get_omopcdm_descriptions(DOC_URL, cache)  # populate the cache
+
+    table_names = [name for name in fixture_table_names() if name != "concept"]
+    model = synthetic_model(table_names)
+    config = Config(
+        cli_args=["--cache-dir", cache_dir, "--offline", "--base-doc-url", DOC_URL]
+    )
+    rewriter = ModelRewriter(config)
+    tree = cst.parse_module(model)
+
+    return [
+        ("utils.normalize_text", lambda: normalize_text(text)),
+        ("utils.wrap_text", lambda: wrap_text(paragraphs)),
+        ("utils.camel_to_snake", lambda: [camel_to_snake(n) for n in class_names]),
+        ("datastructures.flatten.deep", lambda: list(flatten(deep))),
+        ("datastructures.flatten.wide", lambda: list(flatten(wide))),
+        ("rtfm.parse_descriptions", lambda: parse_descriptions(page)),
+        ("rtfm.parse_descriptions_bs4", lambda: parse_descriptions_bs4(page)),
+        (
+            "rtfm.get_omopcdm_descriptions",
+            lambda: get_omopcdm_descriptions(DOC_URL, cache),
+        ),
+        ("rewrite.ModelRewriter.init", lambda: ModelRewriter(config)),
+        ("rewrite.parse", lambda: cst.parse_module(model)),
+        ("rewrite.visit", lambda: tree.visit(rewriter).code),
+        # the cost of starting the CLI is the difference between these two
+        ("cli.python_startup", python_command("-c", "pass")),
+        ("cli.import", python_command("-c", "import modelgen.__main__")),
+    ]
+
+
+def measure(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    """time the given callable, returning per-call statistics in seconds"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    tolerance: float,
+) -> List[str]:
+    """
+    print a comparison of the results with the baseline, returning the names of
+    the benchmarks whose median regressed by more than the given tolerance
+    """
+    regressions: List[str] = []
+    print(f"{'benchmark':40} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:40} {'-':>12} {result['median']:12.6f} {'new':>7}")
+            continue
+        ratio = result["median"] / baseline[name]["median"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = " REGRESSION"
+        print(
+            f"{name:40} {baseline[name]['median']:12.6f} "
+            f"{result['median']:12.6f} {ratio:7.2f}{flag}"
+        )
+    return regressions
+
+
+def main() -> int:
+    """entrypoint"""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--output", help="write the results as json to this path (default: stdout)"
+    )
+    parser.add_argument(
+        "--baseline", help="compare the results with this stored results file"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="fractional slowdown of a median which counts as a regression",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="approximate number of seconds each timing run should take",
+    )
+    parser.add_argument(
+        "--filter", default="", help="only run benchmarks whose name contains this"
+    )
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory(prefix="modelgen-bench-") as cache_dir:
+        for name, func in benchmarks(cache_dir):
+            if args.filter in name:
+                results[name] = measure(func, args.repeat, args.min_time)
+                print(f"{name}: {results[name]['median']:.6f}s", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "tools": tool_versions("libcst", "beautifulsoup4", "requests"),
+        "benchmarks": results,
+    }
+    if args.output:
+        with open(args.output, "wt", encoding="utf8") as fh:
+            json.dump(report, fh, indent=2)
+    elif not args.baseline:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "rt", encoding="utf8") as fh:
+            baseline = json.load(fh)["benchmarks"]
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,11 @@
 #!/usr/bin/env python3
 """ entrypoint for direct execution """
 import sys
-import time
 
 import baselog
 
 from .config import Config
-from .dbinit import initdb
-from .rewrite import rename_base_and_add_docstrings
-from .shellout import black, isort, sqlacodegen
+from .pipeline import run, steps_for
 
 
 def main() -> int:
@@ -23,21 +20,13 @@ def main() -> int:
     )
     config.logcfg(logger)
 
-    for i, step in enumerate(
-        (
-            initdb,
-            sqlacodegen,
-            rename_base_and_add_docstrings,
-            isort,
-            black,
-        )
-    ):
-        step_num = i + 1
-        logger.info("step %s; %s", step_num, step.__name__)
-        dur = time.time()
-        step(config)
-        dur = time.time() - dur
-        logger.debug("step %s; %s done in %ss", step_num, step.__name__, dur)
+    if config.targets:
+        # pylint: disable=import-outside-toplevel
+        from .matrix import build_matrix
+
+        return build_matrix(config)
+
+    run(config, steps_for(config))
 
     return 0
 
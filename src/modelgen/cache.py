@@ -0,0 +1,245 @@
+"""persistent on-disk cache for the remote files modelgen downloads"""
+
+import contextvars
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Optional, TypeVar
+
+from .config import Config
+from .profiling import span
+from .utils import atomic_write
+
+if TYPE_CHECKING:
+    # importing requests is slow, it's only loaded when something is downloaded
+    import requests
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# the type of the names given to the urls retrieved together by get_many
+Name = TypeVar("Name", bound=str)
+
+# entries validated at or after this time were validated by this process, they are
+# considered fresh for the rest of the run regardless of their max age
+PROCESS_START = time.time()
+
+
+def sha256_hex(data: bytes) -> str:
+    """return the hex-encoded sha256 digest of the given bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class HTTPCache:
+    """
+    content-addressed cache of HTTP GET responses; each response body is stored once
+    under its sha256 digest in "objects/" and each URL has a small json entry in
+    "urls/" recording which object it currently resolves to along with the
+    validators (ETag, Last-Modified) needed to cheaply revalidate it
+    """
+
+    cache_dir: str
+    offline: bool
+    max_age: int
+    retries: int
+    timings: Dict[str, float]
+
+    # seconds to wait for the server, and the number of pooled connections per host
+    timeout: int = 300
+    pool_size: int = 8
+
+    def __init__(
+        self,
+        cache_dir: str,
+        offline: bool = False,
+        max_age: int = 0,
+        retries: int = 3,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.max_age = max_age
+        self.retries = retries
+        self.timings = {}
+
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "urls"), exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: Config) -> "HTTPCache":
+        """return a cache instance using the settings from the given config"""
+        return cls(
+            config.cache_dir,
+            offline=config.offline,
+            max_age=config.cache_max_age,
+            retries=config.http_retries,
+        )
+
+    @functools.cached_property
+    def session(self) -> "requests.Session":
+        """the keep-alive session used for every request made through this cache"""
+        # pylint: disable=import-outside-toplevel
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        session = requests.Session()
+        session.headers["Accept-Encoding"] = "gzip, deflate"
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=Retry(
+                total=self.retries,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+            ),
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def object_path(self, digest: str) -> str:
+        """return the path at which the object with the given digest is stored"""
+        return os.path.join(self.cache_dir, "objects", digest)
+
+    def entry_path(self, url: str) -> str:
+        """return the path of the json entry for the given url"""
+        return os.path.join(
+            self.cache_dir, "urls", sha256_hex(url.encode("utf8")) + ".json"
+        )
+
+    def read_entry(self, url: str) -> Optional[Dict[str, Any]]:
+        """return the cache entry for the given url, if it (and its object) exist"""
+        try:
+            with open(self.entry_path(url), "rt", encoding="utf8") as fh:
+                entry = json.load(fh)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if entry.get("url") != url or not os.path.isfile(
+            self.object_path(entry["sha256"])
+        ):
+            return None
+        return entry
+
+    def write_entry(self, url: str, entry: Dict[str, Any]) -> None:
+        """atomically write the cache entry for the given url"""
+        atomic_write(self.entry_path(url), json.dumps(entry, indent=2))
+
+    def read_object(self, digest: str) -> bytes:
+        """return the contents of the object with the given digest"""
+        with open(self.object_path(digest), "rb") as fh:
+            return fh.read()
+
+    def put_object(self, data: bytes) -> str:
+        """store the given data in the object store, returning its digest"""
+        digest = sha256_hex(data)
+        if not os.path.isfile(self.object_path(digest)):
+            atomic_write(self.object_path(digest), data)
+        return digest
+
+    def has_object(self, digest: str) -> bool:
+        """return True if the object with the given digest is in the store"""
+        return os.path.isfile(self.object_path(digest))
+
+    def get(self, url: str) -> bytes:
+        """
+        return the body of the given url, from the cache when possible; stale
+        entries are revalidated with a conditional request
+        """
+        entry = self.read_entry(url)
+        if self.offline:
+            if entry is None:
+                raise ValueError(f"offline mode: no cached copy of {url}")
+            logger.debug("offline mode: using cached copy of %s", url)
+            return self.read_object(entry["sha256"])
+        if entry is not None and (
+            entry["validated"] >= PROCESS_START
+            or time.time() - entry["validated"] < self.max_age
+        ):
+            logger.debug("using fresh cached copy of %s", url)
+            return self.read_object(entry["sha256"])
+
+        headers: Dict[str, str] = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        logger.debug("requesting %s", url)
+        with self.session.get(
+            url, headers=headers, timeout=self.timeout, stream=True
+        ) as response:
+            if response.status_code == 304 and entry is not None:
+                logger.debug("cached copy of %s is still valid", url)
+                entry["validated"] = time.time()
+                self.write_entry(url, entry)
+                return self.read_object(entry["sha256"])
+            if response.status_code != 200:
+                raise ValueError(
+                    f"failed to retrieve {url}; status code: {response.status_code}"
+                )
+            digest = self._store(response)
+            self.write_entry(
+                url,
+                {
+                    "url": url,
+                    "sha256": digest,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "validated": time.time(),
+                },
+            )
+        return self.read_object(digest)
+
+    def get_many(self, urls: Mapping[Name, str]) -> Dict[Name, bytes]:
+        """
+        concurrently retrieve the given {name: url} mapping, returning a
+        {name: body} mapping; the time taken for each one is recorded in timings
+        """
+
+        def timed_get(name: Name) -> bytes:
+            with span(f"fetch {name}", url=urls[name]) as current:
+                try:
+                    return self.get(urls[name])
+                finally:
+                    self.timings[name] = time.perf_counter() - current.start
+                    logger.debug("fetched %s in %ss", name, self.timings[name])
+
+        _ = self.session  # created once, before the worker threads share it
+        with ThreadPoolExecutor(max_workers=max(1, len(urls))) as pool:
+            futures = {
+                name: pool.submit(contextvars.copy_context().run, timed_get, name)
+                for name in urls
+            }
+            return {name: future.result() for name, future in futures.items()}
+
+    def _store(self, response: "requests.Response") -> str:
+        """
+        stream the response body into the object store, returning its digest; the
+        body is written to a temporary file first so that concurrent runs sharing
+        the cache never observe a partially-written object
+        """
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.join(self.cache_dir, "objects"), prefix=".tmp-"
+        )
+        try:
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    hasher.update(chunk)
+                    fh.write(chunk)
+            digest = hasher.hexdigest()
+            os.replace(tmp_path, self.object_path(digest))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logger.debug("stored %s as object %s", response.url, digest)
+        return digest
@@ -0,0 +1,109 @@
+"""generate the model source in-process with sqlacodegen's generator API"""
+
+import logging
+from importlib.metadata import entry_points
+from typing import TYPE_CHECKING, List, Optional, Type
+
+from sqlalchemy import Engine, MetaData, create_engine, inspect
+
+from .config import Config
+from .dbinit import DDLReference, get_engine
+from .ddlparse import metadata_from_ddl
+from .profiling import span
+
+if TYPE_CHECKING:
+    # importing sqlacodegen is slow, it's only loaded when a generator is needed
+    from sqlacodegen.generators import CodeGenerator
+
+logger = logging.getLogger(__name__)
+
+
+def cdm_schema_name(
+    config: Config, default_schema: Optional[str] = "public"
+) -> Optional[str]:
+    """
+    return the schema name to use for the generated tables; the database's default
+    schema is given as None so the output doesn't carry a schema argument
+    """
+    return None if config.cdm_schema == default_schema else config.cdm_schema
+
+
+def generator_class(config: Config) -> Type["CodeGenerator"]:
+    """return the sqlacodegen generator class selected in the config"""
+    generators = {ep.name: ep for ep in entry_points(group="sqlacodegen.generators")}
+    name = config.generator or "declarative"
+    if name not in generators:
+        raise ValueError(
+            f"unknown sqlacodegen generator {name}; "
+            f"available generators: {', '.join(sorted(generators))}"
+        )
+    return generators[name].load()
+
+
+def generator_options(config: Config) -> List[str]:
+    """return the sqlacodegen generator options given in the config"""
+    return config.options.split(",") if config.options else []
+
+
+def ddl_metadata(config: Config) -> MetaData:
+    """
+    return a MetaData object built by parsing the reference DDL files (and the
+    edenceHealth modifications and overlays) instead of reflecting a populated
+    database
+    """
+    reference = DDLReference(config)
+    reference.download_ddl()
+    return metadata_from_ddl(reference.all_statements(), schema=cdm_schema_name(config))
+
+
+def generator_bind(config: Config) -> Engine:
+    """return the bind the generator consults for the dialect"""
+    if config.metadata_source == "ddl":
+        # the generator only uses its bind to consult the dialect; creating an
+        # engine doesn't connect to anything
+        return create_engine("postgresql+psycopg2://")
+    return get_engine(config)
+
+
+def load_metadata(config: Config) -> MetaData:
+    """
+    return the schema's metadata, reflected from the database (over the shared
+    engine) or parsed from the DDL, depending on config.metadata_source
+    """
+    if config.metadata_source == "ddl":
+        with span("parse ddl"):
+            return ddl_metadata(config)
+
+    engine = get_engine(config)
+    metadata = MetaData()
+    generator = generator_class(config)(metadata, engine, generator_options(config))
+    with span("reflect"), engine.connect() as cnxn:
+        schema = cdm_schema_name(config, inspect(cnxn).default_schema_name)
+        # MetaData.reflect uses the batched Inspector.get_multi_* methods, so the
+        # whole schema is read with a handful of catalog queries
+        metadata.reflect(cnxn, schema=schema, views=generator.views_supported)
+    logger.info("reflected %s tables", len(metadata.tables))
+    return metadata
+
+
+def render_model(config: Config, metadata: MetaData) -> str:
+    """return the model source sqlacodegen generates for the given metadata"""
+    generator = generator_class(config)(
+        metadata, generator_bind(config), generator_options(config)
+    )
+    with span("generate"):
+        return generator.generate()
+
+
+def generate_model(config: Config) -> str:
+    """
+    return the model source generated from the database or from the parsed DDL,
+    depending on config.metadata_source
+    """
+    return render_model(config, load_metadata(config))
+
+
+# pylint: disable-next=unused-argument
+def sqlacodegen(config: Config, source: str) -> str:
+    """generate the model source with sqlacodegen"""
+    return generate_model(config)
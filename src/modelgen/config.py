@@ -1,7 +1,7 @@
 """declarative config"""
 
 # pylint: disable=too-few-public-methods
-from typing import Optional
+from typing import List, Optional
 
 from basecfg import BaseCfg, opt
 
@@ -20,6 +20,15 @@ class Config(BaseCfg):
         doc="the level of verbosity to use when writing to the console",
     )
 
+    profile: bool = opt(
+        default=False,
+        doc="write a cProfile of each pipeline step to the log dir",
+    )
+    trace_memory: bool = opt(
+        default=False,
+        doc="record the peak memory allocated by each step (using tracemalloc)",
+    )
+
     db_dbms: str = opt(
         default="postgresql",
         doc=(
@@ -47,7 +56,48 @@ class Config(BaseCfg):
         "postgres",
         doc="",
     )
+    db_workers: int = opt(
+        default=4,
+        doc=(
+            "number of pooled database connections used to build the indices "
+            "concurrently when initializing the database"
+        ),
+    )
+    db_template: bool = opt(
+        default=False,
+        doc=(
+            "keep the populated CDM schema in a template database on the server "
+            "(named after the schema's fingerprint) and clone the databases of "
+            "matrix targets from it instead of replaying the DDL"
+        ),
+    )
+    overlays: List[str] = opt(
+        default=[],
+        doc=(
+            "SQL packs to apply after the edenceHealth modifications, in order "
+            "(repeatable): the name of a bundled pack (performance), a .sql file "
+            "or a directory whose .sql files are applied in name order; "
+            "@cdmDatabaseSchema is replaced with the CDM schema"
+        ),
+    )
+    partition_by: List[str] = opt(
+        default=[],
+        doc=(
+            'partition a table, as "table:STRATEGY (columns)" (repeatable), e.g. '
+            '"measurement:RANGE (measurement_date)"; the partition key columns '
+            "are added to the table's primary key, as postgresql requires"
+        ),
+    )
 
+    metadata_source: str = opt(
+        default="database",
+        choices=("database", "ddl"),
+        doc=(
+            "where the schema given to sqlacodegen comes from; either reflected "
+            'from the populated database server or parsed from the DDL ("ddl" '
+            "needs no database server)"
+        ),
+    )
     options: Optional[str] = opt(
         default=None,
         doc="options to pass to sqlacodegen",
@@ -56,11 +106,143 @@ class Config(BaseCfg):
         default=None,
         doc="which sqlacodegen generator to use",
     )
+    lazy_policy: str = opt(
+        default="generated",
+        choices=("generated", "cdm"),
+        doc=(
+            "the loading strategy of the model's relationships: as generated "
+            '(lazy="select"), or "cdm": selectin for references to the vocabulary '
+            "and health system lookup tables and raise for everything else"
+        ),
+    )
+    lazy_loading: List[str] = opt(
+        default=[],
+        doc=(
+            'set the loading strategy of relationships, as "table:strategy" (the '
+            'relationships referring to the table), "table.relationship:strategy" '
+            'or "*:strategy" (those not set by name or table) (repeatable); these '
+            "take precedence over lazy_policy"
+        ),
+    )
 
     output_file: str = opt(
         "model.py",
         doc="full path at which the output file should be written",
     )
+    output_layout: str = opt(
+        default="module",
+        choices=("module", "package"),
+        doc=(
+            'write the model as a single module ("module", at output_file) or as '
+            'a package ("package", in a directory named after output_file without '
+            "its .py extension) with one module per table which is imported on "
+            "first access"
+        ),
+    )
+    incremental: bool = opt(
+        default=False,
+        doc=(
+            "only regenerate the classes of the tables whose DDL or description "
+            "changed since the previous run, splicing them into the existing "
+            "model module (which is otherwise left as it is)"
+        ),
+    )
+    lookup_registry: bool = opt(
+        default=False,
+        doc=(
+            "append precomputed lookups to the model: the class of each table, "
+            "the ordered column names of each class, and the primary key and "
+            "concept columns of each table (module output layout only)"
+        ),
+    )
+    async_model: bool = opt(
+        default=False,
+        doc=(
+            "mix AsyncAttrs into the base class, for awaitable attribute loading "
+            "under AsyncSession, and write a module of asyncio engine and session "
+            "factories next to the model (named after output_file with a _session "
+            "suffix)"
+        ),
+    )
+    async_pool_size: int = opt(
+        default=10,
+        doc="default number of connections kept open by the async engine's pool",
+    )
+    async_max_overflow: int = opt(
+        default=20,
+        doc=(
+            "default number of connections the async engine's pool may open beyond "
+            "async_pool_size under load"
+        ),
+    )
+    bulk_loader: bool = opt(
+        default=False,
+        doc=(
+            "also write a module of COPY-based bulk load helpers, one per table, "
+            "next to the model (named after output_file with a _load suffix)"
+        ),
+    )
+    row_types: bool = opt(
+        default=False,
+        doc=(
+            "also write a module of read-only row types (a NamedTuple per table "
+            "class) and a helper which builds them from Core results next to the "
+            "model (named after output_file with a _rows suffix)"
+        ),
+    )
+    verify: bool = opt(
+        default=False,
+        doc=(
+            "after writing the model, import it and check its tables against the "
+            "database schema (columns, types, keys and indexes), writing the "
+            "differences to verify.json in the log dir and failing if there are any"
+        ),
+    )
+    benchmark_import: bool = opt(
+        default=False,
+        doc=(
+            "after writing the model, import it in fresh python subprocesses and "
+            "write its import time, -X importtime breakdown, peak RSS and "
+            "configure_mappers() time to import_benchmark.json in the log dir"
+        ),
+    )
+    import_time_budget: float = opt(
+        default=0.0,
+        doc="fail if importing and configuring the model takes longer (seconds)",
+    )
+    import_rss_budget: int = opt(
+        default=0,
+        doc="fail if the peak RSS of the model's import exceeds this (MiB)",
+    )
+    import_baseline: Optional[str] = opt(
+        default=None,
+        doc=(
+            "import_benchmark.json of an earlier run to compare the import time "
+            "and peak RSS against"
+        ),
+    )
+    import_tolerance: float = opt(
+        default=0.25,
+        doc="fraction by which the import may exceed the baseline before failing",
+    )
+    steps: List[str] = opt(
+        default=[],
+        doc=(
+            "only run these pipeline steps (by name, repeatable); the steps which "
+            "are not run use the output they recorded in the previous run"
+        ),
+    )
+    skip: List[str] = opt(
+        default=[],
+        doc="don't run these pipeline steps (by name, repeatable)",
+    )
+    force: bool = opt(
+        default=False,
+        doc=(
+            "run every step, even those whose inputs are unchanged since the "
+            "previous run (as recorded in the manifest next to the output file)"
+        ),
+    )
 
     base_doc_url: str = opt(
         default="https://ohdsi.github.io/CommonDataModel/cdm54.html",
@@ -76,10 +258,36 @@ class Config(BaseCfg):
         ),
         doc="URL template from which the official DDL files should be downloaded from",
     )
+    cache_dir: str = opt(
+        default="/cache",
+        doc="directory in which downloaded DDL files and documentation are cached",
+    )
+    cache_max_age: int = opt(
+        default=3600,
+        doc=(
+            "number of seconds a cached download is used as-is before it is "
+            "revalidated with the server"
+        ),
+    )
+    http_retries: int = opt(
+        default=3,
+        doc="number of times a failed download is retried (with backoff)",
+    )
+    offline: bool = opt(
+        default=False,
+        doc="never use the network; fail if a required download is not cached",
+    )
     base_class_name: str = opt(
         default="OMOPCDMModelBase",
         doc="the name of the base class which the models are all subclasses of",
     )
+    metadata_name: str = opt(
+        default="omopcdm_metadata",
+        doc=(
+            "the name of the MetaData object in the Core tables output "
+            "(--generator tables)"
+        ),
+    )
     base_class_desc: str = opt(
         default="Base for OMOP Common Data Model v5.4 Models",
         doc="the description used for the base class",
@@ -93,3 +301,16 @@ class Config(BaseCfg):
         default="public",
         doc="the name of the OMOP CDM schema within the database on the server",
     )
+
+    targets: List[str] = opt(
+        default=[],
+        doc=(
+            'build several "cdm_version:dialect" targets (e.g. v5.4.1:postgresql) '
+            "in one run, each in its own scratch database and output directory; "
+            "only the postgresql dialect is supported"
+        ),
+    )
+    jobs: int = opt(
+        default=1,
+        doc="number of targets which are built in parallel",
+    )
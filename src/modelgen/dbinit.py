@@ -1,17 +1,36 @@
-""" code for initializing the database from the reference DDL """
+"""code for initializing the database from the reference DDL"""
 
 # pylint: disable=too-many-instance-attributes
+import contextlib
+import contextvars
+import copy
+import functools
 import importlib
 import logging
-from typing import Dict, Literal, Sequence, TypeAlias
+import os
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Literal, Optional, Sequence, Tuple, TypeAlias
 
-import requests
-from sqlalchemy import Engine, create_engine, schema, text
+from sqlalchemy import Connection, Engine, create_engine, schema, text
+from sqlalchemy.exc import DBAPIError
 
+from .cache import HTTPCache, sha256_hex
 from .config import Config
+from .ddlparse import (
+    Partition,
+    create_table_re,
+    parse_partition,
+    partitioned,
+    split_statements,
+    statement_table_re,
+    unqualified_name,
+)
+from .manifest import fingerprint
+from .profiling import span
 from .utils import semver_matcher
 
 sql_dir = importlib.resources.files("modelgen.sql")
+overlay_dir = sql_dir.joinpath("overlays")
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +49,181 @@ categories: Sequence[Category] = (
     "indices",
     "eh_mods",
 )
+# categories whose statements on different tables are independent of each other;
+# these are applied concurrently, one table per connection at a time
+concurrent_categories: Sequence[Category] = ("indices",)
+
+# prefix of the comment recording the fingerprint of a schema populated by modelgen,
+# and of its second line, which lists the tables modelgen created in the schema
+SCHEMA_MARKER = "modelgen schema fingerprint: "
+TABLES_MARKER = "modelgen tables: "
+
+
+filename_map: Dict[Category, str] = {
+    "constraints": "OMOPCDM_{dialect}_{cdm_version_short}_constraints.sql",
+    "ddl": "OMOPCDM_{dialect}_{cdm_version_short}_ddl.sql",
+    "indices": "OMOPCDM_{dialect}_{cdm_version_short}_indices.sql",
+    "primary_keys": "OMOPCDM_{dialect}_{cdm_version_short}_primary_keys.sql",
+}
+
+
+def ddl_urls(config: Config) -> Dict[Category, str]:
+    """return a dict mapping each downloaded DDL category to its URL"""
+    if match := semver_matcher.match(config.cdm_version):
+        cdm_version_short = match.group("minor")
+    else:
+        raise ValueError("unable to parse semver string")
+    return {
+        category: (config.base_ddl_url + "/" + filename).format(
+            dialect=config.db_dbms,
+            cdm_version_short=cdm_version_short,
+            cdm_version=config.cdm_version,
+        )
+        for category, filename in filename_map.items()
+    }
+
+
+def overlay_packs(config: Config) -> List[Tuple[str, str]]:
+    """
+    return the name and SQL of each overlay pack given in the config, in order;
+    a directory stands for the .sql files in it, in name order
+    """
+    packs: List[Tuple[str, str]] = []
+    for entry in config.overlays:
+        if os.path.isdir(entry):
+            paths = sorted(
+                os.path.join(entry, name)
+                for name in os.listdir(entry)
+                if name.endswith(".sql")
+            )
+            if not paths:
+                raise ValueError(f"no .sql files in overlay directory: {entry}")
+        elif os.path.isfile(entry):
+            paths = [entry]
+        elif (bundled := overlay_dir.joinpath(f"{entry}.sql")).is_file():
+            packs.append((entry, bundled.read_text()))
+            continue
+        else:
+            raise ValueError(f"overlay pack not found: {entry}")
+        for path in paths:
+            with open(path, "rt", encoding="utf8") as fh:
+                packs.append((path, fh.read()))
+    return packs
+
+
+def partitions(config: Config) -> Dict[str, Partition]:
+    """return the partitioning of each table partitioned in the config"""
+    result: Dict[str, Partition] = {}
+    for spec in config.partition_by:
+        partition = parse_partition(spec)
+        result[partition.table] = partition
+    return result
+
+
+def ddl_inputs(config: Config) -> Dict[str, Any]:
+    """the DDL content (and related settings) which determines the schema"""
+    cache = HTTPCache.from_config(config)
+    return {
+        "ddl": {
+            category: sha256_hex(cache.get(url))
+            for category, url in ddl_urls(config).items()
+        },
+        "eh_mods": sha256_hex(sql_dir.joinpath("eh_mods.sql").read_bytes()),
+        "overlays": [
+            sha256_hex(sql.encode("utf8")) for _, sql in overlay_packs(config)
+        ],
+        "partitions": [tuple(partition) for partition in partitions(config).values()],
+        "cdm_version": config.cdm_version,
+        "cdm_schema": config.cdm_schema,
+        "db_dbms": config.db_dbms,
+    }
+
+
+def schema_fingerprint(config: Config) -> str:
+    """return the fingerprint of the schema the configured DDL produces"""
+    return fingerprint(ddl_inputs(config))
+
+
+@functools.cache
+def _engine_for_url(url: str, pool_size: int = 5) -> Engine:
+    """return the (pooled) engine for the given url, creating it on first use"""
+    return create_engine(url, pool_size=pool_size)
+
+
+def get_engine(config: Config) -> Engine:
+    """
+    return the engine for the configured database server; every step of a run
+    shares the same engine (and with it the same connection pool)
+    """
+    return _engine_for_url(
+        f"postgresql+psycopg2://"
+        f"{config.db_user}:{config.db_password}@"
+        f"{config.db_host}:{config.db_port}/"
+        f"{config.db_name}",
+        max(5, config.db_workers),
+    )
+
+
+def create_database(config: Config, name: str, template: Optional[str] = None) -> None:
+    """
+    (re)create the named scratch database on the configured server, optionally as
+    a copy of the given template database
+    """
+    engine = get_engine(config).execution_options(isolation_level="AUTOCOMMIT")
+    with engine.connect() as cnxn:
+        cnxn.execute(text(f'DROP DATABASE IF EXISTS "{name}"'))
+        if template:
+            cnxn.execute(text(f'CREATE DATABASE "{name}" TEMPLATE "{template}"'))
+            logger.info("created database %s from template %s", name, template)
+        else:
+            cnxn.execute(text(f'CREATE DATABASE "{name}"'))
+            logger.info("created database %s", name)
+
+
+def drop_database(config: Config, name: str) -> None:
+    """drop the named scratch database from the configured server"""
+    engine = get_engine(config).execution_options(isolation_level="AUTOCOMMIT")
+    with engine.connect() as cnxn:
+        cnxn.execute(text(f'DROP DATABASE IF EXISTS "{name}"'))
+    logger.info("dropped database %s", name)
+
+
+def ensure_template(config: Config, target_config: Config) -> str:
+    """
+    return the name of a template database on the configured server holding the
+    schema populated by target_config's DDL, building it first if necessary; the
+    template is named after the schema fingerprint so a matching template is
+    never stale, and it is built under another name and renamed when complete
+    """
+    name = f"modelgen_template_{schema_fingerprint(target_config)[:16]}"
+    engine = get_engine(config).execution_options(isolation_level="AUTOCOMMIT")
+    with engine.connect() as cnxn:
+        # serialize concurrent jobs (e.g. matrix workers) needing the same template
+        cnxn.execute(text("SELECT pg_advisory_lock(hashtext(:name))"), {"name": name})
+        try:
+            exists = cnxn.execute(
+                text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                {"name": name},
+            ).scalar()
+            if exists:
+                logger.info("using template database %s", name)
+                return name
+            building = f"{name}_building"
+            create_database(config, building)
+            template_config = copy.copy(target_config)
+            template_config.db_name = building
+            with span("build template", template=name):
+                initdb(template_config)
+            # the template can't be renamed or copied while connections are open
+            get_engine(template_config).dispose()
+            cnxn.execute(text(f'ALTER DATABASE "{building}" RENAME TO "{name}"'))
+            cnxn.execute(text(f'ALTER DATABASE "{name}" WITH IS_TEMPLATE true'))
+            logger.info("built template database %s", name)
+            return name
+        finally:
+            cnxn.execute(
+                text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": name}
+            )
 
 
 class DDLReference:
@@ -44,7 +238,13 @@ class DDLReference:
     base_ddl_url: str
     filename_map: Dict[Category, str]
     ddl_data: Dict[Category, str]
+    overlays: List[Tuple[str, str]]
+    partitions: Dict[str, Partition]
+    urls: Dict[Category, str]
     engine: Engine
+    cache: HTTPCache
+    workers: int
+    fingerprint: str
 
     def __init__(self, config: Config) -> None:
         self.dialect = config.db_dbms
@@ -55,65 +255,260 @@ class DDLReference:
         else:
             raise ValueError("unable to parse semver string")
         self.base_ddl_url = config.base_ddl_url
-        self.filename_map = {
-            "constraints": "OMOPCDM_{dialect}_{cdm_version_short}_constraints.sql",
-            "ddl": "OMOPCDM_{dialect}_{cdm_version_short}_ddl.sql",
-            "indices": "OMOPCDM_{dialect}_{cdm_version_short}_indices.sql",
-            "primary_keys": "OMOPCDM_{dialect}_{cdm_version_short}_primary_keys.sql",
-        }
+        self.filename_map = dict(filename_map)
         self.ddl_data = {
             "eh_mods": sql_dir.joinpath("eh_mods.sql").read_text(),
         }
-        self.engine = create_engine(
-            f"postgresql+psycopg2://"
-            f"{config.db_user}:{config.db_password}@"
-            f"{config.db_host}:{config.db_port}/"
-            f"{config.db_name}"
-        )
+        self.overlays = overlay_packs(config)
+        self.partitions = partitions(config)
+        self.engine = get_engine(config)
+        self.urls = ddl_urls(config)
+        self.cache = HTTPCache.from_config(config)
+        self.workers = max(1, config.db_workers)
+        self.fingerprint = schema_fingerprint(config)
 
     def download_ddl(self):
         """download the official DDL data"""
-        for category, filename in self.filename_map.items():
-            url = (self.base_ddl_url + "/" + filename).format(
-                dialect=self.dialect,
-                cdm_version_short=self.cdm_version_short,
-                cdm_version=self.cdm_version,
-            )
-            logger.debug("requesting %s", url)
-            response = requests.get(url, timeout=300)
-            if response.status_code != 200:
-                raise ValueError(
-                    f"failed to retrieve the DDL file at {url}; "
-                    f"status code: {response.status_code}"
-                )
-            response.raise_for_status()
-            self.ddl_data[category] = response.content.decode("utf8", errors="strict")
+        for category, content in self.cache.get_many(self.urls).items():
+            self.ddl_data[category] = content.decode("utf8", errors="strict")
         for category, content in self.ddl_data.items():
             logger.info("loaded DDL category: %s (%s bytes)", category, len(content))
 
-    def populate_database(self):
-        """apply the DDL files to the server"""
-        if not self.ddl_data or len(self.ddl_data) < len(categories):
+    def schema_marker(self) -> Optional[Tuple[str, List[str]]]:
+        """
+        return the fingerprint (or state) and the tables recorded in the cdm
+        schema's comment, if the schema exists and was populated by modelgen
+        """
+        with self.engine.connect() as cnxn:
+            comment = cnxn.execute(
+                text(
+                    "SELECT obj_description(oid, 'pg_namespace') "
+                    "FROM pg_namespace WHERE nspname = :name"
+                ),
+                {"name": self.cdm_schema},
+            ).scalar()
+        if not comment or not comment.startswith(SCHEMA_MARKER):
+            return None
+        value, _, tables = comment.partition("\n")
+        return (
+            value.removeprefix(SCHEMA_MARKER),
+            tables.removeprefix(TABLES_MARKER).split(",") if tables else [],
+        )
+
+    def mark_schema(self, cnxn: Connection, value: str) -> None:
+        """
+        record the given fingerprint (or state) in the cdm schema's comment, along
+        with the tables the DDL creates
+        """
+        quoted = cnxn.dialect.identifier_preparer.quote(self.cdm_schema)
+        cnxn.execute(
+            text(f"COMMENT ON SCHEMA {quoted} IS :comment"),
+            {
+                "comment": f"{SCHEMA_MARKER}{value}\n"
+                f"{TABLES_MARKER}{','.join(self.table_names())}"
+            },
+        )
+
+    def table_names(self) -> List[str]:
+        """return the names of the tables the DDL (and the overlays) create"""
+        return [
+            unqualified_name(match.group("table"))
+            for statement in self.all_statements()
+            if (match := create_table_re.match(statement))
+        ]
+
+    def drop_tables(self, recorded: Sequence[str]) -> None:
+        """
+        drop the tables the DDL creates and the given tables recorded by an earlier
+        run (with their keys and indexes) from the cdm schema; everything else in
+        the schema is left alone, and a table which something else depends on
+        (e.g. another table's foreign key or a view) is not dropped but reported
+        """
+        names = list(dict.fromkeys([*recorded, *self.table_names()]))
+        with self.engine.connect() as cnxn, cnxn.begin():
+            preparer = cnxn.dialect.identifier_preparer
+            tables = ", ".join(
+                f"{preparer.quote_schema(self.cdm_schema)}.{preparer.quote(name)}"
+                for name in names
+            )
+            try:
+                # one statement, so the foreign keys between the tables don't matter
+                cnxn.exec_driver_sql(f"DROP TABLE IF EXISTS {tables}")
+            except DBAPIError as exc:
+                raise ValueError(
+                    f"unable to drop the tables of schema {self.cdm_schema} to "
+                    f"rebuild it, other objects depend on them:\n{exc.orig}"
+                ) from exc
+        logger.info("dropped %s tables from schema %s", len(names), self.cdm_schema)
+
+    def split(self, sql: str) -> List[str]:
+        """
+        return the individual statements of the given SQL for the cdm schema,
+        adjusted for the partitioned tables
+        """
+        statements = split_statements(
+            sql.replace("@cdmDatabaseSchema", self.cdm_schema)
+        )
+        if not self.partitions:
+            return statements
+        adjusted = (partitioned(statement, self.partitions) for statement in statements)
+        return [statement for statement in adjusted if statement is not None]
+
+    def statements(self, category: Category) -> List[str]:
+        """
+        return the individual SQL statements of the given DDL category, downloading
+        the DDL first if necessary
+        """
+        if category not in self.ddl_data:
             self.download_ddl()
+        return self.split(self.ddl_data[category])
+
+    def all_statements(self) -> List[str]:
+        """return the statements of every category and overlay, in order"""
+        result = [
+            statement
+            for category in categories
+            for statement in self.statements(category)
+        ]
+        for _, sql in self.overlays:
+            result += self.split(sql)
+        return result
+
+    def prepare_connection(self, cnxn: Connection) -> None:
+        """set up the given connection for executing the DDL"""
         search_path = ",".join(set(("public", self.cdm_schema)))
-        with self.engine.connect() as cnxn:
-            with cnxn.begin():
-                cnxn.execute(text(f"SET search_path TO {search_path};"))
+        cnxn.execute(text(f"SET search_path TO {search_path};"))
+
+    def execute_statements(
+        self, cnxn: Connection, category: str, statements: Sequence[str]
+    ) -> None:
+        """
+        execute the given statements in order on the given connection, timing each
+        one; a failure is reported along with the statement which caused it
+        """
+        for statement in statements:
+            summary = " ".join(statement.split())
+            with span(summary[:80], category=category) as current:
+                try:
+                    cnxn.exec_driver_sql(statement)
+                except DBAPIError as exc:
+                    raise ValueError(
+                        f"failed to execute {category} statement: {summary}\n"
+                        f"{exc.orig}"
+                    ) from exc
+            logger.debug("%.3fs: %s", current.duration, summary)
+
+    def execute_concurrently(self, category: Category, statements: List[str]) -> None:
+        """
+        execute the given statements using a pool of connections; statements on
+        the same table run in order on one connection, different tables run
+        concurrently; falls back to running them in order if any statement's
+        table can't be determined
+        """
+        groups: Dict[str, List[str]] = {}
+        for statement in statements:
+            if not (match := statement_table_re.match(statement)):
+                logger.warning(
+                    "unable to determine the table of %s statement %s; "
+                    "executing %s in order",
+                    category,
+                    " ".join(statement.split()),
+                    category,
+                )
+                groups = {"": statements}
+                break
+            groups.setdefault(match.group("table").lower(), []).append(statement)
+
+        def execute_group(group: List[str]) -> None:
+            with self.engine.connect() as cnxn, cnxn.begin():
+                self.prepare_connection(cnxn)
+                self.execute_statements(cnxn, category, group)
+
+        logger.info(
+            "executing %s statements on %s tables with %s connections",
+            len(statements),
+            len(groups),
+            min(self.workers, len(groups)),
+        )
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, execute_group, group)
+                for group in groups.values()
+            ]
+            done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in not_done:
+                future.cancel()
+            for future in done:
+                future.result()
+
+    def populate_database(self):
+        """
+        apply the DDL files to the server, statement by statement; the
+        categories are applied in order and the statements of the categories in
+        concurrent_categories are spread over several connections
+        """
+        pending: List[Category] = []
+
+        def execute_pending() -> None:
+            """apply the pending ordered categories in a single transaction"""
+            if not pending:
+                return
+            with self.engine.connect() as cnxn, cnxn.begin():
+                self.prepare_connection(cnxn)
                 cnxn.execute(schema.CreateSchema(self.cdm_schema, True))
-                for category in categories:
+                self.mark_schema(cnxn, "incomplete")
+                for category in pending:
                     logger.info("executing SQL statements to create %s", category)
-                    result = cnxn.execute(
-                        text(
-                            self.ddl_data[category].replace(
-                                "@cdmDatabaseSchema", self.cdm_schema
-                            )
+                    with span(f"execute {category}"):
+                        self.execute_statements(
+                            cnxn, category, self.statements(category)
                         )
-                    )
-                    logger.debug(result)
+            pending.clear()
+
+        for category in categories:
+            if category not in concurrent_categories:
+                pending.append(category)
+                continue
+            execute_pending()
+            logger.info("executing SQL statements to create %s", category)
+            with span(f"execute {category}"):
+                self.execute_concurrently(category, self.statements(category))
+        execute_pending()
+        for name, sql in self.overlays:
+            logger.info("executing SQL statements of overlay %s", name)
+            with span(f"execute overlay {name}"), self.engine.connect() as cnxn:
+                with cnxn.begin():
+                    self.prepare_connection(cnxn)
+                    self.execute_statements(cnxn, f"overlay {name}", self.split(sql))
+        with self.engine.connect() as cnxn, cnxn.begin():
+            self.mark_schema(cnxn, self.fingerprint)
         logger.info("done populating database")
 
 
+def connect(config: Config):
+    """
+    open the pooled connections to the database server ahead of the steps which
+    use them; they are returned to the engine's pool for those steps
+    """
+    engine = get_engine(config)
+    with contextlib.ExitStack() as stack:
+        for _ in range(config.db_workers):
+            stack.enter_context(engine.connect()).exec_driver_sql("SELECT 1")
+    logger.info("connected to %s:%s", config.db_host, config.db_port)
+
+
 def initdb(config: Config):
-    """populate the database from the reference DDL files"""
+    """
+    populate the database from the reference DDL files; a schema populated by an
+    earlier run from the same DDL is reused as it is, the tables of one populated
+    from other DDL are dropped and rebuilt (anything else in the schema is kept)
+    """
     reference = DDLReference(config)
+    marker = reference.schema_marker()
+    if marker is not None and marker[0] == reference.fingerprint:
+        logger.info("schema %s is up to date, reusing it", reference.cdm_schema)
+        return
+    if marker is not None:
+        logger.info("schema %s is out of date, rebuilding it", reference.cdm_schema)
+        reference.drop_tables(marker[1])
     reference.populate_database()
@@ -0,0 +1,374 @@
+"""
+build SQLAlchemy MetaData directly from the official OMOP CDM DDL text, without
+applying it to a database server first
+"""
+
+import logging
+import re
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    Column,
+    ForeignKeyConstraint,
+    Index,
+    MetaData,
+    PrimaryKeyConstraint,
+    Table,
+)
+from sqlalchemy.dialects.postgresql.base import ischema_names
+from sqlalchemy.types import TypeEngine
+
+logger = logging.getLogger(__name__)
+
+IDENT = r'(?:"[^"]+"|[\w@$]+)'
+QUALIFIED = rf"(?:{IDENT}\.)?{IDENT}"
+
+create_table_re = re.compile(
+    rf"^CREATE\s+TABLE\s+(?P<table>{QUALIFIED})\s*\((?P<body>.*?)\)"
+    r"(?:\s*PARTITION\s+BY\s+(?P<partition_by>.+))?$",
+    re.IGNORECASE | re.DOTALL,
+)
+primary_key_re = re.compile(
+    rf"^ALTER\s+TABLE\s+(?P<table>{QUALIFIED})\s+ADD\s+CONSTRAINT\s+"
+    rf"(?P<name>{IDENT})\s+PRIMARY\s+KEY\s*\((?P<columns>[^)]*)\)$",
+    re.IGNORECASE,
+)
+foreign_key_re = re.compile(
+    rf"^ALTER\s+TABLE\s+(?P<table>{QUALIFIED})\s+ADD\s+CONSTRAINT\s+"
+    rf"(?P<name>{IDENT})\s+FOREIGN\s+KEY\s*\((?P<columns>[^)]*)\)\s*"
+    rf"REFERENCES\s+(?P<ref_table>{QUALIFIED})\s*\((?P<ref_columns>[^)]*)\)$",
+    re.IGNORECASE,
+)
+create_index_re = re.compile(
+    rf"^CREATE\s+(?P<unique>UNIQUE\s+)?INDEX\s+(?P<name>{IDENT})\s+ON\s+"
+    rf"(?P<table>{QUALIFIED})\s*(?:USING\s+(?P<using>\w+)\s*)?"
+    r"\((?P<columns>[^)]*)\)(?:\s*INCLUDE\s*\((?P<include>[^)]*)\))?$",
+    re.IGNORECASE,
+)
+# CLUSTER statements, which are left out for partitioned tables
+cluster_re = re.compile(r"^CLUSTER\s", re.IGNORECASE)
+# statements which have no effect on the reflected tables; comments aren't
+# carried over to the parsed metadata either
+ignored_re = re.compile(
+    r"^(?:CLUSTER|ANALYZE|VACUUM|SET|RESET|GRANT|REVOKE|SELECT|DO|COMMENT\s+ON"
+    r"|CREATE\s+(?:OR\s+REPLACE\s+)?(?:EXTENSION|STATISTICS|FUNCTION|PROCEDURE"
+    r"|TRIGGER))\b",
+    re.IGNORECASE,
+)
+# the table acted on by an index, CLUSTER or ALTER TABLE statement
+statement_table_re = re.compile(
+    rf"^(?:CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:{IDENT}\s+)?ON|CLUSTER|ALTER\s+TABLE)"
+    rf"\s+(?P<table>{QUALIFIED})",
+    re.IGNORECASE,
+)
+# the strategy and key of a table's partitioning, e.g. "RANGE (measurement_date)"
+partition_clause_re = re.compile(
+    r"^(?P<strategy>RANGE|LIST|HASH)\s*\((?P<columns>[^)]*)\)$", re.IGNORECASE
+)
+# the opening (and closing) tag of a dollar-quoted string, e.g. $$ or $body$
+dollar_quote_re = re.compile(r"\$(?:[A-Za-z_]\w*)?\$")
+column_re = re.compile(
+    rf"^(?P<name>{IDENT})\s+(?P<type>[A-Za-z][\w ]*?)\s*"
+    r"(?:\((?P<args>[^)]*)\))?(?P<null>\s+(?:NOT\s+)?NULL)?$",
+    re.IGNORECASE,
+)
+
+# alternate spellings used by the DDL, mapped to the name postgresql reflects
+type_aliases: Dict[str, str] = {
+    "bool": "boolean",
+    "char": "character",
+    "datetime": "timestamp without time zone",
+    "datetime2": "timestamp without time zone",
+    "decimal": "numeric",
+    "float": "double precision",
+    "float4": "real",
+    "float8": "double precision",
+    "int": "integer",
+    "int2": "smallint",
+    "int4": "integer",
+    "int8": "bigint",
+    "timestamp": "timestamp without time zone",
+    "timestamptz": "timestamp with time zone",
+    "varchar": "character varying",
+}
+
+
+def split_statements(sql: str) -> List[str]:
+    """
+    split the given SQL script into its statements; comments and the terminating
+    semicolons are removed, quoted strings and identifiers and dollar-quoted
+    strings (such as function bodies) are respected
+    """
+    statements: List[str] = []
+    current: List[str] = []
+    i = 0
+    length = len(sql)
+    while i < length:
+        char = sql[i]
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = length if end == -1 else end
+            continue
+        if sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = length if end == -1 else end + 2
+            current.append(" ")
+            continue
+        if char in ("'", '"'):
+            end = sql.find(char, i + 1)
+            while end != -1 and sql.startswith(char * 2, end):
+                end = sql.find(char, end + 2)
+            end = length if end == -1 else end + 1
+            current.append(sql[i:end])
+            i = end
+            continue
+        if (
+            char == "$"
+            and not (i and (sql[i - 1].isalnum() or sql[i - 1] in "_$"))
+            and (tag := dollar_quote_re.match(sql, i))
+        ):
+            end = sql.find(tag.group(), tag.end())
+            end = length if end == -1 else end + len(tag.group())
+            current.append(sql[i:end])
+            i = end
+            continue
+        if char == ";":
+            statement = "".join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    statement = "".join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def split_top_level(text: str, sep: str = ",") -> List[str]:
+    """split the given text on sep, ignoring separators inside parentheses"""
+    parts: List[str] = []
+    depth = 0
+    current: List[str] = []
+    for char in text:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if char == sep and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def fold_identifier(identifier: str) -> str:
+    """return the name postgresql would store for the given identifier"""
+    if identifier.startswith('"') and identifier.endswith('"'):
+        return identifier[1:-1].replace('""', '"')
+    return identifier.lower()
+
+
+def column_list(text: str) -> List[str]:
+    """return the folded column names from a parenthesized column list body"""
+    return [fold_identifier(part.split()[0]) for part in split_top_level(text) if part]
+
+
+def parse_type(name: str, args: Optional[str]) -> TypeEngine:
+    """return the SQLAlchemy postgresql type postgresql reflects for a column type"""
+    canonical = " ".join(name.lower().split())
+    canonical = type_aliases.get(canonical, canonical)
+    try:
+        type_class = ischema_names[canonical]
+    except KeyError:
+        raise ValueError(f"unsupported column type: {name}") from None
+    type_args: List[int] = [int(a) for a in args.split(",")] if args else []
+    if canonical == "character" and not type_args:
+        type_args = [1]
+    if canonical in ("timestamp with time zone", "time with time zone"):
+        return type_class(timezone=True, *type_args)
+    return type_class(*type_args)
+
+
+def unqualified_name(qualified: str) -> str:
+    """return the folded table name of a possibly schema-qualified reference"""
+    return fold_identifier(re.findall(IDENT, qualified)[-1])
+
+
+class Partition(NamedTuple):
+    """the partitioning of a table"""
+
+    table: str
+    clause: str
+    columns: List[str]
+
+
+def parse_partition(spec: str) -> Partition:
+    """
+    parse a "table:STRATEGY (columns)" partitioning spec, e.g.
+    "measurement:RANGE (measurement_date)"
+    """
+    table, _, clause = spec.partition(":")
+    if not (match := partition_clause_re.match(clause.strip())) or not table.strip():
+        raise ValueError(
+            f"invalid partitioning (expected table:STRATEGY (columns)): {spec}"
+        )
+    columns = column_list(match.group("columns"))
+    return Partition(
+        fold_identifier(table.strip()),
+        f"{match.group('strategy').upper()} ({', '.join(columns)})",
+        columns,
+    )
+
+
+def partitioned(statement: str, partitions: Dict[str, Partition]) -> Optional[str]:
+    """
+    return the given statement adjusted for the partitioned tables, or None when
+    it has to be left out: their CREATE TABLE statements get the PARTITION BY
+    clause, the partition key columns are added to their primary keys (which
+    postgresql requires) and CLUSTER statements on them are left out (postgresql
+    can't cluster a partitioned table in a transaction)
+    """
+    if match := create_table_re.match(statement):
+        if partition := partitions.get(unqualified_name(match.group("table"))):
+            return f"{statement} PARTITION BY {partition.clause}"
+    elif match := primary_key_re.match(statement):
+        if partition := partitions.get(unqualified_name(match.group("table"))):
+            columns = column_list(match.group("columns"))
+            columns += [name for name in partition.columns if name not in columns]
+            start, end = match.span("columns")
+            return f"{statement[:start]}{', '.join(columns)}{statement[end:]}"
+    elif cluster_re.match(statement) and (match := statement_table_re.match(statement)):
+        if unqualified_name(match.group("table")) in partitions:
+            return None
+    return statement
+
+
+class DDLParser:
+    """
+    accumulates the tables, keys and indexes described by a sequence of DDL
+    scripts into an in-memory MetaData object, mirroring what reflecting the
+    database after applying those scripts would produce
+    """
+
+    metadata: MetaData
+    schema: Optional[str]
+    handlers: Sequence[Tuple[re.Pattern, Callable[[re.Match], None]]]
+
+    def __init__(self, schema: Optional[str] = None) -> None:
+        self.metadata = MetaData()
+        self.schema = schema
+        self.handlers = (
+            (create_table_re, self.create_table),
+            (primary_key_re, self.add_primary_key),
+            (foreign_key_re, self.add_foreign_key),
+            (create_index_re, self.create_index),
+        )
+
+    def table(self, qualified: str) -> Table:
+        """return the existing table referenced by the given name"""
+        name = unqualified_name(qualified)
+        key = f"{self.schema}.{name}" if self.schema else name
+        try:
+            return self.metadata.tables[key]
+        except KeyError:
+            raise ValueError(f"reference to undefined table: {qualified}") from None
+
+    def feed(self, sql: str) -> None:
+        """parse each statement of the given script into the metadata"""
+        for statement in split_statements(sql):
+            self.parse(statement)
+
+    def parse(self, statement: str) -> None:
+        """parse a single statement into the metadata"""
+        if ignored_re.match(statement):
+            return
+        for pattern, handler in self.handlers:
+            if match := pattern.match(statement):
+                handler(match)
+                return
+        raise ValueError(
+            "unsupported DDL statement (the DDL metadata source only reads CREATE "
+            "TABLE, CREATE INDEX and the primary and foreign key ALTER TABLE "
+            f"statements): {statement[:200]}"
+        )
+
+    def create_table(self, match: re.Match) -> None:
+        """handle a CREATE TABLE statement"""
+        columns: List[Column] = []
+        for definition in split_top_level(match.group("body")):
+            column_match = column_re.match(definition)
+            if not column_match:
+                raise ValueError(f"unsupported column definition: {definition}")
+            null = " ".join((column_match.group("null") or "").upper().split())
+            columns.append(
+                Column(
+                    fold_identifier(column_match.group("name")),
+                    parse_type(column_match.group("type"), column_match.group("args")),
+                    nullable=null != "NOT NULL",
+                    autoincrement=False,
+                )
+            )
+        Table(
+            unqualified_name(match.group("table")),
+            self.metadata,
+            *columns,
+            schema=self.schema,
+        )
+
+    def add_primary_key(self, match: re.Match) -> None:
+        """handle an ALTER TABLE ... ADD CONSTRAINT ... PRIMARY KEY statement"""
+        table = self.table(match.group("table"))
+        names = column_list(match.group("columns"))
+        for name in names:
+            # postgresql implicitly makes primary key columns NOT NULL
+            table.c[name].nullable = False
+        table.append_constraint(
+            PrimaryKeyConstraint(*names, name=fold_identifier(match.group("name")))
+        )
+
+    def add_foreign_key(self, match: re.Match) -> None:
+        """handle an ALTER TABLE ... ADD CONSTRAINT ... FOREIGN KEY statement"""
+        table = self.table(match.group("table"))
+        ref_table = self.table(match.group("ref_table"))
+        table.append_constraint(
+            ForeignKeyConstraint(
+                column_list(match.group("columns")),
+                [ref_table.c[name] for name in column_list(match.group("ref_columns"))],
+                name=fold_identifier(match.group("name")),
+            )
+        )
+
+    def create_index(self, match: re.Match) -> None:
+        """handle a CREATE INDEX statement"""
+        table = self.table(match.group("table"))
+        # like reflection, the access method is only given when it isn't btree
+        options: Dict[str, Any] = {}
+        if (using := match.group("using")) and using.lower() != "btree":
+            options["postgresql_using"] = using.lower()
+        if include := match.group("include"):
+            options["postgresql_include"] = column_list(include)
+        Index(
+            fold_identifier(match.group("name")),
+            *(table.c[name] for name in column_list(match.group("columns"))),
+            unique=bool(match.group("unique")),
+            **options,
+        )
+
+
+def metadata_from_ddl(
+    statements: Sequence[str], schema: Optional[str] = None
+) -> MetaData:
+    """
+    return a MetaData object describing the schema which the given DDL statements
+    (applied in the given order) would create
+    """
+    parser = DDLParser(schema)
+    for statement in statements:
+        parser.parse(statement)
+    logger.info("parsed %s tables from the DDL", len(parser.metadata.tables))
+    return parser.metadata
@@ -0,0 +1,33 @@
+"""retrieve the remote inputs of the pipeline ahead of the steps which use them"""
+
+import logging
+
+from .cache import HTTPCache
+from .config import Config
+from .dbinit import ddl_urls
+from .rtfm import get_omopcdm_descriptions
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_ddl(config: Config):
+    """
+    download (or revalidate) the DDL files concurrently, leaving them in the cache
+    for the later steps
+    """
+    cache = HTTPCache.from_config(config)
+    for name, content in cache.get_many(ddl_urls(config)).items():
+        logger.info(
+            "fetched %s (%s bytes) in %.3fs", name, len(content), cache.timings[name]
+        )
+
+
+def fetch_docs(config: Config):
+    """
+    download (or revalidate) the documentation page and parse the table
+    descriptions from it, leaving both in the cache for the rewrite step
+    """
+    descriptions = get_omopcdm_descriptions(
+        config.base_doc_url, HTTPCache.from_config(config)
+    )
+    logger.info("fetched the descriptions of %s tables", len(descriptions))
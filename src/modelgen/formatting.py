@@ -0,0 +1,54 @@
+"""format the model source in-process with the isort and black APIs"""
+
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+import black as black_api
+import isort as isort_api
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+
+# pylint: disable-next=unused-argument
+def isort(config: Config, source: str) -> str:
+    """sort the imports of the given source with isort"""
+    result = isort_api.code(source, profile="black")
+    logger.info("isort: %s", "fixed imports" if result != source else "unchanged")
+    return result
+
+
+# pylint: disable-next=unused-argument
+def black(config: Config, source: str) -> str:
+    """format the given source with the Black code formatter"""
+    try:
+        result = black_api.format_str(source, mode=black_api.Mode())
+    except black_api.NothingChanged:
+        result = source
+    logger.info("black: %s", "reformatted" if result != source else "unchanged")
+    return result
+
+
+def format_file(source: str) -> str:
+    """sort the imports of and format a single file"""
+    result = isort_api.code(source, profile="black")
+    try:
+        return black_api.format_str(result, mode=black_api.Mode())
+    except black_api.NothingChanged:
+        return result
+
+
+# pylint: disable-next=unused-argument
+def format_package(config: Config, source: str) -> str:
+    """
+    sort the imports of and format each module of a package (given as a json
+    object mapping file names to sources), in parallel worker processes
+    """
+    files: Dict[str, str] = json.loads(source)
+    with ProcessPoolExecutor() as pool:
+        formatted = dict(zip(files, pool.map(format_file, files.values())))
+    logger.info("formatted %s modules", len(formatted))
+    return json.dumps(formatted, indent=2)
@@ -0,0 +1,174 @@
+"""
+measure the import time and memory use of the written model in a clean python
+subprocess, optionally failing when a budget or a stored baseline is exceeded
+"""
+
+import json
+import logging
+import os
+import statistics
+import subprocess  # nosec: considered
+import sys
+from typing import Any, Dict, List, Optional
+
+from .config import Config
+from .package import package_dir
+from .shellout import run_cmd
+from .utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+RUNS = 3
+
+# executed in the subprocess with the model's file (a module, or a package's
+# __init__.py) as argv[1]; the model is imported from that exact file, and
+# sqlalchemy is imported first so that the model's own cost is measured separately
+MEASURE_SCRIPT = """
+import importlib.util, json, os, resource, sys, time
+
+def peak_rss():
+    # ru_maxrss survives exec on linux (it would include modelgen's own peak), the
+    # VmHWM of the new address space doesn't
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+path = sys.argv[1]
+start = time.perf_counter()
+import sqlalchemy.orm
+sqlalchemy_loaded = time.perf_counter()
+if os.path.basename(path) == "__init__.py":
+    name = os.path.basename(os.path.dirname(path))
+    locations = [os.path.dirname(path)]
+else:
+    name, locations = os.path.splitext(os.path.basename(path))[0], None
+spec = importlib.util.spec_from_file_location(
+    name, path, submodule_search_locations=locations
+)
+module = sys.modules[name] = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+for attr in getattr(module, "__all__", ()):
+    getattr(module, attr)
+loaded = time.perf_counter()
+sqlalchemy.orm.configure_mappers()
+configured = time.perf_counter()
+print(json.dumps({
+    "sqlalchemy_import": sqlalchemy_loaded - start,
+    "model_import": imported - sqlalchemy_loaded,
+    "load_classes": loaded - imported,
+    "configure_mappers": configured - loaded,
+    "total": configured - start,
+    "peak_rss": peak_rss(),
+}))
+"""
+
+
+def model_path(config: Config) -> str:
+    """return the file from which the written model is imported"""
+    if config.output_layout == "package":
+        return os.path.abspath(os.path.join(package_dir(config), "__init__.py"))
+    return os.path.abspath(config.output_file)
+
+
+def measure(config: Config, importtime: bool = False) -> Dict[str, Any]:
+    """import the model in a fresh interpreter, returning its measurements"""
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", MEASURE_SCRIPT, model_path(config)]
+    try:
+        stdout, stderr = run_cmd(command)
+    except subprocess.CalledProcessError as exc:
+        raise ValueError(f"importing the model failed:\n{exc.stderr}") from exc
+    measurements: Dict[str, Any] = json.loads(stdout)
+    if importtime:
+        measurements["importtime"] = parse_importtime(stderr)
+    return measurements
+
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """
+    return the -X importtime output as a list of {module, self_us, cumulative_us}
+    entries, most expensive (cumulative) first
+    """
+    entries: List[Dict[str, Any]] = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line.removeprefix("import time:").split("|")
+        entries.append(
+            {
+                "module": module.strip(),
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            }
+        )
+    return sorted(entries, key=lambda entry: entry["cumulative_us"], reverse=True)
+
+
+def check_limits(
+    config: Config, report: Dict[str, Any], baseline: Optional[Dict[str, Any]]
+) -> List[str]:
+    """return a description of each budget or baseline the report exceeds"""
+    problems: List[str] = []
+    total, peak_rss = report["summary"]["total"], report["summary"]["peak_rss"]
+    if config.import_time_budget and total > config.import_time_budget:
+        problems.append(
+            f"import took {total:.3f}s, over the budget of "
+            f"{config.import_time_budget}s"
+        )
+    if config.import_rss_budget and peak_rss > config.import_rss_budget * 2**20:
+        problems.append(
+            f"peak RSS was {peak_rss / 2**20:.1f}MiB, over the budget of "
+            f"{config.import_rss_budget}MiB"
+        )
+    if baseline:
+        limit = 1 + config.import_tolerance
+        for key in ("total", "peak_rss"):
+            before = baseline["summary"][key]
+            if report["summary"][key] > before * limit:
+                problems.append(
+                    f"{key} of {report['summary'][key]} exceeds the baseline "
+                    f"{before} by more than {config.import_tolerance:.0%}"
+                )
+    return problems
+
+
+def benchmark_import(config: Config, source: str) -> str:
+    """
+    import the written model in clean subprocesses and write the timings, the
+    -X importtime breakdown and the peak RSS to import_benchmark.json in the log
+    dir; raises ValueError when a configured budget or the baseline is exceeded
+    """
+    runs = [measure(config) for _ in range(RUNS)]
+    report: Dict[str, Any] = {
+        "model": model_path(config),
+        "runs": runs,
+        "summary": {key: min(run[key] for run in runs) for key in runs[0]},
+        "median": {key: statistics.median(run[key] for run in runs) for key in runs[0]},
+        "importtime": measure(config, importtime=True)["importtime"],
+    }
+    path = os.path.join(config.log_dir, "import_benchmark.json")
+    atomic_write(path, json.dumps(report, indent=2))
+    logger.info(
+        "model import: %.3fs (%.3fs configuring mappers), peak RSS %.1fMiB; "
+        "report written to %s",
+        report["summary"]["total"],
+        report["summary"]["configure_mappers"],
+        report["summary"]["peak_rss"] / 2**20,
+        path,
+    )
+
+    baseline: Optional[Dict[str, Any]] = None
+    if config.import_baseline:
+        with open(config.import_baseline, "rt", encoding="utf8") as fh:
+            baseline = json.load(fh)
+    if problems := check_limits(config, report, baseline):
+        raise ValueError("model import benchmark failed: " + "; ".join(problems))
+    return source
@@ -0,0 +1,362 @@
+"""
+regenerate only the table classes whose schema or description changed since the
+previous run, splicing them into the existing model module
+"""
+
+import ast
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import libcst as cst
+from sqlalchemy import MetaData
+from sqlalchemy.schema import AddConstraint, CreateColumn, CreateIndex
+
+from .cache import HTTPCache, sha256_hex
+from .codegen import load_metadata, render_model
+from .config import Config
+from .formatting import format_file, isort
+from .loader import compiled
+from .loading import loading_configured, set_relationship_loading, with_loading
+from .lookup import add_lookup_registry
+from .manifest import fingerprint, package_fingerprint, tool_versions
+from .profiling import span
+from .rewrite import rename_base_and_add_docstrings, statement_table
+from .rtfm import get_omopcdm_descriptions
+from .utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# bump this when the format of the table fingerprints file changes
+STATE_VERSION = 1
+
+ImportStatement = Union[cst.Import, cst.ImportFrom]
+
+# a top-level statement of a module
+Statement = Union[cst.SimpleStatementLine, cst.BaseCompoundStatement]
+
+
+def state_path(config: Config) -> str:
+    """return the path of the file recording the tables of the written model"""
+    return config.output_file + ".tables.json"
+
+
+def global_fingerprint(config: Config) -> str:
+    """
+    return a fingerprint of everything besides the tables themselves which
+    affects how every class is rendered; a change means a full regeneration
+    """
+    return fingerprint(
+        {
+            "version": STATE_VERSION,
+            "code": package_fingerprint(),
+            "generator": config.generator,
+            "options": config.options,
+            "base_doc_url": config.base_doc_url,
+            "base_class_name": config.base_class_name,
+            "base_class_desc": config.base_class_desc,
+            "lookup_registry": config.lookup_registry,
+            "partition_by": config.partition_by,
+            "async_model": config.async_model,
+            "lazy_policy": config.lazy_policy,
+            "lazy_loading": config.lazy_loading,
+            "tools": tool_versions(
+                "sqlalchemy", "sqlacodegen", "libcst", "isort", "black"
+            ),
+        }
+    )
+
+
+def neighbors(metadata: MetaData) -> Dict[str, Set[str]]:
+    """return the tables each table refers to or is referred to by"""
+    result: Dict[str, Set[str]] = {name: set() for name in metadata.tables}
+    for name, table in metadata.tables.items():
+        for constraint in table.foreign_key_constraints:
+            target = constraint.elements[0].target_fullname.split(".")[-2]
+            if target in result and target != name:
+                result[name].add(target)
+                result[target].add(name)
+    return result
+
+
+def table_fingerprints(
+    metadata: MetaData, doc_map: Dict[str, str]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    return the fingerprints of each table: "table" covers its columns, keys,
+    constraints, indices and description, "keys" only the primary, unique and
+    foreign keys which the relationships on other classes depend on
+    """
+    table_neighbors = neighbors(metadata)
+    result: Dict[str, Dict[str, Any]] = {}
+    for name, table in metadata.tables.items():
+        keys = sorted(compiled(AddConstraint(c)) for c in table.constraints)
+        result[name] = {
+            "table": fingerprint(
+                {
+                    "columns": [compiled(CreateColumn(c)) for c in table.columns],
+                    "keys": keys,
+                    "indexes": sorted(compiled(CreateIndex(i)) for i in table.indexes),
+                    "comment": table.comment,
+                    "description": doc_map.get(name, ""),
+                }
+            ),
+            "keys": fingerprint(keys),
+            "neighbors": sorted(table_neighbors[name]),
+        }
+    return result
+
+
+def load_state(config: Config) -> Optional[Dict[str, Any]]:
+    """
+    return the recorded state of the previous run, if it is usable: it has to be
+    for the same global fingerprint and describe the model file as it is now
+    """
+    try:
+        with open(state_path(config), "rt", encoding="utf8") as fh:
+            state: Dict[str, Any] = json.load(fh)
+        with open(config.output_file, "rb") as fh:
+            output = sha256_hex(fh.read())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if state.get("global") != global_fingerprint(config):
+        logger.info("the model's settings or tools changed")
+        return None
+    if state.get("output") != output:
+        logger.info("the model file differs from the one recorded")
+        return None
+    return state
+
+
+def affected_tables(
+    previous: Dict[str, Dict[str, Any]], current: Dict[str, Dict[str, Any]]
+) -> Set[str]:
+    """
+    return the tables whose classes need to be regenerated: the changed, added
+    and removed tables, and the neighbors of those whose keys changed (the
+    relationships of the neighbors refer to them)
+    """
+    result: Set[str] = set()
+    for name in previous.keys() | current.keys():
+        before, after = previous.get(name), current.get(name)
+        if before and after and before["table"] == after["table"]:
+            continue
+        result.add(name)
+        if not (before and after and before["keys"] == after["keys"]):
+            for entry in (before, after):
+                result.update(entry["neighbors"] if entry else ())
+    return result & current.keys() | (previous.keys() - current.keys())
+
+
+def subset_metadata(metadata: MetaData, tables: Set[str]) -> MetaData:
+    """
+    return a copy of the metadata holding the given tables and their neighbors,
+    which the generator needs to render the given tables' relationships; the
+    foreign keys the neighbors have to tables outside of the copy are left out
+    """
+    table_neighbors = neighbors(metadata)
+    needed = set(tables)
+    for name in tables:
+        needed |= table_neighbors[name]
+    result = MetaData()
+    for name in sorted(needed):
+        table = metadata.tables[name].to_metadata(result)
+        for constraint in list(table.foreign_key_constraints):
+            target = constraint.elements[0].target_fullname.split(".")[-2]
+            if target in needed:
+                continue
+            table.constraints.discard(constraint)
+            for element in constraint.elements:
+                element.parent.foreign_keys.discard(element)
+                table.foreign_keys.discard(element)
+    return result
+
+
+def import_statement(statement: cst.CSTNode) -> Optional[ImportStatement]:
+    """return the import of a top-level statement, if it is an import"""
+    if isinstance(statement, cst.SimpleStatementLine) and isinstance(
+        statement.body[0], (cst.Import, cst.ImportFrom)
+    ):
+        return statement.body[0]
+    return None
+
+
+def only_tables(source: str, tables: Set[str]) -> str:
+    """
+    return the module source without the classes of tables other than the given
+    ones (the neighbors which were only needed to render their relationships)
+    """
+    module = cst.parse_module(source)
+    return module.with_changes(
+        body=[
+            statement
+            for statement in module.body
+            if (table := statement_table(statement)) is None or table in tables
+        ]
+    ).code
+
+
+def imported_names(modules: List[cst.Module]) -> Tuple[Set[str], Dict[str, Set[str]]]:
+    """
+    return the modules the given modules import (with import statements) and the
+    names they import from each module (with from ... import statements)
+    """
+    plain: Set[str] = set()
+    from_imports: Dict[str, Set[str]] = {}
+    empty = cst.Module(body=[])
+    for module in modules:
+        for statement in module.body:
+            if not (node := import_statement(statement)):
+                continue
+            aliases = node.names if isinstance(node.names, (list, tuple)) else ()
+            for alias in aliases:
+                name = empty.code_for_node(alias.name)
+                if isinstance(node, cst.Import):
+                    plain.add(name)
+                else:
+                    # the module is None in relative imports such as "from . import x"
+                    module_name = "." * len(node.relative) + (
+                        empty.code_for_node(node.module) if node.module else ""
+                    )
+                    from_imports.setdefault(module_name, set()).add(name)
+    return plain, from_imports
+
+
+def merged_imports(modules: List[cst.Module], body: Sequence[Statement]) -> List[str]:
+    """
+    return the imports of the given modules as statements, merged and reduced to
+    the names used in the given module body
+    """
+    code = cst.Module(
+        body=[statement for statement in body if not import_statement(statement)]
+    ).code
+    used = {node.id for node in ast.walk(ast.parse(code)) if isinstance(node, ast.Name)}
+
+    plain, from_imports = imported_names(modules)
+    lines = [f"import {name}" for name in sorted(plain) if name.split(".")[0] in used]
+    for module_name, imported in sorted(from_imports.items()):
+        if names := sorted(imported & used):
+            lines.append(f"from {module_name} import {', '.join(names)}")
+    return lines
+
+
+def splice(config: Config, previous: str, partial: str, affected: Set[str]) -> str:
+    """
+    replace the classes of the affected tables in the previous module source with
+    their counterparts from the (formatted) partial module, adding new tables
+    after the last table and dropping removed ones; everything else is kept as
+    it is, apart from the imports, which are merged and sorted again
+    """
+    old_module = cst.parse_module(previous)
+    new_module = cst.parse_module(partial)
+    replacements = {
+        table: statement
+        for statement in new_module.body
+        if (table := statement_table(statement)) in affected
+    }
+
+    body: List[Any] = []
+    last_table = 0
+    for statement in old_module.body:
+        table = statement_table(statement)
+        if table in affected:
+            if table in replacements:
+                body.append(replacements.pop(table))
+        else:
+            body.append(statement)
+        if table is not None:
+            last_table = len(body)
+    body[last_table:last_table] = list(replacements.values())
+
+    imports = [i for i, statement in enumerate(body) if import_statement(statement)]
+    if imports:
+        first = body[imports[0]]
+        statements: List[Any] = [
+            cst.parse_statement(line + "\n")
+            for line in merged_imports([old_module, new_module], body)
+        ]
+        if statements:
+            statements[0] = statements[0].with_changes(
+                leading_lines=first.leading_lines
+            )
+        for i in reversed(imports):
+            del body[i]
+        body[imports[0] : imports[0]] = statements
+    return isort(config, old_module.with_changes(body=body).code)
+
+
+def full_model(config: Config, metadata: MetaData) -> str:
+    """return the complete, rewritten and formatted model for the metadata"""
+    source = render_model(config, metadata)
+    source = rename_base_and_add_docstrings(config, source)
+    if loading_configured(config):
+        source = set_relationship_loading(config, source)
+    if config.lookup_registry:
+        source = add_lookup_registry(config, source)
+    with span("format"):
+        return format_file(source)
+
+
+# pylint: disable-next=unused-argument
+def regenerate(config: Config, source: str) -> str:
+    """
+    return the model, regenerating (with sqlacodegen and the rewrite) and
+    formatting only the classes of the tables which changed since the previous
+    run and splicing them into the existing module; the whole model is generated
+    when there's no usable record of the previous run
+    """
+    if config.generator == "tables" or config.output_layout != "module":
+        raise ValueError(
+            "incremental regeneration needs a class-based generator and the "
+            "module output layout"
+        )
+    metadata = load_metadata(config)
+    doc_map = get_omopcdm_descriptions(
+        config.base_doc_url, HTTPCache.from_config(config)
+    )
+    with span("table fingerprints"):
+        current = table_fingerprints(metadata, doc_map)
+    state = load_state(config)
+
+    if state is None:
+        logger.info("regenerating the whole model")
+        result = full_model(config, metadata)
+    else:
+        affected = affected_tables(state["tables"], current)
+        with open(config.output_file, "rt", encoding="utf8") as fh:
+            result = fh.read()
+        if affected:
+            logger.info(
+                "regenerating the classes of %s tables: %s",
+                len(affected),
+                ", ".join(sorted(affected)),
+            )
+            partial = subset_metadata(metadata, affected & current.keys())
+            partial_source = render_model(config, partial)
+            if loading_configured(config):
+                # while the neighbors the relationships refer to are still there
+                partial_source, _ = with_loading(config, partial_source)
+            partial_source = rename_base_and_add_docstrings(
+                config, only_tables(partial_source, affected)
+            )
+            with span("format"):
+                partial_source = format_file(partial_source)
+            with span("splice"):
+                result = splice(config, result, partial_source, affected)
+            if config.lookup_registry:
+                result = isort(config, add_lookup_registry(config, result))
+        else:
+            logger.info("no table changed")
+
+    atomic_write(
+        state_path(config),
+        json.dumps(
+            {
+                "global": global_fingerprint(config),
+                "output": sha256_hex(result.encode("utf8")),
+                "tables": current,
+            },
+            indent=2,
+        ),
+    )
+    return result
@@ -0,0 +1,320 @@
+"""
+generate a module of COPY-based bulk load helpers, one per table, from the
+metadata of the schema
+"""
+
+import logging
+from typing import Any
+
+from sqlalchemy import MetaData, Table
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import AddConstraint, CreateIndex, DropConstraint, DropIndex
+from sqlalchemy.sql import sqltypes
+
+from .codegen import load_metadata
+from .config import Config
+from .formatting import format_file
+from .utils import atomic_write, companion_path
+
+logger = logging.getLogger(__name__)
+
+LOADER_TEMPLATE = '''\
+"""
+COPY-based bulk loaders for the OMOP Common Data Model v5.4 tables; each
+load_<table> function streams rows (or a file in a COPY format) into its table
+through COPY ... FROM STDIN in chunks, so memory use doesn't grow with the data
+"""
+
+# pylint: disable=too-many-lines,line-too-long
+from contextlib import contextmanager
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from sqlalchemy import Connection
+
+# the (approximate) number of bytes sent to the server at a time
+CHUNK_SIZE = 1 << 20
+
+# either an iterable of rows (sequences of values in the table's column order) or
+# a file object holding data in a COPY format (see copy_rows' "options")
+Rows = Union[Iterable[Sequence[Any]], IO[str], IO[bytes]]
+
+Formatter = Callable[[Any], str]
+
+_escapes = str.maketrans({{"\\\\": "\\\\\\\\", "\\n": "\\\\n", "\\r": "\\\\r", "\\t": "\\\\t"}})
+
+
+def _text(value: Any) -> str:
+    """format a value of a string column for the COPY text format"""
+    return str(value).translate(_escapes)
+
+
+def _number(value: Any) -> str:
+    """format a value of a numeric column for the COPY text format"""
+    return str(value) if isinstance(value, (int, float)) else _text(value)
+
+
+def _temporal(value: Any) -> str:
+    """format a value of a date or timestamp column for the COPY text format"""
+    return value.isoformat() if hasattr(value, "isoformat") else _text(value)
+
+
+def _boolean(value: Any) -> str:
+    """format a value of a boolean column for the COPY text format"""
+    return ("t" if value else "f") if isinstance(value, bool) else _text(value)
+
+
+class CopyTable(NamedTuple):
+    """what a loader needs to know about a table"""
+
+    name: str
+    columns: Tuple[str, ...]
+    formatters: Tuple[Formatter, ...]
+    copy_sql: str
+    drop_constraints: Tuple[str, ...]
+    add_constraints: Tuple[str, ...]
+    drop_indexes: Tuple[str, ...]
+    create_indexes: Tuple[str, ...]
+
+
+class _ChunkReader:
+    """a file-like object which reads from an iterator of byte chunks"""
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self.chunks = chunks
+
+    def read(self, size: int = -1) -> bytes:
+        """return the next chunk (regardless of size), or b"" at the end"""
+        return next(self.chunks, b"")
+
+    def readline(self, size: int = -1) -> bytes:
+        """return the next chunk, which is all psycopg2 needs of readline"""
+        return self.read(size)
+
+
+def encode_rows(
+    table: CopyTable, rows: Iterable[Sequence[Any]], chunk_size: int = CHUNK_SIZE
+) -> Iterator[bytes]:
+    """encode the given rows in the COPY text format, in chunks of about chunk_size"""
+    width = len(table.columns)
+    lines = []
+    size = 0
+    for row in rows:
+        if len(row) != width:
+            raise ValueError(
+                f"expected {{width}} values for {{table.name}}, got {{len(row)}}"
+            )
+        line = (
+            "\\t".join(
+                "\\\\N" if value is None else formatter(value)
+                for formatter, value in zip(table.formatters, row)
+            )
+            + "\\n"
+        )
+        lines.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(lines).encode("utf8")
+            lines = []
+            size = 0
+    if lines:
+        yield "".join(lines).encode("utf8")
+
+
+def read_chunks(stream: Union[IO[str], IO[bytes]], chunk_size: int) -> Iterator[bytes]:
+    """read the given file object in chunks of chunk_size"""
+    while chunk := stream.read(chunk_size):
+        yield chunk.encode("utf8") if isinstance(chunk, str) else chunk
+
+
+@contextmanager
+def deferred(
+    cnxn: Connection,
+    *tables: CopyTable,
+    constraints: bool = True,
+    indexes: bool = True,
+) -> Iterator[None]:
+    """
+    drop the foreign keys and/or the indexes (besides the primary keys) of the
+    given tables for the duration of the block, then recreate them (checking the
+    foreign keys against the loaded data); useful to load tables which refer to
+    each other, such as the vocabulary tables; the connection has to be in a
+    (non-autocommit) transaction: when the block fails the keys and indexes are
+    not recreated, rolling the transaction back restores them
+    """
+    drops = [
+        statement
+        for table in tables
+        for statement in (table.drop_constraints if constraints else ())
+        + (table.drop_indexes if indexes else ())
+    ]
+    if drops and (
+        not cnxn.in_transaction()
+        or getattr(cnxn.connection.dbapi_connection, "autocommit", False)
+    ):
+        raise ValueError(
+            "deferring foreign keys or indexes needs a connection in a transaction, "
+            "which rolls back dropping them when the load fails"
+        )
+    for statement in drops:
+        cnxn.exec_driver_sql(statement)
+    yield
+    for table in tables:
+        for statement in (table.create_indexes if indexes else ()) + (
+            table.add_constraints if constraints else ()
+        ):
+            cnxn.exec_driver_sql(statement)
+
+
+def copy_rows(
+    cnxn: Connection,
+    table: CopyTable,
+    rows: Rows,
+    *,
+    options: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+    defer_constraints: bool = False,
+    defer_indexes: bool = False,
+) -> int:
+    """
+    stream the given rows (or file object) into the table with COPY ... FROM STDIN
+    over the given connection, returning the number of rows loaded; "options" are
+    COPY options for file objects (e.g. "FORMAT csv, HEADER"; the default is the
+    text format); defer_constraints and defer_indexes drop the table's foreign
+    keys and indexes during the load, see deferred()
+    """
+    if hasattr(rows, "read"):
+        chunks = read_chunks(rows, chunk_size)  # type: ignore
+    elif options:
+        raise ValueError("COPY options only apply when loading from a file object")
+    else:
+        chunks = encode_rows(table, rows, chunk_size)  # type: ignore
+    sql = table.copy_sql + (f" WITH ({{options}})" if options else "")
+
+    with deferred(cnxn, table, constraints=defer_constraints, indexes=defer_indexes):
+        cursor = cnxn.connection.cursor()
+        try:
+            if hasattr(cursor, "copy_expert"):  # psycopg2
+                cursor.copy_expert(sql, _ChunkReader(chunks), size=chunk_size)
+            else:  # psycopg 3
+                with cursor.copy(sql) as copy:
+                    for chunk in chunks:
+                        copy.write(chunk)
+            count: int = cursor.rowcount
+        finally:
+            cursor.close()
+    return count
+
+{tables}
+
+# every table, keyed by table name
+tables: Dict[str, CopyTable] = {{{registry}}}
+'''
+
+TABLE_TEMPLATE = '''
+
+{variable} = CopyTable(
+    name={name!r},
+    columns={columns!r},
+    formatters=({formatters}),
+    copy_sql={copy_sql!r},
+    drop_constraints={drop_constraints!r},
+    add_constraints={add_constraints!r},
+    drop_indexes={drop_indexes!r},
+    create_indexes={create_indexes!r},
+)
+
+
+def load_{name}(cnxn: Connection, rows: Rows, **options: Any) -> int:
+    """bulk load rows into the {name} table; see copy_rows for the options"""
+    return copy_rows(cnxn, {variable}, rows, **options)
+'''
+
+
+def loader_path(config: Config) -> str:
+    """return the path of the bulk loader module written next to the model"""
+    return companion_path(config.output_file, "_load.py")
+
+
+def formatter_for(column_type: sqltypes.TypeEngine) -> str:
+    """return the name of the generated formatter for values of the given type"""
+    if isinstance(column_type, sqltypes.Boolean):
+        return "_boolean"
+    if isinstance(column_type, (sqltypes.Integer, sqltypes.Numeric)):
+        return "_number"
+    if isinstance(column_type, (sqltypes.Date, sqltypes.DateTime, sqltypes.Time)):
+        return "_temporal"
+    return "_text"
+
+
+def compiled(statement: Any) -> str:
+    """return the postgresql SQL of the given DDL construct"""
+    return str(statement.compile(dialect=postgresql.dialect())).strip()
+
+
+def table_source(table: Table) -> str:
+    """return the CopyTable definition and the load function of the given table"""
+    dialect = postgresql.dialect()
+    quote = dialect.identifier_preparer.quote
+    table_name = dialect.identifier_preparer.format_table(table)
+    columns = tuple(column.name for column in table.columns)
+    foreign_keys = sorted(
+        (fk for fk in table.foreign_key_constraints if fk.name),
+        key=lambda fk: str(fk.name),
+    )
+    indexes = sorted(
+        (index for index in table.indexes if index.name), key=lambda i: str(i.name)
+    )
+    return TABLE_TEMPLATE.format(
+        variable=f"{table.name}_table",
+        name=table.name,
+        columns=columns,
+        formatters="".join(
+            f"{formatter_for(column.type)}, " for column in table.columns
+        ),
+        copy_sql=f"COPY {table_name} ({', '.join(map(quote, columns))}) FROM STDIN",
+        drop_constraints=tuple(compiled(DropConstraint(fk)) for fk in foreign_keys),
+        add_constraints=tuple(compiled(AddConstraint(fk)) for fk in foreign_keys),
+        drop_indexes=tuple(compiled(DropIndex(index)) for index in indexes),
+        create_indexes=tuple(compiled(CreateIndex(index)) for index in indexes),
+    )
+
+
+def loader_source(metadata: MetaData) -> str:
+    """return the source of the bulk loader module for the tables of the metadata"""
+    tables = sorted(metadata.tables.values(), key=lambda table: table.name)
+    return LOADER_TEMPLATE.format(
+        tables="".join(table_source(table) for table in tables),
+        registry=", ".join(f"{t.name!r}: {t.name}_table" for t in tables),
+    )
+
+
+def write_loader(config: Config, source: str) -> str:
+    """
+    write a module of COPY-based bulk load helpers (one per table of the schema)
+    next to the model; the tables come from the reflected (or parsed) metadata
+    rather than from the model, whose column order sqlacodegen may change
+    """
+    path = loader_path(config)
+    content = format_file(loader_source(load_metadata(config)))
+    try:
+        with open(path, "rt", encoding="utf8", errors="strict") as fh:
+            if fh.read() == content:
+                logger.info("bulk loader unchanged: %s", path)
+                return source
+    except FileNotFoundError:
+        pass
+    atomic_write(path, content)
+    logger.info("wrote bulk loader to: %s", path)
+    return source
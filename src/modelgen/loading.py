@@ -0,0 +1,252 @@
+"""
+set the loading strategy (lazy=) of the model's relationships from the policy in
+the config, validated against the relationships sqlacodegen generated
+"""
+
+# pylint: disable=invalid-name
+import logging
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import libcst as cst
+
+from .config import Config
+from .profiling import span
+from .rewrite import statement_table, string_value
+
+logger = logging.getLogger(__name__)
+
+# the strategies relationship(lazy=...) accepts
+STRATEGIES = (
+    "select",
+    "selectin",
+    "joined",
+    "subquery",
+    "immediate",
+    "raise",
+    "raise_on_sql",
+    "noload",
+    "write_only",
+    "dynamic",
+)
+
+# the strategies which only apply to collections
+COLLECTION_STRATEGIES = ("write_only", "dynamic")
+
+# the tables other tables refer to for their codes (the vocabulary) and for
+# health system details; under the cdm policy, references to these are loaded
+# along with the rows referring to them, and everything else raises
+LOOKUP_TABLES = frozenset(
+    (
+        "care_site",
+        "concept",
+        "concept_class",
+        "domain",
+        "location",
+        "provider",
+        "relationship",
+        "vocabulary",
+    )
+)
+
+
+class Relationship(NamedTuple):
+    """a relationship of the model"""
+
+    table: str
+    attribute: str
+    target: str
+    collection: bool
+
+    @property
+    def name(self) -> str:
+        """the relationship's name, as used in the lazy_loading entries"""
+        return f"{self.table}.{self.attribute}"
+
+
+def loading_configured(config: Config) -> bool:
+    """True when the config sets the loading strategy of any relationships"""
+    return config.lazy_policy != "generated" or bool(config.lazy_loading)
+
+
+def loading_rules(config: Config) -> Dict[str, str]:
+    """
+    return the lazy_loading entries of the config as a mapping of a table, a
+    table.relationship or "*" to the strategy of the relationships it matches
+    """
+    rules: Dict[str, str] = {}
+    for entry in config.lazy_loading:
+        key, _, strategy = (part.strip() for part in entry.rpartition(":"))
+        if not key:
+            raise ValueError(
+                f"unable to parse the lazy loading entry {entry!r}; expected "
+                '"table:strategy", "table.relationship:strategy" or "*:strategy"'
+            )
+        if strategy not in STRATEGIES:
+            raise ValueError(
+                f"unknown loading strategy {strategy!r} in {entry!r}; expected one "
+                f"of {', '.join(STRATEGIES)}"
+            )
+        rules[key] = strategy
+    return rules
+
+
+def strategy_for(
+    config: Config, rules: Dict[str, str], relationship: Relationship
+) -> Optional[str]:
+    """
+    return the loading strategy of the relationship: the one given for it by
+    name, else the one given for the table it refers to, else the one given for
+    "*", else the policy's (None leaves the generated default); the lazy_loading
+    entries, "*" included, take precedence over the policy
+    """
+    for key in (relationship.name, relationship.target, "*"):
+        if key in rules:
+            return rules[key]
+    if config.lazy_policy == "cdm":
+        if relationship.target in LOOKUP_TABLES and not relationship.collection:
+            return "selectin"
+        return "raise"
+    return None
+
+
+def is_collection(annotation: cst.Annotation) -> bool:
+    """True for a Mapped[list[...]] (or List, set or Set) annotation"""
+    mapped = annotation.annotation
+    if not (isinstance(mapped, cst.Subscript) and mapped.slice):
+        return False
+    element = mapped.slice[0].slice
+    return (
+        isinstance(element, cst.Index)
+        and isinstance(element.value, cst.Subscript)
+        and isinstance(element.value.value, cst.Name)
+        and element.value.value.value in ("list", "List", "set", "Set")
+    )
+
+
+class LoadingRewriter(cst.CSTTransformer):
+    """class for setting the lazy= argument of the relationships"""
+
+    def __init__(self, config: Config, class_tables: Dict[str, str]) -> None:
+        super().__init__()
+        self.config = config
+        self.rules = loading_rules(config)
+        self.class_tables = class_tables
+        self.table: Optional[str] = None
+        self.relationships: List[Tuple[Relationship, Optional[str]]] = []
+
+    def visit_ClassDef(self, node: cst.ClassDef) -> None:
+        """note the table of the class whose relationships follow"""
+        self.table = statement_table(node)
+
+    def leave_ClassDef(
+        self, original_node: cst.ClassDef, updated_node: cst.ClassDef
+    ) -> cst.ClassDef:
+        """forget the table of the class"""
+        self.table = None
+        return updated_node
+
+    def leave_AnnAssign(
+        self, original_node: cst.AnnAssign, updated_node: cst.AnnAssign
+    ) -> cst.AnnAssign:
+        """set the lazy= argument of a "name: Mapped[...] = relationship(...)" line"""
+        call = updated_node.value
+        if not (
+            self.table
+            and isinstance(updated_node.target, cst.Name)
+            and isinstance(call, cst.Call)
+            and isinstance(call.func, cst.Name)
+            and call.func.value == "relationship"
+            and call.args
+            and (target_class := string_value(call.args[0].value))
+        ):
+            return updated_node
+        relationship = Relationship(
+            self.table,
+            updated_node.target.value,
+            self.class_tables.get(target_class, ""),
+            is_collection(updated_node.annotation),
+        )
+        strategy = strategy_for(self.config, self.rules, relationship)
+        self.relationships.append((relationship, strategy))
+        if strategy is None:
+            return updated_node
+        args = [
+            arg
+            for arg in call.args
+            if not (arg.keyword and arg.keyword.value == "lazy")
+        ]
+        args.append(
+            cst.Arg(
+                keyword=cst.Name("lazy"),
+                value=cst.SimpleString(f'"{strategy}"'),
+                equal=cst.AssignEqual(
+                    whitespace_before=cst.SimpleWhitespace(""),
+                    whitespace_after=cst.SimpleWhitespace(""),
+                ),
+            )
+        )
+        return updated_node.with_changes(value=call.with_changes(args=args))
+
+
+def with_loading(
+    config: Config, source: str
+) -> Tuple[str, List[Tuple[Relationship, Optional[str]]]]:
+    """
+    return the model source with the loading strategies set, along with each
+    relationship and the strategy it was given (None when left as generated)
+    """
+    with span("parse"):
+        module = cst.parse_module(source)
+    class_tables = {
+        statement.name.value: table
+        for statement in module.body
+        if isinstance(statement, cst.ClassDef) and (table := statement_table(statement))
+    }
+    rewriter = LoadingRewriter(config, class_tables)
+    with span("visit"):
+        modified = module.visit(rewriter)
+    invalid = [
+        f"{relationship.name}:{strategy}"
+        for relationship, strategy in rewriter.relationships
+        if strategy in COLLECTION_STRATEGIES and not relationship.collection
+    ]
+    if invalid:
+        raise ValueError(
+            f"the {' and '.join(COLLECTION_STRATEGIES)} strategies only apply to "
+            f"collections, not to {', '.join(invalid)}"
+        )
+    with span("codegen"):
+        return modified.code, rewriter.relationships
+
+
+def set_relationship_loading(config: Config, source: str) -> str:
+    """
+    set the lazy= argument of the model's relationships from the lazy_policy and
+    lazy_loading settings; raises ValueError when an entry of lazy_loading
+    matches none of the generated relationships
+    """
+    result, relationships = with_loading(config, source)
+    if not relationships:
+        raise ValueError(
+            "the model has no relationships to set the loading strategy of"
+        )
+    names = {relationship.name for relationship, _ in relationships}
+    targets = {relationship.target for relationship, _ in relationships}
+    unmatched = sorted(
+        key
+        for key in loading_rules(config)
+        if key != "*" and key not in names and key not in targets
+    )
+    if unmatched:
+        raise ValueError(
+            f"the lazy loading entries for {', '.join(unmatched)} match none of "
+            "the model's relationships"
+        )
+    counts = Counter(strategy or "generated" for _, strategy in relationships)
+    logger.info(
+        "set the loading strategy of %s relationships (%s)",
+        len(relationships),
+        ", ".join(f"{strategy}: {count}" for strategy, count in sorted(counts.items())),
+    )
+    return result
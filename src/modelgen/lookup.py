@@ -0,0 +1,157 @@
+"""
+append precomputed lookups of the model's tables (classes, columns, primary keys
+and concept columns) to the model, as frozen module-level mappings
+"""
+
+import ast
+import logging
+import types
+from typing import Dict, List, Tuple
+
+from sqlalchemy import MetaData, Table
+
+from .config import Config
+from .formatting import black
+
+logger = logging.getLogger(__name__)
+
+# the first line of the lookups appended to the model; everything from it to the
+# end of the module is replaced when the lookups are added again
+REGISTRY_MARKER = "# lookups precomputed from the model's tables"
+
+REGISTRY_IMPORTS = (
+    "from types import MappingProxyType",
+    "from typing import Mapping, Tuple",
+)
+
+# the additional import needed by the lookups of the classes
+CLASSES_IMPORT = "from typing import Type"
+
+REGISTRY_HEADER = f"""\
+{REGISTRY_MARKER}, so that they needn't be
+# found by walking the mappers or the tables' columns at runtime
+"""
+
+CLASSES_TEMPLATE = """
+# the class of each table, keyed by table name
+class_by_table: Mapping[str, Type[{base}]] = MappingProxyType({{{classes}}})
+
+# the column names of each class's table, in order
+class_columns: Mapping[Type[{base}], Tuple[str, ...]] = MappingProxyType({{{columns}}})
+"""
+
+KEYS_TEMPLATE = """
+# the primary key columns of each table, keyed by table name
+primary_keys: Mapping[str, Tuple[str, ...]] = MappingProxyType({primary_keys!r})
+
+# the columns of each table which refer to concept.concept_id, keyed by table name
+concept_columns: Mapping[str, Tuple[str, ...]] = MappingProxyType({concept_columns!r})
+"""
+
+
+def concept_columns(table: Table) -> Tuple[str, ...]:
+    """return the columns of the table with a foreign key to the concept table"""
+    referring = {
+        element.parent.name
+        for constraint in table.foreign_key_constraints
+        for element in constraint.elements
+        if element.target_fullname.split(".")[-2:] == ["concept", "concept_id"]
+    }
+    return tuple(column.name for column in table.columns if column.name in referring)
+
+
+def without_registry(source: str) -> str:
+    """return the model source without the lookups appended to it earlier"""
+    if (start := source.find("\n" + REGISTRY_MARKER)) < 0:
+        return source
+    return source[:start].rstrip("\n") + "\n"
+
+
+def with_imports(source: str, imports: Tuple[str, ...]) -> str:
+    """insert the given import lines after the last top-level import"""
+    lines = source.splitlines(keepends=True)
+    last_import = max(
+        (
+            node.end_lineno or node.lineno
+            for node in ast.parse(source).body
+            if isinstance(node, (ast.Import, ast.ImportFrom))
+        ),
+        default=0,
+    )
+    lines[last_import:last_import] = [f"{line}\n" for line in imports]
+    return "".join(lines)
+
+
+def module_metadata(module: types.ModuleType) -> MetaData:
+    """return the MetaData the tables of the given model module are in"""
+    for value in vars(module).values():
+        metadata = (
+            value if isinstance(value, MetaData) else getattr(value, "metadata", None)
+        )
+        if isinstance(metadata, MetaData) and metadata.tables:
+            return metadata
+    raise ValueError("no MetaData with tables found in the model")
+
+
+def exec_model(source: str) -> types.ModuleType:
+    """
+    execute the given model source, returning it as a module; the lookups need the
+    classes the model maps, which only executing it gives
+    """
+    module = types.ModuleType("modelgen_model")
+    # pylint: disable-next=exec-used
+    exec(compile(source, "<model>", "exec"), module.__dict__)  # nosec: considered
+    return module
+
+
+def registry_source(config: Config, source: str) -> Tuple[Tuple[str, ...], str]:
+    """
+    return the imports needed by the lookups for the tables of the given model
+    source and the (formatted) lookups themselves; the lookups of the classes are
+    left out for Core tables
+    """
+    module = exec_model(source)
+    metadata = module_metadata(module)
+    tables: List[Table] = sorted(metadata.tables.values(), key=lambda t: t.name)
+    classes: Dict[str, str] = {
+        table.name: name
+        for name, value in vars(module).items()
+        if isinstance(value, type)
+        and isinstance(table := getattr(value, "__table__", None), Table)
+    }
+    imports: Tuple[str, ...] = REGISTRY_IMPORTS
+    registry = REGISTRY_HEADER
+    if classes:
+        imports += (CLASSES_IMPORT,)
+        registry += CLASSES_TEMPLATE.format(
+            base=config.base_class_name,
+            classes=", ".join(
+                f"{table.name!r}: {classes[table.name]}" for table in tables
+            ),
+            columns=", ".join(
+                f"{classes[table.name]}: "
+                f"{tuple(column.name for column in table.columns)!r}"
+                for table in tables
+            ),
+        )
+    registry += KEYS_TEMPLATE.format(
+        primary_keys={
+            table.name: tuple(column.name for column in table.primary_key.columns)
+            for table in tables
+        },
+        concept_columns={table.name: concept_columns(table) for table in tables},
+    )
+    logger.info("added lookups of %s tables (%s classes)", len(tables), len(classes))
+    return imports, black(config, registry)
+
+
+def add_lookup_registry(config: Config, source: str) -> str:
+    """
+    append (or replace) the lookups of the model's tables: the class of each
+    table, the ordered column names of each class, the primary key columns of
+    each table (including the eh_composite_pk_* keys) and the columns of each
+    table which refer to concept
+    """
+    source = without_registry(source)
+    imports, registry = registry_source(config, source)
+    return with_imports(source, imports) + "\n\n" + registry
@@ -0,0 +1,103 @@
+"""
+record of the fingerprint of each step's inputs from the previous run, used to
+skip the steps whose inputs have not changed since
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import threading
+from importlib.metadata import PackageNotFoundError, version
+from importlib.resources import files
+from typing import Any, Dict, Optional
+
+from .utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(data: Any) -> str:
+    """return a stable sha256 digest of the given json-serializable data"""
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, default=str).encode("utf8")
+    ).hexdigest()
+
+
+@functools.cache
+def package_fingerprint() -> str:
+    """return a digest of modelgen's own source code and bundled SQL"""
+    hasher = hashlib.sha256()
+    package = files(__package__)
+    for resource in sorted(
+        [*package.iterdir(), *package.joinpath("sql").iterdir()],
+        key=lambda resource: resource.name,
+    ):
+        if resource.name.endswith((".py", ".sql")):
+            hasher.update(resource.name.encode("utf8"))
+            hasher.update(resource.read_bytes())
+    return hasher.hexdigest()
+
+
+def tool_versions(*names: str) -> Dict[str, Optional[str]]:
+    """return a dict mapping the given distribution names to their versions"""
+    result: Dict[str, Optional[str]] = {}
+    for name in names:
+        try:
+            result[name] = version(name)
+        except PackageNotFoundError:
+            result[name] = None
+    return result
+
+
+class Manifest:
+    """the fingerprint and output object digest recorded for each step"""
+
+    path: str
+    steps: Dict[str, Dict[str, str]]
+
+    def __init__(self, path: str, steps: Optional[Dict[str, Dict[str, str]]] = None):
+        self.path = path
+        self.steps = steps or {}
+        # steps running concurrently record their results through the same manifest
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Manifest":
+        """load the manifest at the given path; a missing file is an empty one"""
+        try:
+            with open(path, "rt", encoding="utf8") as fh:
+                return cls(path, json.load(fh)["steps"])
+        except FileNotFoundError:
+            return cls(path)
+        except (KeyError, json.JSONDecodeError):
+            logger.warning("ignoring unreadable manifest %s", path)
+            return cls(path)
+
+    def save(self) -> None:
+        """atomically write the manifest to disk"""
+        atomic_write(self.path, json.dumps({"steps": self.steps}, indent=2))
+
+    def output_of(self, name: str, step_fingerprint: str) -> Optional[str]:
+        """
+        return the digest of the output the named step produced last time, if its
+        fingerprint then was the given one
+        """
+        entry = self.steps.get(name)
+        if entry and entry["fingerprint"] == step_fingerprint:
+            return entry["output"]
+        return None
+
+    def last_output(self, name: str) -> Optional[str]:
+        """return the digest of the output the named step last produced, if any"""
+        entry = self.steps.get(name)
+        return entry["output"] if entry else None
+
+    def record(self, name: str, step_fingerprint: str, output: str) -> None:
+        """
+        record the fingerprint and output digest of a step which just ran, and save
+        the manifest
+        """
+        with self.lock:
+            self.steps[name] = {"fingerprint": step_fingerprint, "output": output}
+            self.save()
@@ -0,0 +1,149 @@
+"""build the model for several CDM version / dialect targets in parallel"""
+
+import copy
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple
+
+from .config import Config
+from .dbinit import create_database, drop_database, ensure_template, get_engine
+from .pipeline import run, steps_for
+from .utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# the dialects a target can be built for: each target is built in a scratch
+# database on the configured (postgresql) server and the DDL parser only reads
+# the postgresql DDL
+SUPPORTED_DIALECTS = ("postgresql",)
+
+
+class Target(NamedTuple):
+    """one CDM version / dialect combination to build"""
+
+    cdm_version: str
+    dialect: str
+
+    @classmethod
+    def parse(cls, spec: str) -> "Target":
+        """parse a "cdm_version:dialect" target specification"""
+        cdm_version, sep, dialect = spec.partition(":")
+        if not sep or not cdm_version or not dialect:
+            raise ValueError(
+                f'unable to parse target "{spec}"; expected "cdm_version:dialect"'
+            )
+        if dialect.strip() not in SUPPORTED_DIALECTS:
+            raise ValueError(
+                f'unsupported dialect in target "{spec}"; the supported dialects '
+                f"are: {', '.join(SUPPORTED_DIALECTS)}"
+            )
+        return cls(cdm_version.strip(), dialect.strip())
+
+    @property
+    def slug(self) -> str:
+        """a name for this target which is safe to use as an identifier"""
+        return re.sub(r"\W+", "_", f"{self.cdm_version}_{self.dialect}").lower()
+
+
+def target_output_file(config: Config, target: Target) -> str:
+    """
+    return the output file for the given target; an output_file containing
+    {cdm_version} and/or {dialect} placeholders is formatted, otherwise the file is
+    placed in a per-target subdirectory
+    """
+    if "{" in config.output_file:
+        return config.output_file.format(
+            cdm_version=target.cdm_version, dialect=target.dialect
+        )
+    return os.path.join(
+        os.path.dirname(config.output_file),
+        target.cdm_version,
+        target.dialect,
+        os.path.basename(config.output_file),
+    )
+
+
+def target_config(config: Config, target: Target) -> Config:
+    """return a copy of the config which builds only the given target"""
+    result = copy.copy(config)
+    result.targets = []
+    result.cdm_version = target.cdm_version
+    result.db_dbms = target.dialect
+    result.output_file = target_output_file(config, target)
+    result.log_dir = os.path.join(config.log_dir, target.slug)
+    if config.metadata_source == "database":
+        result.db_name = f"modelgen_{target.slug}"
+    return result
+
+
+def build_target(config: Config, target: Target) -> Dict[str, Any]:
+    """build a single target, returning its entry for the summary report"""
+    job_config = target_config(config, target)
+    report: Dict[str, Any] = {
+        "cdm_version": target.cdm_version,
+        "dialect": target.dialect,
+        "output_file": job_config.output_file,
+    }
+    start = time.time()
+    try:
+        if config.metadata_source == "database":
+            template = (
+                ensure_template(config, job_config) if config.db_template else None
+            )
+            create_database(config, job_config.db_name, template)
+        try:
+            run(job_config, steps_for(job_config))
+        finally:
+            if config.metadata_source == "database":
+                get_engine(job_config).dispose()
+                drop_database(config, job_config.db_name)
+        report["status"] = "ok"
+    except Exception as exc:  # pylint: disable=broad-exception-caught
+        logger.exception("target %s failed", target.slug)
+        report["status"] = "failed"
+        report["error"] = f"{type(exc).__name__}: {exc}"
+    report["duration"] = time.time() - start
+    return report
+
+
+def build_matrix(config: Config) -> int:
+    """
+    build every configured target with a pool of config.jobs worker processes and
+    write a summary report; returns an integer suitable for use with sys.exit
+    """
+    targets = [Target.parse(spec) for spec in config.targets]
+    output_files = {target_output_file(config, target) for target in targets}
+    if len(output_files) < len(targets):
+        raise ValueError("the configured targets do not have distinct output files")
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=max(1, config.jobs)) as pool:
+        reports: List[Dict[str, Any]] = list(
+            pool.map(build_target, [config] * len(targets), targets)
+        )
+    duration = time.time() - start
+
+    report_file = os.path.join(
+        os.path.commonpath(
+            [os.path.dirname(os.path.abspath(path)) for path in output_files]
+        ),
+        "matrix.json",
+    )
+    atomic_write(
+        report_file,
+        json.dumps({"duration": duration, "targets": reports}, indent=2),
+    )
+    for report in reports:
+        logger.info(
+            "target %s %s: %s in %.1fs",
+            report["cdm_version"],
+            report["dialect"],
+            report["status"],
+            report["duration"],
+        )
+    logger.info("wrote matrix report to: %s", report_file)
+    return 0 if all(report["status"] == "ok" for report in reports) else 1
@@ -0,0 +1,298 @@
+"""
+split the finished model module into a package with one module per table class,
+whose __init__ imports each class on first access
+"""
+
+import ast
+import json
+import logging
+import os
+from typing import Dict, List, NamedTuple, Sequence, Set, Tuple, Union
+
+from .config import Config
+from .utils import atomic_write, camel_to_snake
+
+logger = logging.getLogger(__name__)
+
+# pylint checks disabled in every generated module of the package
+disabled_checks: Sequence[str] = (
+    "too-few-public-methods",
+    "unnecessary-pass",
+    "unsubscriptable-object",
+    "cyclic-import",
+)
+
+INIT_TEMPLATE = '''\
+"""{docstring}; the table classes are imported on first access"""
+
+# pylint: disable=undefined-all-variable
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Mapper
+
+from .base import {base}
+
+if TYPE_CHECKING:
+{type_imports}
+
+# the module defining each class
+_modules: Dict[str, str] = {modules}
+
+# the classes each class's relationships and foreign keys refer to, which have to
+# be loaded before its mapper can be configured
+_related: Dict[str, Tuple[str, ...]] = {related}
+
+__all__ = {all}
+
+
+def __getattr__(name: str) -> Any:
+    """import the named class on first access"""
+    if name not in _modules:
+        raise AttributeError(f"module {{__name__!r}} has no attribute {{name!r}}")
+    module = importlib.import_module(f".{{_modules[name]}}", __name__)
+    value = globals()[name] = getattr(module, name)
+    return value
+
+
+@event.listens_for(Mapper, "before_configured")
+def _load_related() -> None:
+    """
+    import the classes the imported classes refer to (and those they refer to)
+    when the mappers are configured, on the first query or instance of a class
+    """
+    pending = [name for name in _modules if name in globals()]
+    while pending:
+        for related in _related[pending.pop()]:
+            if related not in globals():
+                __getattr__(related)
+                pending.append(related)
+
+
+def __dir__() -> List[str]:
+    """list the classes of the package, including those not yet imported"""
+    return list(__all__)
+'''
+
+
+class Unit(NamedTuple):
+    """a top-level statement of the model which gets its own module"""
+
+    name: str
+    module: str
+    table: str
+    node: ast.stmt
+
+
+def package_dir(config: Config) -> str:
+    """return the directory of the package written in the package output layout"""
+    root, ext = os.path.splitext(config.output_file)
+    return root if ext == ".py" else config.output_file
+
+
+def used_names(node: ast.AST) -> Set[str]:
+    """return the names (and the roots of dotted names) used within the node"""
+    return {child.id for child in ast.walk(node) if isinstance(child, ast.Name)}
+
+
+def string_args(call: ast.Call) -> List[str]:
+    """return the string constants among the positional args of a call"""
+    result: List[str] = []
+    for arg in call.args:
+        elements = arg.elts if isinstance(arg, (ast.List, ast.Tuple)) else [arg]
+        result += [
+            element.value
+            for element in elements
+            if isinstance(element, ast.Constant) and isinstance(element.value, str)
+        ]
+    return result
+
+
+def referenced(node: ast.AST) -> Set[str]:
+    """
+    return the class names (from relationship() calls) and table names (from
+    foreign keys, prefixed with "table:") the given statement refers to
+    """
+    result: Set[str] = set()
+    for call in ast.walk(node):
+        if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name):
+            continue
+        strings = string_args(call)
+        if call.func.id == "relationship" and strings:
+            result.add(strings[0])
+        elif call.func.id == "ForeignKeyConstraint" and len(call.args) > 1:
+            refs = string_args(ast.Call(call.func, call.args[1:], []))
+            result |= {"table:" + ref.split(".")[-2] for ref in refs if "." in ref}
+        elif call.func.id == "ForeignKey" and strings and "." in strings[0]:
+            result.add("table:" + strings[0].split(".")[-2])
+    return result
+
+
+def unit_for(node: ast.stmt) -> Unit:
+    """return the unit for a top-level statement (a class or a Table assignment)"""
+    if isinstance(node, ast.ClassDef):
+        table = ""
+        for statement in node.body:
+            if (
+                isinstance(statement, ast.Assign)
+                and any(
+                    isinstance(target, ast.Name) and target.id == "__tablename__"
+                    for target in statement.targets
+                )
+                and isinstance(statement.value, ast.Constant)
+            ):
+                table = str(statement.value.value)
+        return Unit(node.name, table or camel_to_snake(node.name), table, node)
+    if (
+        isinstance(node, ast.Assign)
+        and len(node.targets) == 1
+        and isinstance(node.targets[0], ast.Name)
+    ):
+        name = node.targets[0].id
+        table = ""
+        if isinstance(node.value, ast.Call) and (strings := string_args(node.value)):
+            table = strings[0]
+        return Unit(name, table or name.lower(), table, node)
+    raise ValueError(f"unable to place statement in a module: {ast.unparse(node)}")
+
+
+ImportStatement = Union[ast.Import, ast.ImportFrom]
+
+
+def imports_for(imports: Sequence[ImportStatement], names: Set[str]) -> List[str]:
+    """return the given import statements, reduced to the names in the given set"""
+    result: List[str] = []
+    for statement in imports:
+        aliases = [
+            alias
+            for alias in statement.names
+            if (alias.asname or alias.name).split(".")[0] in names
+        ]
+        if aliases:
+            result.append(
+                ast.unparse(
+                    ast.Import(aliases)
+                    if isinstance(statement, ast.Import)
+                    else ast.ImportFrom(statement.module, aliases, statement.level)
+                )
+            )
+    return result
+
+
+def module_source(
+    docstring: str, imports: List[str], code: str, type_imports: List[str]
+) -> str:
+    """assemble the source of one module of the package"""
+    lines = [f'"""{docstring}"""', ""]
+    lines += [f"# pylint: disable={check}" for check in disabled_checks]
+    lines += imports
+    if type_imports:
+        lines += ["from typing import TYPE_CHECKING", "", "if TYPE_CHECKING:"]
+        lines += [f"    {line}" for line in type_imports]
+    lines += ["", "", code, ""]
+    return "\n".join(lines)
+
+
+def parse_model(source: str) -> Tuple[str, List[ImportStatement], List[Unit]]:
+    """return the docstring, the import statements and the units of the model"""
+    tree = ast.parse(source)
+    imports: List[ImportStatement] = []
+    units: List[Unit] = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append(node)
+        elif not (
+            isinstance(node, ast.Expr)
+            and isinstance(node.value, ast.Constant)
+            and isinstance(node.value.value, str)
+        ):
+            units.append(unit_for(node))
+    return (ast.get_docstring(tree) or "").strip(), imports, units
+
+
+def init_source(
+    docstring: str, base: str, modules: Dict[str, str], related: Dict[str, List[str]]
+) -> str:
+    """return the source of the package's __init__ module"""
+    names = [name for name in modules if name != base]
+    return INIT_TEMPLATE.format(
+        docstring=docstring,
+        base=base,
+        type_imports="\n".join(f"    from .{modules[n]} import {n}" for n in names),
+        modules=repr({name: modules[name] for name in names}),
+        related=repr({name: tuple(related[name]) for name in names}),
+        all=repr([base, *names]),
+    )
+
+
+def split_package(config: Config, source: str) -> str:
+    """
+    split the given model source into the modules of a package; the result is a
+    json object mapping each module's file name to its (unformatted) source
+    """
+    lines = source.splitlines()
+    docstring, imports, units = parse_model(source)
+
+    base = config.base_class_name
+    if base not in [unit.name for unit in units]:
+        raise ValueError(f"base class {base} not found in the model")
+    modules = {
+        unit.name: ("base" if unit.name == base else unit.module) for unit in units
+    }
+    if len(set(modules.values())) < len(modules):
+        raise ValueError("the model's classes do not have distinct module names")
+    classes = {unit.table: unit.name for unit in units if unit.table}
+
+    files: Dict[str, str] = {}
+    related: Dict[str, List[str]] = {}
+    for unit in units:
+        names = used_names(unit.node)
+        unit_imports = imports_for(imports, names)
+        refs = sorted(
+            {
+                classes.get(ref.removeprefix("table:"), "") if ":" in ref else ref
+                for ref in referenced(unit.node)
+            }
+            & set(modules) - {unit.name, base}
+        )
+        if unit.name != base:
+            related[unit.name] = refs
+            if base in names:
+                unit_imports.append(f"from .base import {base}")
+        files[f"{modules[unit.name]}.py"] = module_source(
+            f"{docstring}: {unit.table or unit.name}",
+            unit_imports,
+            "\n".join(lines[unit.node.lineno - 1 : unit.node.end_lineno]),
+            [f"from .{modules[ref]} import {ref}" for ref in refs],
+        )
+
+    files["__init__.py"] = init_source(docstring, base, modules, related)
+    logger.info("split the model into %s modules", len(files))
+    return json.dumps(files, indent=2)
+
+
+def write_package(config: Config, source: str) -> str:
+    """
+    write the modules of the package (given as json) to the package directory,
+    removing the modules (of tables which are no longer generated) it doesn't have
+    """
+    directory = package_dir(config)
+    files: Dict[str, str] = json.loads(source)
+    written = 0
+    for filename, content in files.items():
+        path = os.path.join(directory, filename)
+        try:
+            with open(path, "rt", encoding="utf8", errors="strict") as fh:
+                if fh.read() == content:
+                    continue
+        except FileNotFoundError:
+            pass
+        atomic_write(path, content)
+        written += 1
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".py") and filename not in files:
+            os.remove(os.path.join(directory, filename))
+            logger.info("removed stale module from package: %s", filename)
+    logger.info("wrote %s of %s modules to package: %s", written, len(files), directory)
+    return source
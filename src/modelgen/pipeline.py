@@ -0,0 +1,652 @@
+"""the sequence of steps which produce the model file"""
+
+import contextvars
+import functools
+import importlib
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeAlias,
+)
+
+from .cache import HTTPCache, sha256_hex
+from .config import Config
+from .manifest import Manifest, fingerprint, package_fingerprint, tool_versions
+from .profiling import profiled, span, write_report
+from .utils import atomic_write, companion_path
+
+logger = logging.getLogger(__name__)
+
+# each step receives the model source produced by the previous step and returns
+# the (possibly) updated source; the source is only written to disk at the end
+StepFunc: TypeAlias = Callable[[Config, str], str]
+StepInputs: TypeAlias = Callable[[Config], Mapping[str, Any]]
+
+
+class Step(NamedTuple):
+    """
+    a pipeline step; "inputs" returns everything (besides the previous step's
+    output) which determines the step's result, steps without inputs always run
+    and pass the source through unchanged; "side_effect" steps act on the
+    database, the download cache or the files written next to the model rather
+    than on the model source, they don't take part in passing the source along
+    (though they receive the source of the first source passing step they
+    need, if any); a step starts once the steps
+    named in "needs" (those which are part of the pipeline) have finished, as
+    well as, unless it is a side effect step, the previous step which passes the
+    source along
+    """
+
+    func: StepFunc
+    inputs: Optional[StepInputs] = None
+    side_effect: bool = False
+    needs: Tuple[str, ...] = ()
+
+    @property
+    def name(self) -> str:
+        """the name of the step"""
+        return self.func.__name__
+
+
+def lazy(module: str, name: str) -> Callable[..., Any]:
+    """
+    return a function which imports the named function from the given modelgen
+    module when it is first called, so each step's (often slow to import)
+    dependencies are only loaded when that step actually runs
+    """
+
+    def func(*args: Any, **kwargs: Any) -> Any:
+        implementation = getattr(
+            importlib.import_module(f".{module}", __package__), name
+        )
+        return implementation(*args, **kwargs)
+
+    func.__name__ = func.__qualname__ = name
+    return func
+
+
+def source_unchanged(func: Callable[[Config], None]) -> StepFunc:
+    """adapt a step which doesn't deal with the model source"""
+
+    @functools.wraps(func)
+    def step(config: Config, source: str) -> str:
+        func(config)
+        return source
+
+    return step
+
+
+def write_output(config: Config, source: str) -> str:
+    """atomically write the finished model source to the output file"""
+    try:
+        with open(config.output_file, "rt", encoding="utf8", errors="strict") as fh:
+            unchanged = fh.read() == source
+    except FileNotFoundError:
+        unchanged = False
+    if unchanged:
+        logger.info("model unchanged: %s", config.output_file)
+        return source
+    atomic_write(config.output_file, source)
+    logger.info("wrote model to: %s", config.output_file)
+    return source
+
+
+def initdb_inputs(config: Config) -> Dict[str, Any]:
+    """the inputs of the initdb step"""
+    # pylint: disable=import-outside-toplevel
+    from .dbinit import ddl_inputs
+
+    return {
+        **ddl_inputs(config),
+        "db": [config.db_host, config.db_port, config.db_name, config.db_user],
+        "tools": tool_versions("sqlalchemy", "psycopg2-binary"),
+    }
+
+
+def sqlacodegen_inputs(config: Config) -> Dict[str, Any]:
+    """the inputs of the sqlacodegen step"""
+    # pylint: disable=import-outside-toplevel
+    from .dbinit import ddl_inputs
+
+    return {
+        **ddl_inputs(config),
+        "metadata_source": config.metadata_source,
+        "generator": config.generator,
+        "options": config.options,
+        "tools": tool_versions("sqlalchemy", "sqlacodegen"),
+    }
+
+
+def rewrite_inputs(config: Config) -> Dict[str, Any]:
+    """the inputs of the docstring rewrite step"""
+    cache = HTTPCache.from_config(config)
+    return {
+        "docs": sha256_hex(cache.get(config.base_doc_url)),
+        "base_doc_url": config.base_doc_url,
+        "base_class_name": config.base_class_name,
+        "base_class_desc": config.base_class_desc,
+        "generator": config.generator,
+        "metadata_name": config.metadata_name,
+        "partition_by": config.partition_by,
+        "async_model": config.async_model,
+        "tools": tool_versions("libcst"),
+    }
+
+
+def connect_inputs(config: Config) -> Dict[str, Any]:
+    """
+    the inputs of the connect step: the server it connects to, so the step is
+    only run when a step which needs the database has to run (see run)
+    """
+    return {"db": [config.db_host, config.db_port, config.db_name, config.db_user]}
+
+
+def database_steps(config: Config) -> Tuple[Sequence[Step], Tuple[str, ...]]:
+    """
+    return the steps which populate the database and the names of the steps the
+    model generation has to wait for
+    """
+    if config.metadata_source == "ddl":
+        return (), ("fetch_ddl",)
+    return (
+        # waits for the DDL, so whether initdb (and with it the connections) is
+        # needed at all can be told from the fingerprints of the steps after it
+        Step(
+            source_unchanged(lazy("dbinit", "connect")),
+            connect_inputs,
+            side_effect=True,
+            needs=("fetch_ddl",),
+        ),
+        Step(
+            source_unchanged(lazy("dbinit", "initdb")),
+            initdb_inputs,
+            side_effect=True,
+            needs=("fetch_ddl", "connect"),
+        ),
+    ), ("initdb",)
+
+
+def model_steps_for(
+    config: Config, sqlacodegen_needs: Tuple[str, ...]
+) -> Sequence[Step]:
+    """return the steps which generate and rewrite the model source"""
+    model_steps: Sequence[Step] = (
+        Step(
+            lazy("codegen", "sqlacodegen"),
+            sqlacodegen_inputs,
+            needs=sqlacodegen_needs,
+        ),
+        Step(
+            lazy("rewrite", "rename_base_and_add_docstrings"),
+            rewrite_inputs,
+            needs=("fetch_docs",),
+        ),
+    )
+    if config.lazy_policy != "generated" or config.lazy_loading:
+        if config.generator == "tables":
+            raise ValueError(
+                "relationship loading strategies need a class-based generator, not "
+                "the tables generator"
+            )
+        model_steps = (
+            *model_steps,
+            Step(
+                lazy("loading", "set_relationship_loading"),
+                lambda config: {
+                    "lazy_policy": config.lazy_policy,
+                    "lazy_loading": config.lazy_loading,
+                    "tools": tool_versions("libcst"),
+                },
+            ),
+        )
+    if config.lookup_registry:
+        if config.output_layout == "package":
+            raise ValueError(
+                "the lookup registry needs the module output layout, not package"
+            )
+        model_steps = (
+            *model_steps,
+            Step(
+                lazy("lookup", "add_lookup_registry"),
+                lambda config: {"base_class_name": config.base_class_name},
+            ),
+        )
+    return model_steps
+
+
+def incremental_steps(sqlacodegen_needs: Tuple[str, ...]) -> Sequence[Step]:
+    """return the step which generates, rewrites and formats the changed classes"""
+    return (
+        Step(
+            lazy("incremental", "regenerate"),
+            lambda config: {
+                **sqlacodegen_inputs(config),
+                **rewrite_inputs(config),
+                "lookup_registry": config.lookup_registry,
+                "lazy_policy": config.lazy_policy,
+                "lazy_loading": config.lazy_loading,
+                "formatters": tool_versions("isort", "black"),
+            },
+            needs=(*sqlacodegen_needs, "fetch_docs"),
+        ),
+    )
+
+
+def layout_steps(config: Config) -> Sequence[Step]:
+    """return the steps which format and write the model in the output layout"""
+    if config.output_layout != "package":
+        return (
+            Step(lazy("formatting", "isort"), lambda config: tool_versions("isort")),
+            Step(lazy("formatting", "black"), lambda config: tool_versions("black")),
+            Step(write_output),
+        )
+    if config.generator == "tables":
+        raise ValueError(
+            "the package output layout needs a class-based generator, "
+            "not the tables generator"
+        )
+    return (
+        Step(
+            lazy("package", "split_package"),
+            lambda config: {"base": config.base_class_name},
+        ),
+        Step(
+            lazy("formatting", "format_package"),
+            lambda config: tool_versions("isort", "black"),
+        ),
+        Step(lazy("package", "write_package")),
+    )
+
+
+def written_digest(config: Config, suffix: str) -> Optional[str]:
+    """
+    return the digest of the module with the given suffix written next to the
+    model (None if there is none), so the step writing it reruns when the module
+    was changed or removed since
+    """
+    try:
+        with open(companion_path(config.output_file, suffix), "rb") as fh:
+            return sha256_hex(fh.read())
+    except FileNotFoundError:
+        return None
+
+
+def session_inputs(config: Config) -> Dict[str, Any]:
+    """the inputs of the session module step"""
+    return {
+        "base_class_name": config.base_class_name,
+        "async_pool_size": config.async_pool_size,
+        "async_max_overflow": config.async_max_overflow,
+        "written": written_digest(config, "_session.py"),
+        "formatters": tool_versions("isort", "black"),
+    }
+
+
+def row_types_inputs(config: Config) -> Dict[str, Any]:
+    """the inputs of the row types step (besides the model source it receives)"""
+    return {
+        "written": written_digest(config, "_rows.py"),
+        "formatters": tool_versions("isort", "black"),
+    }
+
+
+def loader_inputs(config: Config) -> Dict[str, Any]:
+    """the inputs of the bulk loader step"""
+    # pylint: disable=import-outside-toplevel
+    from .dbinit import ddl_inputs
+
+    return {
+        **ddl_inputs(config),
+        "metadata_source": config.metadata_source,
+        "written": written_digest(config, "_load.py"),
+        "tools": tool_versions("sqlalchemy", "isort", "black"),
+    }
+
+
+def companion_steps(
+    config: Config, sqlacodegen_needs: Tuple[str, ...], model_step: str
+) -> Sequence[Step]:
+    """
+    return the steps which write the modules generated next to the model; they
+    are side effect steps, so they run alongside the formatting of the model:
+    the row types wait for the model source (before it is split or formatted)
+    of the given model step, the bulk loader only for the schema
+    """
+    steps: Sequence[Step] = ()
+    if config.async_model:
+        if config.generator == "tables":
+            raise ValueError(
+                "the async model needs a class-based generator, not the tables "
+                "generator"
+            )
+        steps = (
+            *steps,
+            Step(
+                lazy("session", "write_session_module"),
+                session_inputs,
+                side_effect=True,
+            ),
+        )
+    if config.row_types:
+        if config.generator == "tables":
+            raise ValueError(
+                "the row types need a class-based generator, not the tables generator"
+            )
+        steps = (
+            *steps,
+            Step(
+                lazy("rowtypes", "write_row_types"),
+                row_types_inputs,
+                side_effect=True,
+                needs=(model_step,),
+            ),
+        )
+    if config.bulk_loader:
+        steps = (
+            *steps,
+            Step(
+                lazy("loader", "write_loader"),
+                loader_inputs,
+                side_effect=True,
+                needs=sqlacodegen_needs,
+            ),
+        )
+    return steps
+
+
+def check_steps(config: Config) -> Sequence[Step]:
+    """return the steps which check the written model"""
+    steps: Sequence[Step] = ()
+    if config.verify:
+        if config.metadata_source == "ddl":
+            raise ValueError(
+                "verifying the model needs the database metadata source, not ddl"
+            )
+        # the database has to be populated even when the model is unchanged,
+        # e.g. in the fresh scratch database of a matrix target
+        steps = (*steps, Step(lazy("verify", "verify"), needs=("initdb",)))
+    if config.benchmark_import:
+        steps = (*steps, Step(lazy("importbench", "benchmark_import")))
+    return steps
+
+
+def steps_for(config: Config) -> Sequence[Step]:
+    """return the steps needed to produce the model with the given config"""
+    db_steps, sqlacodegen_needs = database_steps(config)
+    model_steps = model_steps_for(config, sqlacodegen_needs)
+    output_steps = layout_steps(config)
+    if config.incremental:
+        model_steps = incremental_steps(sqlacodegen_needs)
+        output_steps = (Step(write_output),)
+    return (
+        Step(source_unchanged(lazy("fetch", "fetch_ddl")), side_effect=True),
+        Step(source_unchanged(lazy("fetch", "fetch_docs")), side_effect=True),
+        *db_steps,
+        *model_steps,
+        *companion_steps(config, sqlacodegen_needs, model_steps[-1].name),
+        *output_steps,
+        *check_steps(config),
+    )
+
+
+def step_fingerprint(config: Config, step: Step, source: str) -> Optional[str]:
+    """
+    return the fingerprint of running the step on the given source (None for
+    steps without inputs); it covers the step's inputs, the source it receives and
+    modelgen's own code, so a step's recorded output stays valid however its
+    input source was produced
+    """
+    if step.inputs is None:
+        return None
+    return fingerprint(
+        {
+            "code": package_fingerprint(),
+            "step": step.name,
+            "source": sha256_hex(source.encode("utf8")),
+            "inputs": step.inputs(config),
+        }
+    )
+
+
+def selected_steps(config: Config, steps: Sequence[Step]) -> List[bool]:
+    """
+    return whether each step is selected to run, given config.steps (only run
+    these) and config.skip (don't run these)
+    """
+    names = [step.name for step in steps]
+    for name in [*config.steps, *config.skip]:
+        if name not in names:
+            raise ValueError(f"unknown step {name}; the steps are: {', '.join(names)}")
+    return [
+        (not config.steps or name in config.steps) and name not in config.skip
+        for name in names
+    ]
+
+
+def dependencies(steps: Sequence[Step]) -> List[Set[int]]:
+    """
+    return the indices of the steps each step has to wait for: the steps it
+    names in "needs" and the previous step which passes the source along
+    """
+    index = {step.name: i for i, step in enumerate(steps)}
+    result: List[Set[int]] = []
+    previous: Optional[int] = None
+    for i, step in enumerate(steps):
+        deps = {index[name] for name in step.needs if name in index}
+        if not step.side_effect:
+            if previous is not None:
+                deps.add(previous)
+            previous = i
+        result.append(deps)
+    return result
+
+
+def critical_path(
+    deps: Sequence[Set[int]], durations: Sequence[float]
+) -> Tuple[List[int], float]:
+    """
+    return the chain of dependent steps with the longest total duration (which
+    bounds the run's duration) and that total
+    """
+    totals: List[float] = []
+    longest: List[Optional[int]] = []
+    for i, step_deps in enumerate(deps):
+        before = max(step_deps, key=lambda d: totals[d], default=None)
+        longest.append(before)
+        totals.append(durations[i] + (totals[before] if before is not None else 0))
+    path: List[int] = []
+    current = max(range(len(totals)), key=totals.__getitem__, default=None)
+    total = totals[current] if current is not None else 0.0
+    while current is not None:
+        path.insert(0, current)
+        current = longest[current]
+    return path, total
+
+
+class PipelineRun:
+    """
+    the state of one run of the pipeline's steps: the manifest of the previous
+    run, which steps are selected, what each step waits for, and the output and
+    duration of each finished step
+    """
+
+    def __init__(self, config: Config, steps: Sequence[Step]) -> None:
+        self.config = config
+        self.steps = steps
+        self.manifest = Manifest.load(config.output_file + ".manifest.json")
+        self.cache = HTTPCache.from_config(config)
+        self.selected = selected_steps(config, steps)
+        self.deps = dependencies(steps)
+        # the source each step passes along and how long it took, once finished
+        self.finished: Dict[int, Tuple[str, float]] = {}
+
+    def source_for(self, i: int) -> Optional[str]:
+        """
+        return the source step i receives, if it is known: the output of the
+        first step it depends on which passes the source along (side effect
+        steps only depend on the steps they need), if there is one
+        """
+        chained = sorted(d for d in self.deps[i] if not self.steps[d].side_effect)
+        if not chained:
+            return ""
+        return self.finished[chained[0]][0] if chained[0] in self.finished else None
+
+    def reusable(self, i: int, current: Optional[str]) -> Optional[str]:
+        """
+        return the recorded output digest if step i (whose fingerprint is
+        "current") can be skipped
+        """
+        if self.config.force or current is None:
+            return None
+        output = self.manifest.output_of(self.steps[i].name, current)
+        if output is None or not self.cache.has_object(output):
+            return None
+        if self.steps[i].side_effect:
+            # the database is only needed when a step depending on it has to run
+            for j, step_deps in enumerate(self.deps):
+                if i not in step_deps or not self.selected[j]:
+                    continue
+                source = self.source_for(j)
+                if source is None or not self.reusable(
+                    j, step_fingerprint(self.config, self.steps[j], source)
+                ):
+                    return None
+        return output
+
+    def unselected(self, i: int, source: str) -> str:
+        """return the output of step i, which is not selected to run"""
+        step = self.steps[i]
+        if step.inputs is None or step.side_effect:
+            logger.info("step %s; %s not selected", i + 1, step.name)
+            return source
+        output = self.manifest.last_output(step.name)
+        if output is None or not self.cache.has_object(output):
+            raise ValueError(
+                f"step {step.name} is not selected and has no recorded "
+                "output to use instead; run it first"
+            )
+        logger.info("step %s; %s not selected, using its last output", i + 1, step.name)
+        with span(step.name, skipped=True):
+            return self.cache.read_object(output).decode("utf8")
+
+    def execute(self, i: int, source: str) -> str:
+        """run (or skip) step i on the given source, returning its output"""
+        step = self.steps[i]
+        step_num = i + 1
+        if not self.selected[i]:
+            return self.unselected(i, source)
+        with span("fingerprint", step=step.name):
+            current = step_fingerprint(self.config, step, source)
+        if (output := self.reusable(i, current)) is not None:
+            logger.info("step %s; %s unchanged, skipping", step_num, step.name)
+            with span(step.name, skipped=True):
+                return self.cache.read_object(output).decode("utf8")
+        logger.info("step %s; %s", step_num, step.name)
+        with span(step.name) as timing, profiled(self.config, timing):
+            result = step.func(self.config, source)
+        logger.debug("step %s; %s done in %ss", step_num, step.name, timing.duration)
+        if current is not None and step.side_effect:
+            # the inputs of a side effect step may cover what it wrote (see
+            # written_digest), so they're taken again once it has run
+            current = step_fingerprint(self.config, step, source)
+        if current is not None:
+            output = self.cache.put_object(result.encode("utf8"))
+            self.manifest.record(step.name, current, output)
+        return result
+
+    def timed(self, i: int, source: str) -> Tuple[str, float]:
+        """execute step i, returning its output and how long it took"""
+        start = time.perf_counter()
+        output = self.execute(i, source)
+        return output, time.perf_counter() - start
+
+    def ready(self, pending: List[int]) -> List[Tuple[int, str]]:
+        """
+        remove the steps whose dependencies have finished from the pending ones,
+        returning them with the source each receives
+        """
+        result: List[Tuple[int, str]] = []
+        for i in [i for i in pending if self.deps[i] <= self.finished.keys()]:
+            pending.remove(i)
+            source = self.source_for(i)
+            if source is None:
+                raise ValueError(
+                    f"step {self.steps[i].name} is ready before the step it "
+                    "receives the model source from has finished"
+                )
+            result.append((i, source))
+        return result
+
+    def run_steps(self) -> None:
+        """run every step once the steps it depends on have finished"""
+        # cProfile and tracemalloc can't tell concurrent steps apart
+        workers = (
+            1 if self.config.profile or self.config.trace_memory else len(self.steps)
+        )
+        with ThreadPoolExecutor(max_workers=workers or 1) as pool:
+            running: Dict[Future, int] = {}
+            pending = list(range(len(self.steps)))
+            while pending or running:
+                for i, source in self.ready(pending):
+                    future = pool.submit(
+                        contextvars.copy_context().run, self.timed, i, source
+                    )
+                    running[future] = i
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    try:
+                        self.finished[i] = future.result()
+                    except BaseException:
+                        for other in running:
+                            other.cancel()
+                        raise
+
+    def result(self) -> str:
+        """return the source the last step which passes the source along output"""
+        chained = [i for i, step in enumerate(self.steps) if not step.side_effect]
+        return self.finished[chained[-1]][0] if chained else ""
+
+    def durations(self) -> List[float]:
+        """return how long each step took"""
+        return [self.finished[i][1] for i in range(len(self.steps))]
+
+
+def run(config: Config, steps: Sequence[Step]) -> str:
+    """
+    run the given steps, each as soon as the steps it depends on have finished
+    (see dependencies) so that independent steps run concurrently, returning the
+    final model source; steps whose fingerprint matches the manifest of the
+    previous run are skipped (unless config.force is set) and their recorded
+    output is used instead; steps which are not selected (see selected_steps)
+    don't run either, the output they last recorded is used instead; the
+    critical path through the steps is logged and added to the timing report
+    """
+    pipeline = PipelineRun(config, steps)
+    with span("pipeline", output_file=config.output_file) as root:
+        pipeline.run_steps()
+        durations = pipeline.durations()
+        path, total = critical_path(pipeline.deps, durations)
+        root.attrs["critical_path"] = [steps[i].name for i in path]
+        root.attrs["critical_path_duration"] = total
+        root.attrs["work_duration"] = sum(durations)
+    logger.info(
+        "critical path: %s (%.3fs of %.3fs, %.3fs of work in all steps)",
+        " -> ".join(root.attrs["critical_path"]),
+        total,
+        root.duration,
+        sum(durations),
+    )
+    write_report(config, root)
+    return pipeline.result()
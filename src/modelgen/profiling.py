@@ -0,0 +1,91 @@
+"""nested timing spans and opt-in cProfile / tracemalloc capture for the pipeline"""
+
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import Config
+from .utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    """a named, timed section of the run which may contain nested spans"""
+
+    name: str
+    attrs: Dict[str, Any]
+    children: List["Span"] = field(default_factory=list)
+    start: float = field(default_factory=time.perf_counter)
+    duration: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        """return a json-serializable representation of this span and its children"""
+        result: Dict[str, Any] = {"name": self.name, "duration": self.duration}
+        result.update(self.attrs)
+        if self.children:
+            result["children"] = [child.as_dict() for child in self.children]
+        return result
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+@contextlib.contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    time the enclosed block as a span nested in the current span; work handed to
+    other threads should be run in a copy of the current context
+    (contextvars.copy_context) for its spans to be nested correctly
+    """
+    parent = _current_span.get()
+    current = Span(name, attrs)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - current.start
+        _current_span.reset(token)
+
+
+@contextlib.contextmanager
+def profiled(config: Config, current: Span) -> Iterator[None]:
+    """
+    optionally capture a cProfile of the enclosed block (written to the log dir)
+    and its peak traced memory (recorded on the given span)
+    """
+    profiler: Optional[cProfile.Profile] = None
+    if config.trace_memory:
+        tracemalloc.start()
+    if config.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(config.log_dir, exist_ok=True)
+            path = os.path.join(config.log_dir, f"{current.name}.prof")
+            profiler.dump_stats(path)
+            current.attrs["profile"] = path
+        if config.trace_memory:
+            current.attrs["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+
+def write_report(config: Config, root: Span) -> None:
+    """write the json timing report for the given span tree to the log dir"""
+    path = os.path.join(config.log_dir, "timing.json")
+    atomic_write(path, json.dumps(root.as_dict(), indent=2))
+    logger.info("wrote timing report to: %s", path)
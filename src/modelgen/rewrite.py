@@ -1,27 +1,276 @@
 #!/usr/bin/env python3
-""" utility for adjusting the generated model's doc comments, base class name,  """
+"""utility for adjusting the generated model's doc comments, base class name,"""
+
 # pylint: disable=invalid-name
 import logging
-from typing import Sequence
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
 
 import libcst as cst
 
+from .cache import HTTPCache
 from .config import Config
+from .profiling import span
 from .rtfm import get_omopcdm_descriptions
 from .utils import camel_to_snake
 
+if TYPE_CHECKING:
+    from .ddlparse import Partition
+
 logger = logging.getLogger(__name__)
 
 DOC_COMMENT_SPACER = "\n    "
 
 
+def string_value(node: cst.BaseExpression) -> Optional[str]:
+    """return the value of the given string literal node, if it is one"""
+    if isinstance(node, cst.SimpleString) and isinstance(
+        value := node.evaluated_value, str
+    ):
+        return value
+    return None
+
+
+def table_definition(statement: cst.CSTNode) -> Optional[Tuple[str, str, List[str]]]:
+    """
+    return the variable name, table name and column names of a Core
+    "t_name = Table('name', metadata, Column('column', ...), ...)" statement
+    """
+    if not (
+        isinstance(statement, cst.SimpleStatementLine)
+        and isinstance(assign := statement.body[0], cst.Assign)
+        and len(assign.targets) == 1
+        and isinstance(target := assign.targets[0].target, cst.Name)
+        and isinstance(call := assign.value, cst.Call)
+        and isinstance(call.func, cst.Name)
+        and call.func.value == "Table"
+        and call.args
+        and (table_name := string_value(call.args[0].value))
+    ):
+        return None
+    columns = [
+        column
+        for arg in call.args
+        if isinstance(arg.value, cst.Call)
+        and isinstance(arg.value.func, cst.Name)
+        and arg.value.func.value == "Column"
+        and arg.value.args
+        and (column := string_value(arg.value.args[0].value))
+    ]
+    return target.value, table_name, columns
+
+
+def statement_table(statement: cst.CSTNode) -> Optional[str]:
+    """return the name of the table a class (or Table assignment) is for"""
+    if isinstance(statement, cst.ClassDef):
+        for line in statement.body.body:
+            if (
+                isinstance(line, cst.SimpleStatementLine)
+                and isinstance(assign := line.body[0], cst.Assign)
+                and isinstance(target := assign.targets[0].target, cst.Name)
+                and target.value == "__tablename__"
+            ):
+                return string_value(assign.value)
+        return None
+    if definition := table_definition(statement):
+        return definition[1]
+    return None
+
+
 class ModelRewriter(cst.CSTTransformer):
     """class for adding docstrings to class definitions"""
 
     def __init__(self, config: Config) -> None:
         super().__init__()
         self.config = config
-        self.doc_map = get_omopcdm_descriptions(config.base_doc_url)
+        self.doc_map = get_omopcdm_descriptions(
+            config.base_doc_url, HTTPCache.from_config(config)
+        )
+        self.partitions: Dict[str, "Partition"] = {}
+        if config.partition_by:
+            # dbinit (and with it sqlalchemy) is slow to import, so the rewrite
+            # only loads it when there are partitioned tables
+            # pylint: disable=import-outside-toplevel
+            from .dbinit import partitions
+
+            self.partitions = partitions(config)
+
+    @property
+    def core(self) -> bool:
+        """True when the model is made of Core Table objects (the tables generator)"""
+        return self.config.generator == "tables"
+
+    def leave_Call(self, original_node: cst.Call, updated_node: cst.Call) -> cst.Call:
+        """rename the MetaData argument of the Table calls of Core tables output"""
+        if not (
+            self.core
+            and isinstance(updated_node.func, cst.Name)
+            and updated_node.func.value == "Table"
+            and len(updated_node.args) > 1
+            and updated_node.args[1].keyword is None
+            and isinstance(metadata := updated_node.args[1].value, cst.Name)
+            and metadata.value == "metadata"
+        ):
+            return updated_node
+        args = list(updated_node.args)
+        args[1] = args[1].with_changes(
+            value=metadata.with_changes(value=self.config.metadata_name)
+        )
+        return updated_node.with_changes(args=args)
+
+    def rename_metadata(self, body: List[cst.CSTNode]) -> List[cst.CSTNode]:
+        """rename the module-level "metadata = MetaData()" of Core tables output"""
+        result: List[cst.CSTNode] = []
+        for statement in body:
+            if not (
+                isinstance(statement, cst.SimpleStatementLine)
+                and isinstance(assign := statement.body[0], cst.Assign)
+                and len(assign.targets) == 1
+                and isinstance(target := assign.targets[0].target, cst.Name)
+                and target.value == "metadata"
+                and isinstance(assign.value, cst.Call)
+                and isinstance(assign.value.func, cst.Name)
+                and assign.value.func.value == "MetaData"
+            ):
+                result.append(statement)
+                continue
+            renamed = target.with_changes(value=self.config.metadata_name)
+            result.append(
+                statement.with_changes(
+                    body=[
+                        assign.with_changes(
+                            targets=[assign.targets[0].with_changes(target=renamed)]
+                        ),
+                        *statement.body[1:],
+                    ]
+                )
+            )
+        return result
+
+    def partition_option(self, table_name: Optional[str]) -> Optional[cst.DictElement]:
+        """return the postgresql_partition_by table option for the given table"""
+        if not (partition := self.partitions.get(table_name or "")):
+            return None
+        return cst.DictElement(
+            cst.SimpleString('"postgresql_partition_by"'),
+            cst.SimpleString(f'"{partition.clause}"'),
+        )
+
+    def add_partitioning(self, node: cst.ClassDef) -> cst.ClassDef:
+        """add the partitioning of the class's table to its __table_args__"""
+        body = list(node.body.body)
+        table_name: Optional[str] = None
+        # the index of the __table_args__ line and its assignment
+        table_args: Optional[Tuple[int, cst.SimpleStatementLine, cst.Assign]] = None
+        for i, line in enumerate(body):
+            if (
+                isinstance(line, cst.SimpleStatementLine)
+                and isinstance(assign := line.body[0], cst.Assign)
+                and isinstance(target := assign.targets[0].target, cst.Name)
+            ):
+                if target.value == "__tablename__":
+                    table_name = string_value(assign.value)
+                elif target.value == "__table_args__":
+                    table_args = (i, line, assign)
+        if not (option := self.partition_option(table_name)):
+            return node
+        if table_args is None:
+            new_args = cst.Assign(
+                targets=[cst.AssignTarget(cst.Name("__table_args__"))],
+                value=cst.Tuple([cst.Element(cst.Dict([option]))]),
+            )
+            body.insert(1, cst.SimpleStatementLine([new_args]))
+            return node.with_changes(body=node.body.with_changes(body=body))
+        i, line, assign = table_args
+        value = assign.value
+        if isinstance(value, cst.Dict):
+            value = value.with_changes(elements=[*value.elements, option])
+        elif isinstance(value, cst.Tuple):
+            elements = list(value.elements)
+            if elements and isinstance(kwargs := elements[-1].value, cst.Dict):
+                elements[-1] = elements[-1].with_changes(
+                    value=kwargs.with_changes(elements=[*kwargs.elements, option])
+                )
+            else:
+                elements.append(cst.Element(cst.Dict([option])))
+            value = value.with_changes(elements=elements)
+        body[i] = line.with_changes(body=[assign.with_changes(value=value)])
+        return node.with_changes(body=node.body.with_changes(body=body))
+
+    def table_comments(self, table_name: str) -> List[cst.EmptyLine]:
+        """return comment lines with the description and link for the given table"""
+        lines = [line.strip() for line in self.doc_map.get(table_name, "").splitlines()]
+        lines += [f"{self.config.base_doc_url}#{table_name.upper()}"]
+        return [
+            cst.EmptyLine(comment=cst.Comment(f"# {line}" if line else "#"))
+            for line in lines
+        ]
+
+    def annotate_tables(
+        self, body: Sequence[cst.CSTNode]
+    ) -> Tuple[List[cst.CSTNode], Dict[str, str]]:
+        """
+        add comments describing each Core table and follow each table with a tuple
+        of its column names in order; returns the new body and a dict mapping each
+        table name to the name of its column tuple
+        """
+        result: List[cst.CSTNode] = []
+        column_tuples: Dict[str, str] = {}
+        for statement in body:
+            result.append(statement)
+            if not (definition := table_definition(statement)):
+                continue
+            variable, table_name, columns = definition
+            if option := self.partition_option(table_name):
+                assign = statement.body[0]  # type: ignore
+                statement = statement.with_changes(  # type: ignore
+                    body=[
+                        assign.with_changes(
+                            value=assign.value.with_changes(
+                                args=[
+                                    *assign.value.args,
+                                    cst.Arg(
+                                        option.value,
+                                        keyword=cst.Name("postgresql_partition_by"),
+                                    ),
+                                ]
+                            )
+                        )
+                    ]
+                )
+            result[-1] = statement.with_changes(  # type: ignore
+                leading_lines=[
+                    *statement.leading_lines,  # type: ignore
+                    *self.table_comments(table_name),
+                ]
+            )
+            column_tuples[table_name] = f"{variable}_columns"
+            result.append(
+                cst.parse_statement(
+                    f"{variable}_columns: Tuple[str, ...] = {tuple(columns)!r}\n"
+                )
+            )
+        return result, column_tuples
+
+    def leave_SimpleString(
+        self,
+        original_node: cst.SimpleString,
+        updated_node: cst.SimpleString,
+    ) -> cst.SimpleString:
+        """
+        rename Cdm to CDM in the class names referenced by strings (relationship
+        targets, forward-reference annotations and foreign_keys expressions) to
+        match the renamed classes
+        """
+        if "Cdm" not in updated_node.value:
+            return updated_node
+        return updated_node.with_changes(
+            value=re.sub(
+                r"\b([A-Z]\w*)\b",
+                lambda match: match.group(1).replace("Cdm", "CDM"),
+                updated_node.value,
+            )
+        )
 
     def leave_Module(
         self,
@@ -29,25 +278,55 @@ class ModelRewriter(cst.CSTTransformer):
         updated_node: cst.Module,
     ) -> cst.Module:
         """add a module doc string and some comments"""
+        body: List[cst.CSTNode] = list(updated_node.body)
         # module docstring
-        mod_docstring = "OMOP Common Data Model v5.4 DeclarativeBase SQLAlchemy models"
+        if self.core:
+            mod_docstring = "OMOP Common Data Model v5.4 SQLAlchemy Core tables"
+            body, column_tuples = self.annotate_tables(self.rename_metadata(body))
+            # the column tuples of every table, keyed by table name
+            body.insert(0, cst.parse_statement("from typing import Dict, Tuple\n"))
+            body.append(
+                cst.parse_statement(
+                    "column_order: Dict[str, Tuple[str, ...]] = {"
+                    + ", ".join(
+                        f"{name!r}: {variable}"
+                        for name, variable in column_tuples.items()
+                    )
+                    + "}\n"
+                )
+            )
+        else:
+            mod_docstring = (
+                "OMOP Common Data Model v5.4 DeclarativeBase SQLAlchemy models"
+            )
+            if self.config.async_model:
+                body.insert(
+                    0,
+                    cst.parse_statement(
+                        "from sqlalchemy.ext.asyncio import AsyncAttrs\n"
+                    ),
+                )
         docstring = cst.SimpleStatementLine(
             body=[cst.Expr(cst.SimpleString(f'"""{mod_docstring}"""'))]
         )
 
         # pylint-disable comments
         disabled: Sequence[str] = (
-            "too-few-public-methods",
-            "too-many-lines",
-            "unnecessary-pass",
-            "unsubscriptable-object",
+            ("too-many-lines",)
+            if self.core
+            else (
+                "too-few-public-methods",
+                "too-many-lines",
+                "unnecessary-pass",
+                "unsubscriptable-object",
+            )
         )
         pylint_comments = [
             cst.EmptyLine(comment=cst.Comment(f"# pylint: disable={check}"))
             for check in disabled
         ]
         # Insert the docstring and comments at the beginning of the module body
-        new_body = [docstring] + pylint_comments + list(updated_node.body)
+        new_body = [docstring] + pylint_comments + body
 
         return updated_node.with_changes(body=new_body)
 
@@ -66,6 +345,12 @@ class ModelRewriter(cst.CSTTransformer):
             )
             class_name = updated_node.name.value
 
+        # Mix AsyncAttrs into the base class, for awaitable attribute loading
+        if class_name == self.config.base_class_name and self.config.async_model:
+            updated_node = updated_node.with_changes(
+                bases=[cst.Arg(value=cst.Name("AsyncAttrs")), *updated_node.bases]
+            )
+
         # Rename Cdm to CDM, if necessary
         if "Cdm" in class_name:
             updated_node = updated_node.with_changes(
@@ -79,6 +364,11 @@ class ModelRewriter(cst.CSTTransformer):
                 bases=[cst.Arg(value=cst.Name(value=self.config.base_class_name))]
             )
 
+        if class_name != self.config.base_class_name and isinstance(
+            updated_node.body, cst.IndentedBlock
+        ):
+            updated_node = self.add_partitioning(updated_node)
+
         # Create a new docstring node
         if class_name == self.config.base_class_name:
             docstring_value = (
@@ -113,18 +403,15 @@ class ModelRewriter(cst.CSTTransformer):
         return updated_node
 
 
-def rename_base_and_add_docstrings(config: Config):
-    """add docstrings to the Class definitions in the given model file"""
-    filename = config.output_file
-
-    with open(filename, "rt", encoding="utf8", errors="strict") as fh:
-        source = fh.read()
-
+def rename_base_and_add_docstrings(config: Config, source: str) -> str:
+    """add docstrings to the Class definitions in the given model source"""
+    with span("docs"):
+        rewriter = ModelRewriter(config)
     # parse the source code into a CST
-    rewriter = ModelRewriter(config)
+    with span("parse"):
+        tree = cst.parse_module(source)
     # modify the CST
-    modified_tree = cst.parse_module(source).visit(rewriter)
-
-    # Write the modified source code back to the file
-    with open(filename, "wt", encoding="utf8", errors="strict") as fh:
-        fh.write(modified_tree.code)
+    with span("visit"):
+        modified_tree = tree.visit(rewriter)
+    with span("codegen"):
+        return modified_tree.code
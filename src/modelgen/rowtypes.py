@@ -0,0 +1,194 @@
+"""
+generate a module of read-only row types, one NamedTuple per table class of the
+model, which are built straight from Core result rows
+"""
+
+import ast
+import logging
+from typing import List, NamedTuple, Optional, Tuple
+
+from .config import Config
+from .formatting import format_file
+from .package import imports_for, used_names
+from .utils import atomic_write, companion_path
+
+logger = logging.getLogger(__name__)
+
+ROWS_TEMPLATE = '''\
+"""
+read-only row types for the OMOP Common Data Model v5.4 tables: a NamedTuple per
+model class, with the same field names and types, for reading large results
+without the ORM's identity map and per-instance state; see rows_as
+"""
+
+# pylint: disable=too-many-lines
+
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, NamedTuple, Tuple, Type, TypeVar
+
+from sqlalchemy import Result
+{imports}
+
+R = TypeVar("R", bound=Tuple[Any, ...])
+{classes}
+
+# the row type of each table, keyed by table name
+row_types: Dict[str, Type[Tuple[Any, ...]]] = {{{registry}}}
+
+# the table column each field of a row type is read from, in field order
+row_columns: Dict[Type[Tuple[Any, ...]], Tuple[str, ...]] = {{{columns}}}
+
+
+def rows_as(row_type: Type[R], result: Result[Any]) -> Iterator[R]:
+    """
+    build instances of the row type from a Core result, e.g. of
+    select(Measurement.__table__) (use yield_per to stream a large result);
+    the result's columns are matched to the fields by name, so it may hold them
+    in any order, or more of them
+    """
+    columns = row_columns[row_type]
+    make: Callable[[Iterable[Any]], R] = row_type._make  # type: ignore
+    keys = tuple(result.keys())
+    if keys == columns:
+        return map(make, result)
+    missing = [column for column in columns if column not in keys]
+    if missing:
+        raise ValueError(
+            f"the result lacks the columns {{missing}} of {{row_type.__name__}}"
+        )
+    indexes = [keys.index(column) for column in columns]
+    if len(indexes) == 1:
+        return (make((row[indexes[0]],)) for row in result)
+    getter = itemgetter(*indexes)
+    return (make(getter(row)) for row in result)
+'''
+
+CLASS_TEMPLATE = '''
+
+class {name}(NamedTuple):
+    """a row of the {table} table (see {model_class})"""
+
+{fields}
+'''
+
+
+class Field(NamedTuple):
+    """a mapped column of a model class"""
+
+    name: str
+    column: str
+    annotation: ast.expr
+
+
+class RowType(NamedTuple):
+    """the row type of a model class"""
+
+    name: str
+    table: str
+    model_class: str
+    fields: Tuple[Field, ...]
+
+
+def mapped_field(statement: ast.stmt) -> Optional[Field]:
+    """return the field for a "name: Mapped[type] = mapped_column(...)" line"""
+    if not (
+        isinstance(statement, ast.AnnAssign)
+        and isinstance(statement.target, ast.Name)
+        and isinstance(statement.annotation, ast.Subscript)
+        and isinstance(statement.annotation.value, ast.Name)
+        and statement.annotation.value.id == "Mapped"
+        and isinstance(statement.value, ast.Call)
+        and isinstance(statement.value.func, ast.Name)
+        and statement.value.func.id == "mapped_column"
+    ):
+        return None
+    name = statement.target.id
+    column = name
+    args = statement.value.args
+    if args and isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
+        column = args[0].value
+    return Field(name, column, statement.annotation.slice)
+
+
+def row_type(node: ast.ClassDef) -> Optional[RowType]:
+    """return the row type of a model class, None for classes without a table"""
+    table = ""
+    fields: List[Field] = []
+    for statement in node.body:
+        if (
+            isinstance(statement, ast.Assign)
+            and any(
+                isinstance(target, ast.Name) and target.id == "__tablename__"
+                for target in statement.targets
+            )
+            and isinstance(statement.value, ast.Constant)
+        ):
+            table = str(statement.value.value)
+        elif field := mapped_field(statement):
+            fields.append(field)
+    if not table or not fields:
+        return None
+    return RowType(f"{node.name}Row", table, node.name, tuple(fields))
+
+
+def rows_source(source: str) -> str:
+    """return the source of the row types module for the given model source"""
+    tree = ast.parse(source)
+    imports = [
+        node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+    row_types = [
+        result
+        for node in tree.body
+        if isinstance(node, ast.ClassDef) and (result := row_type(node))
+    ]
+    names = {
+        name
+        for row in row_types
+        for field in row.fields
+        for name in used_names(field.annotation)
+    }
+    return ROWS_TEMPLATE.format(
+        imports="\n".join(imports_for(imports, names)),
+        classes="".join(
+            CLASS_TEMPLATE.format(
+                name=row.name,
+                table=row.table,
+                model_class=row.model_class,
+                fields="\n".join(
+                    f"    {field.name}: {ast.unparse(field.annotation)}"
+                    for field in row.fields
+                ),
+            )
+            for row in row_types
+        ),
+        registry=", ".join(f"{row.table!r}: {row.name}" for row in row_types),
+        columns=", ".join(
+            f"{row.name}: {tuple(field.column for field in row.fields)!r}"
+            for row in row_types
+        ),
+    )
+
+
+def rows_path(config: Config) -> str:
+    """return the path of the row types module written next to the model"""
+    return companion_path(config.output_file, "_rows.py")
+
+
+def write_row_types(config: Config, source: str) -> str:
+    """
+    write a module of read-only row types (one per table class of the given
+    model source) next to the model
+    """
+    path = rows_path(config)
+    content = format_file(rows_source(source))
+    try:
+        with open(path, "rt", encoding="utf8", errors="strict") as fh:
+            if fh.read() == content:
+                logger.info("row types unchanged: %s", path)
+                return source
+    except FileNotFoundError:
+        pass
+    atomic_write(path, content)
+    logger.info("wrote row types to: %s", path)
+    return source
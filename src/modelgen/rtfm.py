@@ -1,44 +1,272 @@
 """access the official OMOP CDM documentation"""
 
+import json
 import logging
-from typing import Dict
+import os
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple, Union
 
-import requests
-from bs4 import BeautifulSoup
-
-from .utils import normalize_text, wrap_text
+from .cache import HTTPCache, sha256_hex
+from .utils import atomic_write, normalize_text, wrap_text
 
 logger = logging.getLogger(__name__)
 
+SECTION_CLASS = "section level3 tabset tabset-pills"
+
+# bump this when the output of parse_descriptions changes, so that descriptions
+# cached by earlier versions are not reused
+PARSER_VERSION = 1
+
+# candidate positions for the start of a table section; each candidate is
+# confirmed by the parser, which checks the class attribute exactly
+section_start_re = re.compile(
+    r"<div\s[^>]*?\bclass\s*=\s*([\"'])\s*"
+    + r"\s+".join(map(re.escape, SECTION_CLASS.split()))
+    + r"\s*\1",
+    re.IGNORECASE,
+)
+
+# elements which never have content (and have no end tag)
+VOID_ELEMENTS = frozenset(
+    (
+        "area base basefont bgsound br col command embed frame hr image img input "
+        "isindex keygen link menuitem meta nextid param source spacer track wbr"
+    ).split()
+)
+
+# elements in which BeautifulSoup keeps whitespace-only strings as they are
+PRESERVE_WHITESPACE = frozenset(("pre", "textarea"))
+ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+# a minimal element tree: (tag name, children); comments are held as 1-tuples so
+# they count as children without contributing to the text
+Node = Tuple[str, List[Union[str, "Node", Tuple[str]]]]
+
 
-def get_omopcdm_descriptions(url: str) -> Dict[str, str]:
+def collapse_whitespace(text: str) -> str:
     """
-    return a dict mapping OMOP CDM table names to their text descriptions;
-    data is sourced from the given url
+    BeautifulSoup replaces each string consisting only of ascii whitespace with a
+    single newline (if it contains one) or a single space
     """
-    result: Dict[str, str] = {}
+    if text.strip(ASCII_SPACES):
+        return text
+    return "\n" if "\n" in text else " "
 
-    logger.debug("sending request to %s", url)
-    response = requests.get(url, timeout=300)
-    # Send a GET request to the URL
-    # Check if the request was successful
-    if response.status_code != 200:
-        raise ValueError(
-            f"Failed to retrieve the page. Status code: {response.status_code}"
+
+def node_text(node: Node) -> str:
+    """return the text of the given node (like BeautifulSoup's Tag.text)"""
+    if node[0] in PRESERVE_WHITESPACE:
+        return "".join(
+            child if isinstance(child, str) else node_text(child)  # type: ignore
+            for child in node[1]
+            if isinstance(child, str) or len(child) == 2
+        )
+    return "".join(
+        (
+            collapse_whitespace(child)
+            if isinstance(child, str)
+            else node_text(child)  # type: ignore
         )
-    logger.debug("downloaded %s bytes", len(response.content))
+        for child in node[1]
+        if isinstance(child, str) or len(child) == 2
+    )
+
+
+def node_string(node: Node) -> Optional[str]:
+    """return the node's only string, if it has one (like Tag.string)"""
+    children = node[1]
+    if len(children) != 1:
+        return None
+    child = children[0]
+    if isinstance(child, str):
+        return child if node[0] in PRESERVE_WHITESPACE else collapse_whitespace(child)
+    if len(child) == 1:
+        return child[0]  # type: ignore
+    return node_string(child)  # type: ignore
+
+
+class _SectionDone(Exception):
+    """raised by the section parser once it has everything it needs"""
+
+
+class _NotASection(Exception):
+    """raised by the section parser when the html doesn't start a table section"""
+
+
+class SectionParser(HTMLParser):
+    """
+    streaming parser for a single table section of the documentation page; it
+    finds the section's first h3 (the table name) and the paragraphs following the
+    "Table Description" paragraph up to the next table, then stops without
+    parsing the rest of the section (mostly the large table of fields); elements
+    are nested and closed the same way BeautifulSoup's html.parser builder does
+    """
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        # names of the open elements outside of the element being captured
+        self.open: List[str] = []
+        self.table_name: Optional[str] = None
+        self.description: Optional[List[str]] = None
+        # the tree of the h3 or p currently being captured, and its open elements
+        self.capture: List[Node] = []
+        # depth of the "Table Description" paragraph's siblings; None until found
+        self.sibling_depth: Optional[int] = None
+        self.finished_siblings = False
+        # true while consecutive data belongs to the same string; every tag and
+        # comment (even a stray end tag) ends the string, as in BeautifulSoup
+        self.in_data = False
+
+    def handle_starttag(self, tag, attrs):
+        self.in_data = False
+        if not self.open and not self.capture:
+            classes = " ".join((dict(attrs).get("class") or "").split())
+            if tag != "div" or classes != SECTION_CLASS:
+                raise _NotASection()
+        if self.capture:
+            node: Node = (tag, [])
+            self.capture[-1][1].append(node)
+            if tag not in VOID_ELEMENTS:
+                self.capture.append(node)
+            return
+        depth = len(self.open) + 1
+        is_sibling = depth == self.sibling_depth and not self.finished_siblings
+        if is_sibling and tag == "table":
+            self.finished_siblings = True
+            self.check_done()
+        if (tag == "h3" and self.table_name is None) or (
+            tag == "p" and (self.sibling_depth is None or is_sibling)
+        ):
+            self.capture = [(tag, [])]
+            if tag in VOID_ELEMENTS:
+                self.captured(self.capture.pop())
+        elif tag not in VOID_ELEMENTS:
+            self.open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        self.in_data = False
+        if self.capture:
+            if tag not in [node[0] for node in self.capture]:
+                if tag not in self.open:
+                    return  # stray end tag, ignored
+                # an enclosing element is closed, which closes the captured one
+                self.capture = self.capture[:1]
+            while self.capture[-1][0] != tag and len(self.capture) > 1:
+                self.capture.pop()
+            node = self.capture.pop()
+            if self.capture:
+                return
+            self.captured(node)
+            if tag == node[0]:
+                return
+        if tag not in self.open:
+            return  # stray end tag, ignored
+        while self.open.pop() != tag:
+            pass
+        if self.sibling_depth is not None and len(self.open) < self.sibling_depth - 1:
+            # the parent of the description paragraphs has been closed
+            self.finished_siblings = True
+        if not self.open:
+            raise _SectionDone()
+        self.check_done()
+
+    def handle_data(self, data):
+        if self.capture:
+            children = self.capture[-1][1]
+            if self.in_data:
+                children[-1] += data  # type: ignore
+            else:
+                children.append(data)
+        self.in_data = True
+
+    def handle_comment(self, data):
+        self.in_data = False
+        if self.capture:
+            self.capture[-1][1].append((data,))
+
+    def captured(self, node: Node) -> None:
+        """handle a completely captured h3 or p element"""
+        if node[0] == "h3" and self.table_name is None:
+            self.table_name = node_text(node).strip()
+        elif node[0] == "p" and self.sibling_depth is None:
+            if node_string(node) == "Table Description":
+                self.description = []
+                self.sibling_depth = len(self.open) + 1
+        elif node[0] == "p" and self.description is not None:
+            content = node_text(node).strip()
+            if content:
+                self.description.append(content)
+        self.check_done()
+
+    def check_done(self) -> None:
+        """stop parsing once the table name and description are complete"""
+        if self.table_name is not None and self.finished_siblings:
+            raise _SectionDone()
+
+    def parse(self, html: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        parse the given html, which starts with the section's div; return the
+        table name and description paragraphs, or None if it isn't a section
+        """
+        try:
+            self.feed(html)
+            self.close()
+        except _SectionDone:
+            pass
+        except _NotASection:
+            return None
+        if self.table_name is None or self.description is None:
+            raise ValueError("table section without a name or table description")
+        return self.table_name, self.description
+
+
+def parse_descriptions(content: bytes) -> Dict[str, str]:
+    """
+    return a dict mapping OMOP CDM table names to their text descriptions, parsed
+    from the given documentation page content; only the start of each table
+    section is parsed
+    """
+    html = content.decode("utf8", errors="replace")
+    starts = [match.start() for match in section_start_re.finditer(html)]
+    result: Dict[str, str] = {}
+    for start, end in zip(starts, starts[1:] + [len(html)]):
+        section = SectionParser().parse(html[start:end])
+        if section is None:
+            continue
+        table_name, description_content = section
+        logger.debug("found table %s", table_name)
+        result[table_name.lower()] = wrap_text(
+            normalize_text("\n\n".join(description_content))
+        )
+    return result
+
+
+def parse_descriptions_bs4(content: bytes) -> Dict[str, str]:
+    """
+    reference implementation of parse_descriptions which builds the whole
+    document tree with BeautifulSoup; kept to check the fast parser against
+    """
+    # pylint: disable=import-outside-toplevel
+    from bs4 import BeautifulSoup
+
+    result: Dict[str, str] = {}
 
     # Parse the HTML content of the page
-    soup = BeautifulSoup(response.content, "html.parser")
+    soup = BeautifulSoup(content, "html.parser")
 
     # Find all div elements with the specified class
-    sections = soup.find_all("div", class_="section level3 tabset tabset-pills")
+    sections = soup.find_all("div", class_=SECTION_CLASS)
 
     # Iterate through sections to extract table descriptions
     for section in sections:
         # Find the table name within the h3 tag
         table_name = section.find("h3").text.strip()
-        logger.debug("found table %s", table_name)
 
         # Initialize description content
         description_content = []
@@ -51,9 +279,9 @@ def get_omopcdm_descriptions(url: str) -> Dict[str, str]:
             # Check if the current node is a paragraph and add its text to the
             # description
             if current_node.name == "p":
-                content = current_node.text.strip()
-                if content:
-                    description_content.append(content)
+                text = current_node.text.strip()
+                if text:
+                    description_content.append(text)
             # Move to the next sibling node
             current_node = current_node.find_next_sibling()
 
@@ -61,6 +289,33 @@ def get_omopcdm_descriptions(url: str) -> Dict[str, str]:
         result[table_name.lower()] = wrap_text(
             normalize_text("\n\n".join(description_content))
         )
+    return result
+
+
+def get_omopcdm_descriptions(url: str, cache: HTTPCache) -> Dict[str, str]:
+    """
+    return a dict mapping OMOP CDM table names to their text descriptions;
+    data is sourced from the given url (via the given cache); the parsed
+    descriptions are cached as json keyed by the page's content hash
+    """
+    content = cache.get(url)
+    logger.debug("loaded %s bytes", len(content))
+
+    parsed_path = os.path.join(
+        cache.cache_dir,
+        "parsed",
+        f"descriptions-v{PARSER_VERSION}-{sha256_hex(content)}.json",
+    )
+    try:
+        with open(parsed_path, "rt", encoding="utf8") as fh:
+            result: Dict[str, str] = json.load(fh)
+        logger.debug("using cached descriptions %s", parsed_path)
+        return result
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    result = parse_descriptions(content)
+    atomic_write(parsed_path, json.dumps(result, indent=2))
 
     for k, v in result.items():
         for line in v.splitlines():
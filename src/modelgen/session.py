@@ -0,0 +1,131 @@
+"""
+generate a module of asyncio engine and session factories to go with a model
+whose base class mixes in AsyncAttrs
+"""
+
+import logging
+
+from .config import Config
+from .formatting import format_file
+from .utils import atomic_write, companion_path
+
+logger = logging.getLogger(__name__)
+
+SESSION_TEMPLATE = '''\
+"""
+asyncio engine and session factories for the OMOP Common Data Model v5.4 models
+(whose base class, {base}, mixes in AsyncAttrs): relationships and deferred
+columns are loaded with "await instance.awaitable_attrs.<name>" rather than by
+attribute access, which would block on I/O (and raises under AsyncSession)
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Union
+
+from sqlalchemy import URL, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+# the driver used for database URLs which name a synchronous postgresql driver
+ASYNC_DRIVER = "postgresql+asyncpg"
+SYNC_DRIVERS = ("postgresql", "postgresql+psycopg2")
+
+# the default sizing of each engine's connection pool: the number of connections
+# kept open, how many more may be opened under load, how long (in seconds) to wait
+# for a free connection and after how long a connection is replaced
+POOL_SIZE = {pool_size}
+MAX_OVERFLOW = {max_overflow}
+POOL_TIMEOUT = 30.0
+POOL_RECYCLE = 1800
+
+
+def async_url(url: Union[str, URL]) -> URL:
+    """return the database URL, with the asyncpg driver if it named a sync one"""
+    url = make_url(url)
+    if url.drivername in SYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVER)
+    return url
+
+
+def create_engine(
+    url: Union[str, URL],
+    *,
+    pool_size: int = POOL_SIZE,
+    max_overflow: int = MAX_OVERFLOW,
+    pool_timeout: float = POOL_TIMEOUT,
+    pool_recycle: int = POOL_RECYCLE,
+    pool_pre_ping: bool = True,
+    **kwargs: Any,
+) -> AsyncEngine:
+    """
+    return an asyncio engine for the database URL with the given pool sizing;
+    other keyword arguments are passed to create_async_engine
+    """
+    return create_async_engine(
+        async_url(url),
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+        **kwargs,
+    )
+
+
+def create_sessionmaker(
+    engine: AsyncEngine, **kwargs: Any
+) -> async_sessionmaker[AsyncSession]:
+    """
+    return a factory of AsyncSessions bound to the engine; expire_on_commit is
+    False unless given, since reloading the expired attributes after a commit
+    would be implicit I/O
+    """
+    kwargs.setdefault("expire_on_commit", False)
+    return async_sessionmaker(engine, **kwargs)
+
+
+@asynccontextmanager
+async def session_scope(
+    sessionmaker: async_sessionmaker[AsyncSession],
+) -> AsyncIterator[AsyncSession]:
+    """
+    open a session and a transaction for the block, which is committed at its end
+    or rolled back if it raises
+    """
+    async with sessionmaker() as session, session.begin():
+        yield session
+'''
+
+
+def session_path(config: Config) -> str:
+    """return the path of the session factory module written next to the model"""
+    return companion_path(config.output_file, "_session.py")
+
+
+def session_source(config: Config) -> str:
+    """return the source of the session factory module"""
+    return SESSION_TEMPLATE.format(
+        base=config.base_class_name,
+        pool_size=config.async_pool_size,
+        max_overflow=config.async_max_overflow,
+    )
+
+
+def write_session_module(config: Config, source: str) -> str:
+    """write the module of asyncio engine and session factories next to the model"""
+    path = session_path(config)
+    content = format_file(session_source(config))
+    try:
+        with open(path, "rt", encoding="utf8", errors="strict") as fh:
+            if fh.read() == content:
+                logger.info("session module unchanged: %s", path)
+                return source
+    except FileNotFoundError:
+        pass
+    atomic_write(path, content)
+    logger.info("wrote session module to: %s", path)
+    return source
@@ -0,0 +1,30 @@
+-- production tuning for large CDM instances; see also --partition-by for the
+-- measurement, observation and drug_exposure tables
+
+-- BRIN indexes on the event dates: tiny, and effective for date range scans on
+-- tables loaded in roughly chronological order
+CREATE INDEX idx_condition_occurrence_date_brin ON @cdmDatabaseSchema.condition_occurrence USING brin (condition_start_date);
+CREATE INDEX idx_device_exposure_date_brin ON @cdmDatabaseSchema.device_exposure USING brin (device_exposure_start_date);
+CREATE INDEX idx_drug_exposure_date_brin ON @cdmDatabaseSchema.drug_exposure USING brin (drug_exposure_start_date);
+CREATE INDEX idx_measurement_date_brin ON @cdmDatabaseSchema.measurement USING brin (measurement_date);
+CREATE INDEX idx_note_date_brin ON @cdmDatabaseSchema.note USING brin (note_date);
+CREATE INDEX idx_observation_date_brin ON @cdmDatabaseSchema.observation USING brin (observation_date);
+CREATE INDEX idx_observation_period_date_brin ON @cdmDatabaseSchema.observation_period USING brin (observation_period_start_date);
+CREATE INDEX idx_procedure_occurrence_date_brin ON @cdmDatabaseSchema.procedure_occurrence USING brin (procedure_date);
+CREATE INDEX idx_specimen_date_brin ON @cdmDatabaseSchema.specimen USING brin (specimen_date);
+CREATE INDEX idx_visit_detail_date_brin ON @cdmDatabaseSchema.visit_detail USING brin (visit_detail_start_date);
+CREATE INDEX idx_visit_occurrence_date_brin ON @cdmDatabaseSchema.visit_occurrence USING brin (visit_start_date);
+
+-- covering indexes for the per-person timelines: the events of a person in date
+-- order (or within a date range), answered from the index alone for the concept
+CREATE INDEX idx_condition_occurrence_person_date ON @cdmDatabaseSchema.condition_occurrence (person_id, condition_start_date) INCLUDE (condition_concept_id);
+CREATE INDEX idx_device_exposure_person_date ON @cdmDatabaseSchema.device_exposure (person_id, device_exposure_start_date) INCLUDE (device_concept_id);
+CREATE INDEX idx_drug_exposure_person_date ON @cdmDatabaseSchema.drug_exposure (person_id, drug_exposure_start_date) INCLUDE (drug_concept_id);
+CREATE INDEX idx_measurement_person_date ON @cdmDatabaseSchema.measurement (person_id, measurement_date) INCLUDE (measurement_concept_id);
+CREATE INDEX idx_note_person_date ON @cdmDatabaseSchema.note (person_id, note_date) INCLUDE (note_class_concept_id);
+CREATE INDEX idx_observation_person_date ON @cdmDatabaseSchema.observation (person_id, observation_date) INCLUDE (observation_concept_id);
+CREATE INDEX idx_observation_period_person_date ON @cdmDatabaseSchema.observation_period (person_id, observation_period_start_date) INCLUDE (observation_period_end_date);
+CREATE INDEX idx_procedure_occurrence_person_date ON @cdmDatabaseSchema.procedure_occurrence (person_id, procedure_date) INCLUDE (procedure_concept_id);
+CREATE INDEX idx_specimen_person_date ON @cdmDatabaseSchema.specimen (person_id, specimen_date) INCLUDE (specimen_concept_id);
+CREATE INDEX idx_visit_detail_person_date ON @cdmDatabaseSchema.visit_detail (person_id, visit_detail_start_date) INCLUDE (visit_detail_concept_id);
+CREATE INDEX idx_visit_occurrence_person_date ON @cdmDatabaseSchema.visit_occurrence (person_id, visit_start_date) INCLUDE (visit_concept_id);
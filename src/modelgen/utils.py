@@ -1,16 +1,50 @@
 """ misc. utilities used elsewhere in the code"""
 
 import logging
+import os
 import re
+import stat
+import tempfile
 import textwrap
 import unicodedata
-from typing import Final, List
+from typing import Final, List, Union
 
 logger = logging.getLogger(__name__)
 
 semver_matcher = re.compile(r"^v?(?P<patch>(?P<minor>(?P<major>\d+)\.\d+)\.\d+)(.+)?$")
 
 
+def atomic_write(path: str, data: Union[str, bytes]) -> None:
+    """
+    write the given data to the given path such that readers only ever see either
+    the previous file or the complete new file
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dirname, exist_ok=True)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o644
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=".tmp-")
+    try:
+        os.fchmod(fd, mode)
+        if isinstance(data, str):
+            with os.fdopen(fd, "wt", encoding="utf8", errors="strict") as fh:
+                fh.write(data)
+        else:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def companion_path(output_file: str, suffix: str) -> str:
+    """return the path of a module written next to the model, e.g. model_rows.py"""
+    return os.path.splitext(output_file)[0] + suffix
+
+
 def camel_to_snake(name: str) -> str:
     """return the snake_case version of the given CamelCase input string"""
     # Insert underscores before uppercase letters, excluding the first letter
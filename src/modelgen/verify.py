@@ -0,0 +1,336 @@
+"""
+check the written model against the database schema it was generated from, by
+reflecting the whole schema in a handful of batched catalog queries
+"""
+
+import importlib.util
+import json
+import logging
+import os
+import sys
+import types
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from sqlalchemy import Column, MetaData, Table, inspect, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeEngine
+
+from .codegen import cdm_schema_name
+from .config import Config
+from .dbinit import get_engine
+from .importbench import model_path
+from .lookup import module_metadata
+from .profiling import span
+from .utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# the name the written model is imported under while it is being verified
+MODULE_NAME = "modelgen_verified_model"
+
+# the normalized description of a table's schema, compared between the model and
+# the database: each entry maps a name to a comparable (JSON-friendly) value
+TableSchema = Dict[str, Any]
+
+
+def import_model(config: Config) -> types.ModuleType:
+    """
+    import the written model from its file (loading every class of a package),
+    without leaving it in sys.modules
+    """
+    path = model_path(config)
+    locations = [os.path.dirname(path)] if config.output_layout == "package" else None
+    spec = importlib.util.spec_from_file_location(
+        MODULE_NAME, path, submodule_search_locations=locations
+    )
+    if spec is None or spec.loader is None:
+        raise ValueError(f"unable to import the model from {path}")
+    module = sys.modules[MODULE_NAME] = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+        for name in getattr(module, "__all__", ()):
+            getattr(module, name)
+    finally:
+        for name in list(sys.modules):
+            if name == MODULE_NAME or name.startswith(MODULE_NAME + "."):
+                del sys.modules[name]
+    return module
+
+
+def type_name(column_type: TypeEngine) -> str:
+    """return the postgresql DDL of the given column type"""
+    return str(column_type.compile(dialect=postgresql.dialect()))
+
+
+def model_column(column: Column) -> Dict[str, Any]:
+    """return the comparable description of a column of the model"""
+    return {"type": type_name(column.type), "nullable": bool(column.nullable)}
+
+
+def index_options(
+    columns: List[str], unique: bool, using: Any, include: Optional[List[str]]
+) -> Dict[str, Any]:
+    """
+    return the comparable description of an index; the default access method
+    (btree) is left out, which the model has as False and the database as None
+    """
+    return {
+        "columns": columns,
+        "unique": unique,
+        "using": using if using and using != "btree" else None,
+        "include": list(include or []),
+    }
+
+
+def model_schema(table: Table) -> TableSchema:
+    """return the comparable description of a table of the model"""
+    foreign_keys = {}
+    for constraint in table.foreign_key_constraints:
+        targets = [
+            element.target_fullname.rsplit(".", 1) for element in constraint.elements
+        ]
+        foreign_keys[str(constraint.name)] = {
+            "columns": list(constraint.column_keys),
+            "referred_table": targets[0][0].split(".")[-1],
+            "referred_columns": [column for _, column in targets],
+        }
+    return {
+        "columns": {column.name: model_column(column) for column in table.columns},
+        "primary_key": {
+            "name": table.primary_key.name,
+            "columns": [column.name for column in table.primary_key.columns],
+        },
+        "foreign_keys": foreign_keys,
+        "indexes": {
+            str(index.name): index_options(
+                [
+                    getattr(expression, "name", str(expression))
+                    for expression in index.expressions
+                ],
+                bool(index.unique),
+                index.dialect_options["postgresql"]["using"],
+                index.dialect_options["postgresql"]["include"],
+            )
+            for index in table.indexes
+        },
+        "partition_by": table.dialect_options["postgresql"]["partition_by"],
+    }
+
+
+def database_schemas(config: Config) -> Dict[str, TableSchema]:
+    """
+    return the comparable descriptions of the tables in the database's CDM schema;
+    every table is reflected at once with the inspector's get_multi_* methods, so
+    the number of round trips doesn't depend on the number of tables
+    """
+    with get_engine(config).connect() as cnxn:
+        inspector = inspect(cnxn)
+        schema = cdm_schema_name(config, inspector.default_schema_name)
+        with span("columns"):
+            columns = inspector.get_multi_columns(schema=schema)
+        with span("primary keys"):
+            primary_keys = inspector.get_multi_pk_constraint(schema=schema)
+        with span("foreign keys"):
+            foreign_keys = inspector.get_multi_foreign_keys(schema=schema)
+        with span("indexes"):
+            indexes = inspector.get_multi_indexes(schema=schema)
+        with span("partitions"):
+            partition_keys: Dict[str, str] = dict(
+                cnxn.execute(
+                    text(
+                        "SELECT c.relname, pg_get_partkeydef(c.oid) FROM pg_class c "
+                        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                        "WHERE c.relkind = 'p' AND n.nspname = :schema"
+                    ),
+                    {"schema": schema or inspector.default_schema_name},
+                )
+                .tuples()
+                .all()
+            )
+
+    result: Dict[str, TableSchema] = {}
+    for key, table_columns in columns.items():
+        primary_key: Mapping[str, Any] = primary_keys.get(key) or {}
+        result[key[1]] = {
+            "columns": {
+                column["name"]: {
+                    "type": type_name(column["type"]),
+                    "nullable": bool(column["nullable"]),
+                }
+                for column in table_columns
+            },
+            "primary_key": {
+                "name": primary_key.get("name"),
+                "columns": list(primary_key.get("constrained_columns", [])),
+            },
+            "foreign_keys": {
+                str(fk["name"]): {
+                    "columns": list(fk["constrained_columns"]),
+                    "referred_table": fk["referred_table"],
+                    "referred_columns": list(fk["referred_columns"]),
+                }
+                for fk in foreign_keys.get(key, [])
+            },
+            "indexes": {
+                str(index["name"]): index_options(
+                    [
+                        str(name if name is not None else expression)
+                        for name, expression in zip(
+                            index["column_names"],
+                            index.get("expressions", index["column_names"]),
+                        )
+                    ],
+                    bool(index["unique"]),
+                    index["dialect_options"].get("postgresql_using"),
+                    index["dialect_options"].get("postgresql_include"),
+                )
+                for index in indexes.get(key, [])
+            },
+            "partition_by": partition_keys.get(key[1]),
+        }
+    return result
+
+
+def difference(
+    table: str, kind: str, name: Optional[str], model: Any, database: Any
+) -> Dict[str, Any]:
+    """return a report entry for a difference between the model and the database"""
+    return {
+        "table": table,
+        "kind": kind,
+        "name": name,
+        "model": model,
+        "database": database,
+    }
+
+
+def compare_named(
+    table: str, kind: str, model: Dict[str, Any], database: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """
+    return the differences between two mappings of named objects (e.g. the
+    indexes of a table), including the objects missing from either side
+    """
+    return [
+        difference(table, kind, name, model.get(name), database.get(name))
+        for name in sorted(model.keys() | database.keys())
+        if model.get(name) != database.get(name)
+    ]
+
+
+def column_orders(module: types.ModuleType) -> Dict[str, Tuple[str, ...]]:
+    """
+    return the column order the model declares for its Core tables, in the
+    t_<table>_columns tuple next to each t_<table> Table; the mapped classes
+    declare none, sqlacodegen renders their columns in an order of its own
+    """
+    result: Dict[str, Tuple[str, ...]] = {}
+    for name, value in vars(module).items():
+        columns = getattr(module, f"{name}_columns", None)
+        if isinstance(value, Table) and isinstance(columns, tuple):
+            result[value.name] = columns
+    return result
+
+
+def compare_table(
+    table: str,
+    model: TableSchema,
+    database: TableSchema,
+    order: Optional[Sequence[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    return the differences between a table of the model and of the database; the
+    column order is only compared when the model declares one
+    """
+    result = compare_named(table, "column", model["columns"], database["columns"])
+    database_order = list(database["columns"])
+    if not result and order is not None and list(order) != database_order:
+        result.append(
+            difference(table, "column_order", None, list(order), database_order)
+        )
+    if model["primary_key"] != database["primary_key"]:
+        result.append(
+            difference(
+                table,
+                "primary_key",
+                model["primary_key"]["name"] or database["primary_key"]["name"],
+                model["primary_key"],
+                database["primary_key"],
+            )
+        )
+    for kind, key in (("foreign_key", "foreign_keys"), ("index", "indexes")):
+        result += compare_named(table, kind, model[key], database[key])
+    if model["partition_by"] != database["partition_by"]:
+        result.append(
+            difference(
+                table,
+                "partition_by",
+                None,
+                model["partition_by"],
+                database["partition_by"],
+            )
+        )
+    return result
+
+
+def compare(
+    model: Dict[str, TableSchema],
+    database: Dict[str, TableSchema],
+    orders: Optional[Mapping[str, Sequence[str]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    return every difference between the model's tables and the database's, and
+    between the given column orders of the model's tables and the database's
+    """
+    result: List[Dict[str, Any]] = []
+    for table in sorted(model.keys() | database.keys()):
+        if table not in database:
+            result.append(difference(table, "table", table, "present", None))
+        elif table not in model:
+            result.append(difference(table, "table", table, None, "present"))
+        else:
+            result += compare_table(
+                table, model[table], database[table], (orders or {}).get(table)
+            )
+    return result
+
+
+def verify(config: Config, source: str) -> str:
+    """
+    import the written model, reflect the CDM schema from the database and write
+    the differences between the two (columns, types, nullability, primary,
+    foreign keys, indexes and partitioning) to verify.json in the log dir;
+    raises ValueError when there are any
+    """
+    with span("import"):
+        module = import_model(config)
+        metadata: MetaData = module_metadata(module)
+        model = {table.name: model_schema(table) for table in metadata.tables.values()}
+    with span("reflect"):
+        database = database_schemas(config)
+    differences = compare(model, database, column_orders(module))
+
+    report: Dict[str, Any] = {
+        "model": model_path(config),
+        "schema": config.cdm_schema,
+        "tables": len(model),
+        "checked": {
+            key: sum(len(table[key]) for table in model.values())
+            for key in ("columns", "foreign_keys", "indexes")
+        },
+        "ok": not differences,
+        "differences": differences,
+    }
+    path = os.path.join(config.log_dir, "verify.json")
+    atomic_write(path, json.dumps(report, indent=2))
+    if differences:
+        raise ValueError(
+            f"the model differs from the database in {len(differences)} places, "
+            f"see {path}"
+        )
+    logger.info(
+        "verified the model's %s tables against the database; report written to %s",
+        len(model),
+        path,
+    )
+    return source
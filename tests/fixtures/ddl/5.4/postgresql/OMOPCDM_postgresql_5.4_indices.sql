@@ -0,0 +1,139 @@
+--postgresql CDM Indices for OMOP Common Data Model 5.4
+
+CREATE INDEX idx_attribute_definition_concept_id_1 ON @cdmDatabaseSchema.attribute_definition (attribute_type_concept_id ASC);
+
+CREATE INDEX idx_cohort_definition_concept_id_1 ON @cdmDatabaseSchema.cohort_definition (definition_type_concept_id ASC);
+
+CREATE INDEX idx_concept_class_concept_id_1 ON @cdmDatabaseSchema.concept_class (concept_class_concept_id ASC);
+
+CREATE INDEX idx_device_cost_concept_id_1 ON @cdmDatabaseSchema.device_cost (currency_concept_id ASC);
+
+CREATE INDEX idx_domain_concept_id_1 ON @cdmDatabaseSchema.domain (domain_concept_id ASC);
+
+CREATE INDEX idx_drug_cost_concept_id_1 ON @cdmDatabaseSchema.drug_cost (currency_concept_id ASC);
+
+CREATE INDEX idx_procedure_cost_concept_id_1 ON @cdmDatabaseSchema.procedure_cost (currency_concept_id ASC);
+
+CREATE INDEX idx_visit_cost_concept_id_1 ON @cdmDatabaseSchema.visit_cost (currency_concept_id ASC);
+
+CREATE INDEX idx_vocabulary_concept_id_1 ON @cdmDatabaseSchema.vocabulary (vocabulary_concept_id ASC);
+
+CREATE INDEX idx_cdm_source_concept_id_1 ON @cdmDatabaseSchema.cdm_source (cdm_version_concept_id ASC);
+
+CREATE INDEX idx_concept_ancestor_concept_id_1 ON @cdmDatabaseSchema.concept_ancestor (ancestor_concept_id ASC);
+
+CREATE INDEX idx_concept_synonym_concept_id_1 ON @cdmDatabaseSchema.concept_synonym (language_concept_id ASC);
+
+CREATE INDEX idx_drug_strength_concept_id_1 ON @cdmDatabaseSchema.drug_strength (drug_concept_id ASC);
+
+CREATE INDEX idx_fact_relationship_concept_id_1 ON @cdmDatabaseSchema.fact_relationship (relationship_concept_id ASC);
+
+CREATE INDEX idx_location_concept_id_1 ON @cdmDatabaseSchema.location (country_concept_id ASC);
+
+CREATE INDEX idx_metadata_concept_id_1 ON @cdmDatabaseSchema.metadata (metadata_concept_id ASC);
+
+CREATE INDEX idx_note_nlp_concept_id_1 ON @cdmDatabaseSchema.note_nlp (section_concept_id ASC);
+
+CREATE INDEX idx_relationship_concept_id_1 ON @cdmDatabaseSchema.relationship (relationship_concept_id ASC);
+
+CREATE INDEX idx_source_to_concept_map_concept_id_1 ON @cdmDatabaseSchema.source_to_concept_map (source_concept_id ASC);
+
+CREATE INDEX idx_care_site_concept_id_1 ON @cdmDatabaseSchema.care_site (place_of_service_concept_id ASC);
+
+CREATE INDEX idx_location_history_concept_id_1 ON @cdmDatabaseSchema.location_history (relationship_type_concept_id ASC);
+
+CREATE INDEX idx_provider_concept_id_1 ON @cdmDatabaseSchema.provider (specialty_concept_id ASC);
+
+CREATE INDEX idx_person_person_id_1  ON @cdmDatabaseSchema.person  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.person  USING idx_person_person_id_1 ;
+
+CREATE INDEX idx_person_concept_id_1 ON @cdmDatabaseSchema.person (gender_concept_id ASC);
+
+CREATE INDEX idx_condition_era_person_id_1  ON @cdmDatabaseSchema.condition_era  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.condition_era  USING idx_condition_era_person_id_1 ;
+
+CREATE INDEX idx_condition_era_concept_id_1 ON @cdmDatabaseSchema.condition_era (condition_concept_id ASC);
+
+CREATE INDEX idx_death_person_id_1  ON @cdmDatabaseSchema.death  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.death  USING idx_death_person_id_1 ;
+
+CREATE INDEX idx_death_concept_id_1 ON @cdmDatabaseSchema.death (death_type_concept_id ASC);
+
+CREATE INDEX idx_dose_era_person_id_1  ON @cdmDatabaseSchema.dose_era  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.dose_era  USING idx_dose_era_person_id_1 ;
+
+CREATE INDEX idx_dose_era_concept_id_1 ON @cdmDatabaseSchema.dose_era (drug_concept_id ASC);
+
+CREATE INDEX idx_drug_era_person_id_1  ON @cdmDatabaseSchema.drug_era  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.drug_era  USING idx_drug_era_person_id_1 ;
+
+CREATE INDEX idx_drug_era_concept_id_1 ON @cdmDatabaseSchema.drug_era (drug_concept_id ASC);
+
+CREATE INDEX idx_episode_person_id_1  ON @cdmDatabaseSchema.episode  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.episode  USING idx_episode_person_id_1 ;
+
+CREATE INDEX idx_episode_concept_id_1 ON @cdmDatabaseSchema.episode (episode_concept_id ASC);
+
+CREATE INDEX idx_observation_period_person_id_1  ON @cdmDatabaseSchema.observation_period  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.observation_period  USING idx_observation_period_person_id_1 ;
+
+CREATE INDEX idx_observation_period_concept_id_1 ON @cdmDatabaseSchema.observation_period (period_type_concept_id ASC);
+
+CREATE INDEX idx_payer_plan_period_person_id_1  ON @cdmDatabaseSchema.payer_plan_period  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.payer_plan_period  USING idx_payer_plan_period_person_id_1 ;
+
+CREATE INDEX idx_payer_plan_period_concept_id_1 ON @cdmDatabaseSchema.payer_plan_period (payer_concept_id ASC);
+
+CREATE INDEX idx_specimen_person_id_1  ON @cdmDatabaseSchema.specimen  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.specimen  USING idx_specimen_person_id_1 ;
+
+CREATE INDEX idx_specimen_concept_id_1 ON @cdmDatabaseSchema.specimen (specimen_concept_id ASC);
+
+CREATE INDEX idx_visit_occurrence_person_id_1  ON @cdmDatabaseSchema.visit_occurrence  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.visit_occurrence  USING idx_visit_occurrence_person_id_1 ;
+
+CREATE INDEX idx_visit_occurrence_concept_id_1 ON @cdmDatabaseSchema.visit_occurrence (visit_concept_id ASC);
+
+CREATE INDEX idx_cost_concept_id_1 ON @cdmDatabaseSchema.cost (cost_type_concept_id ASC);
+
+CREATE INDEX idx_episode_event_concept_id_1 ON @cdmDatabaseSchema.episode_event (episode_event_field_concept_id ASC);
+
+CREATE INDEX idx_visit_detail_person_id_1  ON @cdmDatabaseSchema.visit_detail  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.visit_detail  USING idx_visit_detail_person_id_1 ;
+
+CREATE INDEX idx_visit_detail_concept_id_1 ON @cdmDatabaseSchema.visit_detail (visit_detail_concept_id ASC);
+
+CREATE INDEX idx_condition_occurrence_person_id_1  ON @cdmDatabaseSchema.condition_occurrence  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.condition_occurrence  USING idx_condition_occurrence_person_id_1 ;
+
+CREATE INDEX idx_condition_occurrence_concept_id_1 ON @cdmDatabaseSchema.condition_occurrence (condition_concept_id ASC);
+
+CREATE INDEX idx_device_exposure_person_id_1  ON @cdmDatabaseSchema.device_exposure  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.device_exposure  USING idx_device_exposure_person_id_1 ;
+
+CREATE INDEX idx_device_exposure_concept_id_1 ON @cdmDatabaseSchema.device_exposure (device_concept_id ASC);
+
+CREATE INDEX idx_drug_exposure_person_id_1  ON @cdmDatabaseSchema.drug_exposure  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.drug_exposure  USING idx_drug_exposure_person_id_1 ;
+
+CREATE INDEX idx_drug_exposure_concept_id_1 ON @cdmDatabaseSchema.drug_exposure (drug_concept_id ASC);
+
+CREATE INDEX idx_measurement_person_id_1  ON @cdmDatabaseSchema.measurement  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.measurement  USING idx_measurement_person_id_1 ;
+
+CREATE INDEX idx_measurement_concept_id_1 ON @cdmDatabaseSchema.measurement (measurement_concept_id ASC);
+
+CREATE INDEX idx_note_person_id_1  ON @cdmDatabaseSchema.note  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.note  USING idx_note_person_id_1 ;
+
+CREATE INDEX idx_note_concept_id_1 ON @cdmDatabaseSchema.note (note_type_concept_id ASC);
+
+CREATE INDEX idx_observation_person_id_1  ON @cdmDatabaseSchema.observation  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.observation  USING idx_observation_person_id_1 ;
+
+CREATE INDEX idx_observation_concept_id_1 ON @cdmDatabaseSchema.observation (observation_concept_id ASC);
+
+CREATE INDEX idx_procedure_occurrence_person_id_1  ON @cdmDatabaseSchema.procedure_occurrence  (person_id ASC);
+CLUSTER @cdmDatabaseSchema.procedure_occurrence  USING idx_procedure_occurrence_person_id_1 ;
+
+CREATE INDEX idx_procedure_occurrence_concept_id_1 ON @cdmDatabaseSchema.procedure_occurrence (procedure_concept_id ASC);
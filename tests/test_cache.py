@@ -0,0 +1,203 @@
+"""tests for the on-disk HTTP cache, against a local http.server"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List
+
+import pytest
+
+from modelgen import cache as cache_module
+from modelgen.cache import HTTPCache
+
+LAST_MODIFIED = "Tue, 01 Oct 2024 00:00:00 GMT"
+
+
+@dataclass
+class Origin:
+    """the documents served by the test server, and the requests it received"""
+
+    documents: Dict[str, bytes] = field(default_factory=dict)
+    etags: Dict[str, str] = field(default_factory=dict)
+    requests: List[Dict[str, str]] = field(default_factory=list)
+    base_url: str = ""
+
+    def publish(self, path: str, body: bytes, etag: str) -> None:
+        """serve the given body at the given path with the given etag"""
+        self.documents[path] = body
+        self.etags[path] = etag
+
+
+@pytest.fixture(name="origin")
+def fixture_origin() -> Iterator[Origin]:
+    """run an http server with conditional GET support for the duration of a test"""
+    origin = Origin()
+
+    class Handler(BaseHTTPRequestHandler):
+        """serve the origin's documents, answering 304 when the etag matches"""
+
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            """handle a GET request"""
+            origin.requests.append({"path": self.path, **self.headers})
+            if self.path not in origin.documents:
+                self.send_error(404)
+                return
+            etag = origin.etags[self.path]
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            body = origin.documents[self.path]
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:  # pylint: disable=arguments-differ
+            """keep the test output quiet"""
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    origin.base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        yield origin
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture(name="revalidate")
+def fixture_revalidate(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    don't treat the entries validated during the test as fresh for the rest of the
+    run, so that max_age alone decides whether they are revalidated
+    """
+    monkeypatch.setattr(cache_module, "PROCESS_START", float("inf"))
+
+
+def url(origin: Origin, path: str) -> str:
+    """return the url of the given path on the test server"""
+    return origin.base_url + path
+
+
+def test_download_is_stored(origin: Origin, tmp_path) -> None:
+    """the first request downloads the body and records its validators"""
+    origin.publish("/ddl.sql", b"CREATE TABLE person ();", '"v1"')
+    cache = HTTPCache(str(tmp_path))
+
+    assert cache.get(url(origin, "/ddl.sql")) == b"CREATE TABLE person ();"
+
+    entry = cache.read_entry(url(origin, "/ddl.sql"))
+    assert entry is not None
+    assert entry["etag"] == '"v1"'
+    assert entry["last_modified"] == LAST_MODIFIED
+    assert cache.read_object(entry["sha256"]) == b"CREATE TABLE person ();"
+
+
+@pytest.mark.usefixtures("revalidate")
+def test_fresh_entry_is_not_revalidated(origin: Origin, tmp_path) -> None:
+    """an entry younger than max_age is used without contacting the server"""
+    origin.publish("/ddl.sql", b"v1", '"v1"')
+    cache = HTTPCache(str(tmp_path), max_age=3600)
+
+    cache.get(url(origin, "/ddl.sql"))
+    origin.publish("/ddl.sql", b"v2", '"v2"')
+
+    assert cache.get(url(origin, "/ddl.sql")) == b"v1"
+    assert len(origin.requests) == 1
+
+
+def test_entry_validated_this_run_is_fresh(origin: Origin, tmp_path) -> None:
+    """an entry validated by this process is fresh whatever its max age"""
+    origin.publish("/ddl.sql", b"v1", '"v1"')
+    cache = HTTPCache(str(tmp_path), max_age=0)
+
+    cache.get(url(origin, "/ddl.sql"))
+    cache.get(url(origin, "/ddl.sql"))
+
+    assert len(origin.requests) == 1
+
+
+@pytest.mark.usefixtures("revalidate")
+def test_stale_entry_is_revalidated(origin: Origin, tmp_path) -> None:
+    """a stale entry is revalidated with a conditional request and a 304 reuses it"""
+    origin.publish("/ddl.sql", b"v1", '"v1"')
+    cache = HTTPCache(str(tmp_path), max_age=3600)
+    cache.get(url(origin, "/ddl.sql"))
+
+    entry = cache.read_entry(url(origin, "/ddl.sql"))
+    assert entry is not None
+    entry["validated"] = time.time() - 7200
+    cache.write_entry(url(origin, "/ddl.sql"), entry)
+
+    assert cache.get(url(origin, "/ddl.sql")) == b"v1"
+    assert len(origin.requests) == 2
+    assert origin.requests[1]["If-None-Match"] == '"v1"'
+    assert origin.requests[1]["If-Modified-Since"] == LAST_MODIFIED
+
+    refreshed = cache.read_entry(url(origin, "/ddl.sql"))
+    assert refreshed is not None
+    assert refreshed["validated"] > entry["validated"]
+
+
+@pytest.mark.usefixtures("revalidate")
+def test_changed_document_replaces_entry(origin: Origin, tmp_path) -> None:
+    """a document which changed on the server is downloaded again"""
+    origin.publish("/ddl.sql", b"v1", '"v1"')
+    cache = HTTPCache(str(tmp_path), max_age=0)
+    cache.get(url(origin, "/ddl.sql"))
+
+    origin.publish("/ddl.sql", b"v2", '"v2"')
+
+    assert cache.get(url(origin, "/ddl.sql")) == b"v2"
+    entry = cache.read_entry(url(origin, "/ddl.sql"))
+    assert entry is not None
+    assert entry["etag"] == '"v2"'
+
+
+@pytest.mark.usefixtures("revalidate")
+def test_offline_uses_cached_copy(origin: Origin, tmp_path) -> None:
+    """offline mode returns the cached copy, however stale, without any request"""
+    origin.publish("/ddl.sql", b"v1", '"v1"')
+    HTTPCache(str(tmp_path)).get(url(origin, "/ddl.sql"))
+    origin.publish("/ddl.sql", b"v2", '"v2"')
+
+    offline = HTTPCache(str(tmp_path), offline=True, max_age=0)
+
+    assert offline.get(url(origin, "/ddl.sql")) == b"v1"
+    assert len(origin.requests) == 1
+
+
+def test_offline_without_cached_copy_fails(origin: Origin, tmp_path) -> None:
+    """offline mode fails when the url was never downloaded"""
+    origin.publish("/ddl.sql", b"v1", '"v1"')
+    cache = HTTPCache(str(tmp_path), offline=True)
+
+    with pytest.raises(ValueError, match="offline mode"):
+        cache.get(url(origin, "/ddl.sql"))
+    assert not origin.requests
+
+
+def test_get_many(origin: Origin, tmp_path) -> None:
+    """several urls are fetched concurrently and timed by name"""
+    origin.publish("/a.sql", b"a", '"a"')
+    origin.publish("/b.sql", b"b", '"b"')
+    cache = HTTPCache(str(tmp_path))
+
+    result = cache.get_many({"a": url(origin, "/a.sql"), "b": url(origin, "/b.sql")})
+
+    assert result == {"a": b"a", "b": b"b"}
+    assert set(cache.timings) == {"a", "b"}
+
+
+def test_missing_document_fails(origin: Origin, tmp_path) -> None:
+    """a response other than 200 or 304 is an error"""
+    cache = HTTPCache(str(tmp_path), retries=0)
+
+    with pytest.raises(ValueError, match="status code: 404"):
+        cache.get(url(origin, "/missing.sql"))
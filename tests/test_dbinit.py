@@ -0,0 +1,248 @@
+"""tests for populating, reusing and rebuilding the CDM schema on postgresql"""
+
+import logging
+import uuid
+from typing import List, Sequence
+
+import pytest
+from sqlalchemy import inspect, text
+
+from modelgen.dbinit import (
+    DDLReference,
+    create_database,
+    drop_database,
+    ensure_template,
+    get_engine,
+    initdb,
+)
+
+from .conftest import ConfigFactory
+
+
+def scalar(config, sql: str):
+    """return the result of the given query on the configured database"""
+    with get_engine(config).connect() as cnxn:
+        return cnxn.execute(text(sql)).scalar()
+
+
+def execute(config, *statements: str) -> None:
+    """execute the given statements on the configured database in a transaction"""
+    with get_engine(config).connect() as cnxn, cnxn.begin():
+        for statement in statements:
+            cnxn.execute(text(statement))
+
+
+def recording_groups(
+    reference: DDLReference, monkeypatch: pytest.MonkeyPatch
+) -> List[List[str]]:
+    """record the groups of statements the reference executes on a connection"""
+    groups: List[List[str]] = []
+    execute_statements = reference.execute_statements
+
+    def record(cnxn, category: str, statements: Sequence[str]) -> None:
+        groups.append(list(statements))
+        execute_statements(cnxn, category, statements)
+
+    monkeypatch.setattr(reference, "execute_statements", record)
+    return groups
+
+
+def test_populate_and_reuse(make_config: ConfigFactory, database: List[str]) -> None:
+    """a schema populated from the same DDL is reused without replaying it"""
+    config = make_config(*database)
+    initdb(config)
+    reference = DDLReference(config)
+
+    assert reference.schema_marker() == (
+        reference.fingerprint,
+        reference.table_names(),
+    )
+    assert len(inspect(get_engine(config)).get_table_names()) == 45
+
+    execute(config, "INSERT INTO cohort VALUES (1, 1, '2024-01-01', '2024-12-31')")
+    initdb(config)
+
+    assert scalar(config, "SELECT count(*) FROM cohort") == 1
+
+
+def test_rebuild_keeps_foreign_tables(
+    make_config: ConfigFactory, database: List[str]
+) -> None:
+    """
+    rebuilding a schema populated from other DDL only drops the CDM tables; the
+    other tables in the schema survive with their rows
+    """
+    initdb(make_config(*database))
+    execute(
+        make_config(*database),
+        "CREATE TABLE my_etl_audit (id integer PRIMARY KEY, note text)",
+        "INSERT INTO my_etl_audit VALUES (1, 'kept')",
+        "INSERT INTO cohort VALUES (1, 1, '2024-01-01', '2024-12-31')",
+    )
+
+    config = make_config(
+        *database, "--partition-by", "measurement:RANGE (measurement_date)"
+    )
+    initdb(config)
+
+    assert scalar(config, "SELECT note FROM my_etl_audit") == "kept"
+    assert scalar(config, "SELECT count(*) FROM cohort") == 0
+    assert (
+        scalar(
+            config,
+            "SELECT partstrat FROM pg_partitioned_table "
+            "WHERE partrelid = 'measurement'::regclass",
+        )
+        == "r"
+    )
+
+
+def test_rebuild_drops_recorded_tables(
+    make_config: ConfigFactory, database: List[str], tmp_path
+) -> None:
+    """the tables created by the previous DDL are dropped, even if now missing"""
+    overlay = tmp_path / "extra.sql"
+    overlay.write_text("CREATE TABLE @cdmDatabaseSchema.extra (id integer);")
+    initdb(make_config(*database, "--overlays", str(overlay)))
+
+    config = make_config(*database)
+    initdb(config)
+
+    assert "extra" not in inspect(get_engine(config)).get_table_names()
+
+
+def test_rebuild_refuses_to_drop_dependencies(
+    make_config: ConfigFactory, database: List[str]
+) -> None:
+    """CDM tables which other objects depend on are reported, not dropped"""
+    initdb(make_config(*database))
+    execute(
+        make_config(*database),
+        "CREATE TABLE my_etl_audit "
+        "(person_id integer REFERENCES person (person_id), note text)",
+    )
+
+    config = make_config(*database, "--overlays", "performance")
+    with pytest.raises(ValueError, match="other objects depend on them"):
+        initdb(config)
+
+    assert "my_etl_audit" in inspect(get_engine(config)).get_table_names()
+    assert "person" in inspect(get_engine(config)).get_table_names()
+
+
+def test_clone_from_template(
+    make_config: ConfigFactory, database: List[str], tmp_path
+) -> None:
+    """a database cloned from the template holds the up to date schema"""
+    admin = make_config(*database)
+    # an overlay of its own gives the test a template no other test run shares
+    overlay = tmp_path / "unique.sql"
+    overlay.write_text(
+        f"CREATE INDEX idx_{uuid.uuid4().hex} "
+        "ON @cdmDatabaseSchema.person (year_of_birth);"
+    )
+    target = make_config(*database, "--overlays", str(overlay))
+    template = ensure_template(admin, target)
+    clone = make_config(
+        *database[:-1], f"--db-name={template}_clone", "--overlays", str(overlay)
+    )
+    try:
+        assert ensure_template(admin, target) == template
+        create_database(admin, f"{template}_clone", template=template)
+        reference = DDLReference(clone)
+
+        assert reference.schema_marker() == (
+            reference.fingerprint,
+            reference.table_names(),
+        )
+    finally:
+        get_engine(clone).dispose()
+        drop_database(admin, f"{template}_clone")
+        with (
+            get_engine(admin)
+            .execution_options(isolation_level="AUTOCOMMIT")
+            .connect() as cnxn
+        ):
+            cnxn.execute(text(f'ALTER DATABASE "{template}" IS_TEMPLATE false'))
+            cnxn.execute(text(f'DROP DATABASE "{template}"'))
+
+
+def test_indices_grouped_by_table(
+    make_config: ConfigFactory,
+    database: List[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """the statements on each table run in order on a connection of their own"""
+    config = make_config(*database, "--db-workers", "2")
+    execute(
+        config, "CREATE TABLE a (x integer, y integer)", "CREATE TABLE b (z integer)"
+    )
+    reference = DDLReference(config)
+    groups = recording_groups(reference, monkeypatch)
+    statements = [
+        "CREATE INDEX idx_a_x ON a (x)",
+        "CREATE INDEX idx_b_z ON public.b (z)",
+        "CLUSTER a USING idx_a_x",
+        "CREATE INDEX idx_a_y ON a (y)",
+    ]
+
+    reference.execute_concurrently("indices", statements)
+
+    assert sorted(groups) == [
+        [
+            "CREATE INDEX idx_a_x ON a (x)",
+            "CLUSTER a USING idx_a_x",
+            "CREATE INDEX idx_a_y ON a (y)",
+        ],
+        ["CREATE INDEX idx_b_z ON public.b (z)"],
+    ]
+    assert {
+        index["name"] for index in inspect(get_engine(config)).get_indexes("a")
+    } == {
+        "idx_a_x",
+        "idx_a_y",
+    }
+
+
+def test_indices_in_order_without_table(
+    make_config: ConfigFactory,
+    database: List[str],
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """when a statement's table can't be told, all of them run in order"""
+    config = make_config(*database)
+    execute(config, "CREATE TABLE a (x integer)", "CREATE TABLE b (z integer)")
+    reference = DDLReference(config)
+    groups = recording_groups(reference, monkeypatch)
+    statements = [
+        "CREATE INDEX idx_a_x ON a (x)",
+        "ANALYZE a",
+        "CREATE INDEX idx_b_z ON b (z)",
+    ]
+
+    with caplog.at_level(logging.WARNING, logger="modelgen.dbinit"):
+        reference.execute_concurrently("indices", statements)
+
+    assert groups == [statements]
+    assert "unable to determine the table of indices statement ANALYZE a" in (
+        caplog.text
+    )
+
+
+def test_failed_statement_is_named(
+    make_config: ConfigFactory, database: List[str]
+) -> None:
+    """a failure is reported with the statement which caused it"""
+    config = make_config(*database)
+    execute(config, "CREATE TABLE a (x integer)")
+    reference = DDLReference(config)
+
+    with pytest.raises(
+        ValueError,
+        match="failed to execute indices statement: CREATE INDEX idx_a_y ON a \\(y\\)",
+    ):
+        reference.execute_concurrently(
+            "indices",
+            ["CREATE INDEX idx_a_x ON a (x)", "CREATE INDEX idx_a_y ON a (y)"],
+        )
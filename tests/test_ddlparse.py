@@ -0,0 +1,260 @@
+"""
+tests for the database-free metadata source: the DDL parser on its own, and its
+equivalence with reflecting the database populated from the same DDL
+"""
+
+from typing import Any, Dict, List
+
+import pytest
+from sqlalchemy import MetaData, Table
+from sqlalchemy.dialects import postgresql
+
+from modelgen.codegen import load_metadata, render_model
+from modelgen.dbinit import initdb
+from modelgen.ddlparse import (
+    metadata_from_ddl,
+    parse_partition,
+    partitioned,
+    split_statements,
+)
+from modelgen.pipeline import run, steps_for
+
+from .conftest import CONCEPT_COLUMNS, ConfigFactory
+
+
+def describe_table(table: Table) -> Dict[str, Any]:
+    """return a comparable description of everything reflection records of a table"""
+    dialect = postgresql.dialect()
+    return {
+        "columns": [
+            (column.name, column.type.compile(dialect=dialect), column.nullable)
+            for column in table.columns
+        ],
+        "primary_key": (
+            table.primary_key.name,
+            [column.name for column in table.primary_key.columns],
+        ),
+        "foreign_keys": sorted(
+            (
+                fk.name,
+                [column.name for column in fk.columns],
+                fk.referred_table.name,
+                [element.column.name for element in fk.elements],
+            )
+            for fk in table.foreign_key_constraints
+        ),
+        "indexes": sorted(
+            (
+                index.name,
+                [column.name for column in index.columns],
+                bool(index.unique),
+                index.dialect_options["postgresql"]["using"] or None,
+                list(index.dialect_options["postgresql"]["include"] or []),
+            )
+            for index in table.indexes
+        ),
+    }
+
+
+def describe(metadata: MetaData) -> Dict[str, Dict[str, Any]]:
+    """return a comparable description of every table of the given metadata"""
+    return {table.name: describe_table(table) for table in metadata.tables.values()}
+
+
+def test_split_statements() -> None:
+    """comments and terminators are removed, quoted semicolons are kept"""
+    sql = """
+        -- a comment; with a semicolon
+        CREATE TABLE a (x integer); /* block; comment */
+        COMMENT ON TABLE a IS 'it''s; quoted';
+        CREATE TABLE "b;c" (y integer)
+    """
+    assert split_statements(sql) == [
+        "CREATE TABLE a (x integer)",
+        "COMMENT ON TABLE a IS 'it''s; quoted'",
+        'CREATE TABLE "b;c" (y integer)',
+    ]
+
+
+def test_split_dollar_quoted_statements() -> None:
+    """semicolons in dollar-quoted strings, such as function bodies, are kept"""
+    sql = """
+        DO $$ BEGIN PERFORM 1; END $$;
+        CREATE FUNCTION f() RETURNS text AS $body$ SELECT '$$;'; $body$ LANGUAGE sql;
+        SELECT price$1 FROM a; SELECT 2
+    """
+    assert split_statements(sql) == [
+        "DO $$ BEGIN PERFORM 1; END $$",
+        "CREATE FUNCTION f() RETURNS text AS $body$ SELECT '$$;'; $body$ "
+        "LANGUAGE sql",
+        "SELECT price$1 FROM a",
+        "SELECT 2",
+    ]
+
+
+def test_parse_statements() -> None:
+    """tables, keys and indexes are parsed as postgresql would store them"""
+    metadata = metadata_from_ddl(
+        [
+            "CREATE TABLE cdm.CONCEPT (concept_id integer NOT NULL, "
+            "concept_name varchar(255) NOT NULL, invalid_reason varchar(1) NULL)",
+            "CREATE TABLE cdm.MEASUREMENT (measurement_id integer NOT NULL, "
+            "measurement_concept_id integer NOT NULL, value_as_number NUMERIC NULL, "
+            "measurement_datetime TIMESTAMP NULL)",
+            "ALTER TABLE cdm.CONCEPT ADD CONSTRAINT xpk_CONCEPT "
+            "PRIMARY KEY (concept_id)",
+            "ALTER TABLE cdm.MEASUREMENT ADD CONSTRAINT fpk_measurement_concept_id "
+            "FOREIGN KEY (measurement_concept_id) REFERENCES cdm.CONCEPT (CONCEPT_ID)",
+            "CREATE INDEX idx_measurement_concept_id_1 ON cdm.measurement "
+            "(measurement_concept_id ASC)",
+            "CREATE INDEX idx_measurement_brin ON cdm.measurement USING brin "
+            "(measurement_datetime)",
+            "CLUSTER cdm.measurement USING idx_measurement_concept_id_1",
+        ]
+    )
+    tables = describe(metadata)
+
+    assert tables["concept"]["columns"] == [
+        ("concept_id", "INTEGER", False),
+        ("concept_name", "VARCHAR(255)", False),
+        ("invalid_reason", "VARCHAR(1)", True),
+    ]
+    assert tables["concept"]["primary_key"] == ("xpk_concept", ["concept_id"])
+    assert tables["measurement"]["columns"][2:] == [
+        ("value_as_number", "NUMERIC", True),
+        ("measurement_datetime", "TIMESTAMP WITHOUT TIME ZONE", True),
+    ]
+    assert tables["measurement"]["foreign_keys"] == [
+        (
+            "fpk_measurement_concept_id",
+            ["measurement_concept_id"],
+            "concept",
+            ["concept_id"],
+        )
+    ]
+    assert tables["measurement"]["indexes"] == [
+        ("idx_measurement_brin", ["measurement_datetime"], False, "brin", []),
+        (
+            "idx_measurement_concept_id_1",
+            ["measurement_concept_id"],
+            False,
+            None,
+            [],
+        ),
+    ]
+
+
+def test_ignored_statements() -> None:
+    """statements which don't change the tables, as in overlay packs, are ignored"""
+    metadata = metadata_from_ddl(
+        [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE TABLE person (person_id integer NOT NULL)",
+            "COMMENT ON TABLE person IS 'people'",
+            "ANALYZE person",
+            "DO $$ BEGIN PERFORM 1; END $$",
+            "CREATE OR REPLACE FUNCTION f() RETURNS integer AS $$ SELECT 1 $$ "
+            "LANGUAGE sql",
+        ]
+    )
+    assert list(describe(metadata)) == ["person"]
+
+
+def test_unsupported_statement() -> None:
+    """statements which would change the schema in unknown ways are rejected"""
+    with pytest.raises(ValueError, match="unsupported DDL statement"):
+        metadata_from_ddl(["DROP TABLE concept"])
+    with pytest.raises(ValueError, match="unsupported DDL statement"):
+        metadata_from_ddl(["CREATE VIEW v AS SELECT 1"])
+
+
+def test_partitioned_statements() -> None:
+    """partitioning extends the primary key and drops the table's CLUSTER"""
+    partitions = {
+        "measurement": parse_partition("measurement:range (measurement_date)")
+    }
+    statements: List[str] = [
+        "CREATE TABLE measurement (measurement_id integer NOT NULL)",
+        "ALTER TABLE measurement ADD CONSTRAINT xpk_measurement "
+        "PRIMARY KEY (measurement_id)",
+        "CLUSTER measurement USING idx_measurement_person_id_1",
+    ]
+
+    assert [partitioned(statement, partitions) for statement in statements] == [
+        "CREATE TABLE measurement (measurement_id integer NOT NULL) "
+        "PARTITION BY RANGE (measurement_date)",
+        "ALTER TABLE measurement ADD CONSTRAINT xpk_measurement "
+        "PRIMARY KEY (measurement_id, measurement_date)",
+        None,
+    ]
+
+
+def test_parse_cdm_ddl(make_config: ConfigFactory) -> None:
+    """the whole CDM DDL (with the edenceHealth modifications) parses"""
+    metadata = load_metadata(make_config("--metadata-source", "ddl"))
+    tables = describe(metadata)
+
+    assert len(tables) == 45
+    assert tables["concept_relationship"]["primary_key"] == (
+        "eh_composite_pk_concept_relationship",
+        [
+            "concept_id_1",
+            "concept_id_2",
+            "relationship_id",
+            "valid_start_date",
+            "valid_end_date",
+        ],
+    )
+    assert tuple(column[0] for column in tables["concept"]["columns"]) == (
+        CONCEPT_COLUMNS
+    )
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        pytest.param([], id="declarative"),
+        pytest.param(["--generator", "tables"], id="tables"),
+        pytest.param(["--overlays", "performance"], id="overlays"),
+        pytest.param(
+            ["--partition-by", "measurement:RANGE (measurement_date)"],
+            id="partitioned",
+        ),
+    ],
+)
+def test_parsed_schema_matches_database(
+    make_config: ConfigFactory, database: List[str], args: List[str]
+) -> None:
+    """
+    parsing the DDL gives the same metadata, and with it the same generated model,
+    as reflecting the database it populated
+    """
+    reflected_config = make_config(*database, *args)
+    parsed_config = make_config(*database, *args, "--metadata-source", "ddl")
+    initdb(reflected_config)
+
+    reflected = load_metadata(reflected_config)
+    parsed = load_metadata(parsed_config)
+
+    assert describe(parsed) == describe(reflected)
+    assert render_model(parsed_config, parsed) == render_model(
+        reflected_config, reflected
+    )
+
+
+def test_rewritten_model_matches_database(
+    make_config: ConfigFactory, database: List[str], tmp_path
+) -> None:
+    """the whole pipeline writes the same model from either metadata source"""
+    reflected_config = make_config(
+        *database, "--output-file", str(tmp_path / "reflected.py")
+    )
+    parsed_config = make_config(
+        "--metadata-source", "ddl", "--output-file", str(tmp_path / "parsed.py")
+    )
+
+    reflected = run(reflected_config, steps_for(reflected_config))
+    parsed = run(parsed_config, steps_for(parsed_config))
+
+    assert "class Concept(OMOPCDMModelBase):" in parsed
+    assert parsed == reflected
@@ -0,0 +1,76 @@
+"""tests for the import time and memory benchmark of the written model"""
+
+import json
+import os
+from typing import Any, Dict, List
+
+import pytest
+
+from modelgen.importbench import check_limits, parse_importtime
+from modelgen.pipeline import run, steps_for
+
+from .conftest import ConfigFactory
+
+
+def report(total: float, peak_rss: int) -> Dict[str, Any]:
+    """return a benchmark report with the given summary"""
+    return {"summary": {"total": total, "peak_rss": peak_rss}}
+
+
+def test_benchmark_import(make_config: ConfigFactory) -> None:
+    """the written model is imported and measured in a subprocess"""
+    config = make_config("--metadata-source", "ddl", "--benchmark-import")
+    run(config, steps_for(config))
+
+    with open(
+        os.path.join(config.log_dir, "import_benchmark.json"), "rt", encoding="utf8"
+    ) as fh:
+        result = json.load(fh)
+    assert result["model"] == os.path.abspath(config.output_file)
+    assert len(result["runs"]) == 3
+    assert 0 < result["summary"]["model_import"] < result["summary"]["total"]
+    assert result["summary"]["peak_rss"] > 0
+    assert "sqlalchemy" in {entry["module"] for entry in result["importtime"]}
+
+
+def test_parse_importtime() -> None:
+    """the -X importtime lines are parsed, most expensive first"""
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   typing\n"
+        "import time:       300 |       4500 | sqlalchemy\n"
+        "some other output\n"
+    )
+    assert parse_importtime(output) == [
+        {"module": "sqlalchemy", "self_us": 300, "cumulative_us": 4500},
+        {"module": "typing", "self_us": 120, "cumulative_us": 120},
+    ]
+
+
+def test_budgets(make_config: ConfigFactory) -> None:
+    """the import time and peak RSS budgets are only checked when set"""
+    assert not check_limits(make_config(), report(9.0, 2**40), None)
+
+    config = make_config("--import-time-budget", "0.5", "--import-rss-budget", "100")
+    assert not check_limits(config, report(0.5, 100 * 2**20), None)
+    problems = check_limits(config, report(0.6, 101 * 2**20), None)
+    assert len(problems) == 2
+    assert "over the budget of 0.5s" in problems[0]
+    assert "over the budget of 100MiB" in problems[1]
+
+
+@pytest.mark.parametrize(
+    "total, peak_rss, exceeded",
+    [
+        (1.2, 120, []),
+        (1.3, 100, ["total"]),
+        (1.0, 130, ["peak_rss"]),
+    ],
+)
+def test_baseline_tolerance(
+    make_config: ConfigFactory, total: float, peak_rss: int, exceeded: List[str]
+) -> None:
+    """the import may exceed the baseline by the tolerance"""
+    config = make_config("--import-tolerance", "0.25")
+    problems = check_limits(config, report(total, peak_rss), report(1.0, 100))
+    assert [problem.split()[0] for problem in problems] == exceeded
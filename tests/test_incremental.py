@@ -0,0 +1,57 @@
+"""tests for regenerating only the classes of the changed tables"""
+
+import logging
+
+import libcst as cst
+import pytest
+
+from modelgen.incremental import merged_imports
+from modelgen.pipeline import run, steps_for
+
+from .conftest import ConfigFactory
+
+
+def test_merged_imports() -> None:
+    """the imports of both modules are merged and reduced to the used names"""
+    old = cst.parse_module(
+        "import sqlalchemy\nimport datetime\nfrom typing import List, Optional\n"
+    )
+    new = cst.parse_module("from typing import Dict\nfrom . import base\n")
+    body = cst.parse_module("x: List[base.Base] = sqlalchemy.null()\ny: Dict\n").body
+
+    assert merged_imports([old, new], body) == [
+        "import sqlalchemy",
+        "from . import base",
+        "from typing import Dict, List",
+    ]
+
+
+def test_regenerated_model_matches_full_model(
+    make_config: ConfigFactory, tmp_path, caplog: pytest.LogCaptureFixture
+) -> None:
+    """
+    splicing the regenerated classes of changed tables gives the model a full run
+    writes (new tables are added after the last table instead)
+    """
+    overlay = tmp_path / "index.sql"
+    overlay.write_text(
+        "CREATE INDEX idx_person_year ON @cdmDatabaseSchema.person (year_of_birth);"
+    )
+    args = ["--metadata-source", "ddl", "--incremental"]
+    run(make_config(*args), steps_for(make_config(*args)))
+
+    config = make_config(*args, "--overlays", str(overlay))
+    with caplog.at_level(logging.INFO, logger="modelgen.incremental"):
+        regenerated = run(config, steps_for(config))
+    full_config = make_config(
+        "--metadata-source",
+        "ddl",
+        "--overlays",
+        str(overlay),
+        "--output-file",
+        str(tmp_path / "full.py"),
+    )
+
+    assert "regenerating the classes of 1 tables: person" in caplog.text
+    assert "idx_person_year" in regenerated
+    assert regenerated == run(full_config, steps_for(full_config))
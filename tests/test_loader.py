@@ -0,0 +1,109 @@
+"""tests for the generated COPY-based bulk loader module"""
+
+import datetime
+import importlib.util
+import io
+import types
+from typing import List
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from modelgen.dbinit import get_engine
+from modelgen.loader import loader_path
+from modelgen.pipeline import run, steps_for
+
+from .conftest import CONCEPT_COLUMNS, ConfigFactory
+
+
+def import_loader(path: str) -> types.ModuleType:
+    """import the loader module written at the given path"""
+    spec = importlib.util.spec_from_file_location("modelgen_test_loader", path)
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_loader_uses_table_column_order(make_config: ConfigFactory) -> None:
+    """
+    the loader takes the columns in the order of the table, not in the order the
+    model renders them in (sqlacodegen puts the NOT NULL columns first)
+    """
+    config = make_config("--metadata-source", "ddl", "--bulk-loader")
+    model = run(config, steps_for(config))
+    loader = import_loader(loader_path(config))
+
+    assert loader.concept_table.columns == CONCEPT_COLUMNS
+    assert loader.concept_table.copy_sql.startswith(
+        f"COPY concept ({', '.join(CONCEPT_COLUMNS)})"
+    )
+    assert model.index("standard_concept") > model.index("valid_end_date")
+
+
+def test_deferring_needs_a_transaction(make_config: ConfigFactory) -> None:
+    """
+    the foreign keys and indexes are only dropped in a transaction, which
+    restores them when the load fails
+    """
+    config = make_config("--metadata-source", "ddl", "--bulk-loader")
+    run(config, steps_for(config))
+    loader = import_loader(loader_path(config))
+
+    with create_engine("sqlite://").connect() as cnxn:
+        with pytest.raises(ValueError, match="transaction"):
+            with loader.deferred(cnxn, loader.concept_table):
+                pass
+        # nothing is dropped, so there is nothing to restore
+        with loader.deferred(
+            cnxn, loader.concept_table, constraints=False, indexes=False
+        ):
+            pass
+
+
+def test_load_rows_and_files(make_config: ConfigFactory, database: List[str]) -> None:
+    """rows in the table's column order and COPY files load into the database"""
+    config = make_config(*database, "--bulk-loader")
+    run(config, steps_for(config))
+    loader = import_loader(loader_path(config))
+
+    vocabulary = [
+        loader.tables[name]
+        for name in ("concept", "domain", "vocabulary", "concept_class")
+    ]
+    keys = ("Drug", "RxNorm", "Ingredient")
+    start, end = datetime.date(1970, 1, 1), datetime.date(2099, 12, 31)
+    with get_engine(config).connect() as cnxn, cnxn.begin():
+        # the vocabulary tables refer to each other, their keys are checked at the end
+        with loader.deferred(cnxn, *vocabulary, indexes=False):
+            loader.load_domain(cnxn, [("Drug", "Drug", 1)])
+            loader.load_vocabulary(cnxn, [("RxNorm", "RxNorm", None, "v1", 2)])
+            loader.load_concept_class(cnxn, [("Ingredient", "Ingredient", 3)])
+            loaded = loader.load_concept(
+                cnxn,
+                [
+                    (1, "a\ttab", *keys, "S", "1", start, end, None),
+                    (2, "two", *keys, None, "2", start, end, "D"),
+                ],
+            )
+            loaded += loader.load_concept(
+                cnxn,
+                io.StringIO(
+                    ",".join(CONCEPT_COLUMNS)
+                    + "\n3,three,Drug,RxNorm,Ingredient,C,3,2000-01-01,2099-12-31,\n"
+                ),
+                options="FORMAT csv, HEADER",
+            )
+        rows = cnxn.execute(
+            text(
+                "SELECT concept_id, concept_name, standard_concept, valid_start_date, "
+                "invalid_reason FROM concept ORDER BY concept_id"
+            )
+        ).all()
+
+    assert loaded == 3
+    assert [tuple(row) for row in rows] == [
+        (1, "a\ttab", "S", start, None),
+        (2, "two", None, start, "D"),
+        (3, "three", "C", datetime.date(2000, 1, 1), None),
+    ]
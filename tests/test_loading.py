@@ -0,0 +1,78 @@
+"""tests for setting the loading strategy of the model's relationships"""
+
+import pytest
+
+from modelgen.loading import Relationship, loading_rules, strategy_for
+from modelgen.lookup import exec_model
+from modelgen.pipeline import run, steps_for
+
+from .conftest import ConfigFactory
+
+# a reference to a lookup table, and a collection of clinical rows
+TO_CONCEPT = Relationship("measurement", "measurement_concept", "concept", False)
+TO_VISITS = Relationship("person", "visit_occurrence", "visit_occurrence", True)
+
+
+@pytest.mark.parametrize(
+    "args,expected",
+    [
+        pytest.param([], (None, None), id="generated"),
+        pytest.param(["--lazy-policy", "cdm"], ("selectin", "raise"), id="policy"),
+        pytest.param(
+            ["--lazy-policy", "cdm", "--lazy-loading", "*:select"],
+            ("select", "select"),
+            id="star-over-policy",
+        ),
+        pytest.param(
+            [
+                "--lazy-policy",
+                "cdm",
+                "--lazy-loading",
+                "*:select",
+                "--lazy-loading",
+                "concept:joined",
+                "--lazy-loading",
+                "person.visit_occurrence:write_only",
+            ],
+            ("joined", "write_only"),
+            id="named-over-star",
+        ),
+    ],
+)
+def test_strategy_for(make_config: ConfigFactory, args, expected) -> None:
+    """entries by name, then by table, then "*", then the policy"""
+    config = make_config(*args)
+    rules = loading_rules(config)
+
+    assert (
+        strategy_for(config, rules, TO_CONCEPT),
+        strategy_for(config, rules, TO_VISITS),
+    ) == expected
+
+
+def test_star_entry_with_policy(make_config: ConfigFactory) -> None:
+    """a "*" entry sets every relationship no other entry sets, despite the policy"""
+    config = make_config(
+        "--metadata-source",
+        "ddl",
+        "--lazy-policy",
+        "cdm",
+        "--lazy-loading",
+        "*:selectin",
+        "--lazy-loading",
+        "concept:joined",
+    )
+    model = vars(exec_model(run(config, steps_for(config))))
+    strategies = {
+        (relationship.mapper.local_table.name, relationship.lazy)
+        for value in model.values()
+        if isinstance(value, type) and hasattr(value, "__mapper__")
+        for relationship in value.__mapper__.relationships
+    }
+
+    assert {strategy for table, strategy in strategies if table == "concept"} == {
+        "joined"
+    }
+    assert {strategy for table, strategy in strategies if table != "concept"} == {
+        "selectin"
+    }
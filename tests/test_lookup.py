@@ -0,0 +1,21 @@
+"""tests for the lookups appended to the model"""
+
+from modelgen.lookup import exec_model
+from modelgen.pipeline import run, steps_for
+
+from .conftest import ConfigFactory
+
+
+def test_lookups_of_classes(make_config: ConfigFactory) -> None:
+    """the lookups map each table to its class and each class to its columns"""
+    config = make_config("--metadata-source", "ddl", "--lookup-registry")
+    model = vars(exec_model(run(config, steps_for(config))))
+    care_site = model["CareSite"]
+
+    assert len(model["class_by_table"]) == 45
+    assert model["class_by_table"]["care_site"] is care_site
+    assert model["class_columns"][care_site] == tuple(
+        column.name for column in care_site.__table__.columns
+    )
+    assert model["primary_keys"]["person"] == ("person_id",)
+    assert "gender_concept_id" in model["concept_columns"]["person"]
@@ -0,0 +1,17 @@
+"""tests for building the matrix of CDM version / dialect targets"""
+
+import pytest
+
+from modelgen.matrix import Target
+
+
+def test_parse_target() -> None:
+    """a target is a "cdm_version:dialect" pair"""
+    assert Target.parse("v5.4.1:postgresql") == Target("v5.4.1", "postgresql")
+
+
+@pytest.mark.parametrize("spec", ["v5.4.1:sql_server", "5.4:oracle", "v5.4.1"])
+def test_reject_target(spec: str) -> None:
+    """targets without a dialect or with a dialect which can't be built fail"""
+    with pytest.raises(ValueError):
+        Target.parse(spec)
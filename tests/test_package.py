@@ -0,0 +1,81 @@
+"""tests for the package output layout"""
+
+import json
+import subprocess  # nosec: considered
+import sys
+import textwrap
+from typing import Any, Dict
+
+import pytest
+
+from modelgen.pipeline import run, steps_for
+
+from .conftest import ConfigFactory
+
+# imports the package, then prints the number of its modules loaded after each step
+PROBE = """
+import json, sys
+from sqlalchemy.orm import configure_mappers
+
+def loaded():
+    return sorted(m.split(".")[1] for m in sys.modules if m.startswith("model."))
+
+import model
+result = {"import": loaded()}
+person = model.Person
+result["access"] = loaded()
+configure_mappers()
+result["configure"] = loaded()
+model.Person(person_id=1).care_site = model.CareSite(care_site_id=1)
+result["all"] = len(model.__all__)
+print(json.dumps(result))
+"""
+
+
+def probe(directory: str) -> Dict[str, Any]:
+    """run PROBE on the package in the given directory in a fresh interpreter"""
+    completed = subprocess.run(  # nosec: considered
+        [sys.executable, "-c", textwrap.dedent(PROBE)],
+        cwd=directory,
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(completed.stdout)
+
+
+@pytest.mark.parametrize("options", [[], ["--options", "nobidi"]])
+def test_classes_are_loaded_on_demand(
+    make_config: ConfigFactory, tmp_path, options
+) -> None:
+    """
+    accessing a class imports only its module, configuring the mappers imports
+    the classes its relationships need
+    """
+    config = make_config(
+        "--metadata-source", "ddl", "--output-layout", "package", *options
+    )
+    run(config, steps_for(config))
+
+    loaded = probe(str(tmp_path))
+
+    assert loaded["import"] == ["base"]
+    assert loaded["access"] == ["base", "person"]
+    assert {"care_site", "concept", "location"} <= set(loaded["configure"])
+    assert len(loaded["configure"]) < loaded["all"]
+
+
+def test_stale_modules_are_removed(make_config: ConfigFactory, tmp_path) -> None:
+    """modules of tables which are no longer generated are removed"""
+    config = make_config("--metadata-source", "ddl", "--output-layout", "package")
+    run(config, steps_for(config))
+    stale = tmp_path / "model" / "retired_table.py"
+    stale.write_text("class RetiredTable:\n    pass\n", encoding="utf8")
+    notes = tmp_path / "model" / "notes.txt"
+    notes.write_text("not a module\n", encoding="utf8")
+
+    run(config, steps_for(config))
+
+    assert not stale.exists()
+    assert notes.exists()
+    assert (tmp_path / "model" / "person.py").exists()
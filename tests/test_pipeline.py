@@ -0,0 +1,159 @@
+"""tests for running the pipeline's steps"""
+
+import logging
+import os
+from typing import List
+
+import pytest
+
+from modelgen import codegen, dbinit
+from modelgen.pipeline import dependencies, run, steps_for
+
+from .conftest import ConfigFactory
+
+
+def test_steps_wait_for_their_inputs(make_config: ConfigFactory) -> None:
+    """
+    the database steps wait for the DDL, the model steps pass the source along
+    and the modules written next to the model don't hold up its formatting
+    """
+    steps = steps_for(make_config("--bulk-loader", "--row-types", "--async-model"))
+    names = [step.name for step in steps]
+    deps = {
+        names[i]: sorted(names[d] for d in step_deps)
+        for i, step_deps in enumerate(dependencies(steps))
+    }
+
+    assert deps["fetch_ddl"] == deps["fetch_docs"] == []
+    assert deps["connect"] == ["fetch_ddl"]
+    assert deps["initdb"] == ["connect", "fetch_ddl"]
+    assert deps["sqlacodegen"] == ["initdb"]
+    assert deps["write_session_module"] == []
+    assert deps["write_row_types"] == ["rename_base_and_add_docstrings"]
+    assert deps["write_loader"] == ["initdb"]
+    assert deps["isort"] == ["rename_base_and_add_docstrings"]
+
+
+def test_verify_waits_for_the_database(make_config: ConfigFactory) -> None:
+    """verify reads the database, so it waits for it to be populated"""
+    steps = steps_for(make_config("--verify"))
+    names = [step.name for step in steps]
+
+    assert names.index("initdb") in dependencies(steps)[names.index("verify")]
+
+
+def test_ddl_source_has_no_database_steps(make_config: ConfigFactory) -> None:
+    """the DDL metadata source doesn't connect to a database"""
+    names = [step.name for step in steps_for(make_config("--metadata-source", "ddl"))]
+
+    assert "connect" not in names
+    assert "initdb" not in names
+
+
+def test_cached_run_needs_no_database(
+    make_config: ConfigFactory,
+    database: List[str],
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """a rerun with nothing to regenerate neither connects nor populates"""
+    config = make_config(*database)
+    model = run(config, steps_for(config))
+
+    def unavailable(config):
+        raise AssertionError("the database was used")
+
+    monkeypatch.setattr(dbinit, "get_engine", unavailable)
+    monkeypatch.setattr(codegen, "get_engine", unavailable)
+    with caplog.at_level(logging.INFO, logger="modelgen.pipeline"):
+        assert run(config, steps_for(config)) == model
+
+    assert "connect unchanged, skipping" in caplog.text
+    assert "initdb unchanged, skipping" in caplog.text
+
+
+def test_cached_run_with_verify_populates_the_database(
+    make_config: ConfigFactory,
+    database: List[str],
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    """verify reads the database, so a rerun populates it even if nothing changed"""
+    config = make_config(*database, "--verify")
+    run(config, steps_for(config))
+
+    with caplog.at_level(logging.INFO, logger="modelgen.pipeline"):
+        run(config, steps_for(config))
+
+    assert "initdb unchanged, skipping" not in caplog.text
+    assert any(record.getMessage().endswith("; initdb") for record in caplog.records)
+
+
+def test_unchanged_companion_modules_are_skipped(
+    make_config: ConfigFactory, caplog: pytest.LogCaptureFixture
+) -> None:
+    """
+    a rerun with nothing to regenerate doesn't rewrite the companion modules,
+    but restores those which were removed
+    """
+    config = make_config(
+        "--metadata-source", "ddl", "--row-types", "--bulk-loader", "--async-model"
+    )
+    model = run(config, steps_for(config))
+    base = os.path.splitext(config.output_file)[0]
+    modules = {}
+    for suffix in ("_rows.py", "_load.py", "_session.py"):
+        with open(base + suffix, "rt", encoding="utf8") as fh:
+            modules[suffix] = fh.read()
+
+    with caplog.at_level(logging.INFO, logger="modelgen.pipeline"):
+        assert run(config, steps_for(config)) == model
+    for name in ("write_session_module", "write_row_types", "write_loader"):
+        assert f"{name} unchanged, skipping" in caplog.text
+
+    for suffix in modules:
+        os.remove(base + suffix)
+    run(config, steps_for(config))
+    for suffix, content in modules.items():
+        with open(base + suffix, "rt", encoding="utf8") as fh:
+            assert fh.read() == content
+
+
+def test_unknown_step(make_config: ConfigFactory) -> None:
+    """--steps and --skip only take the names of the pipeline's steps"""
+    for option in ("--steps", "--skip"):
+        config = make_config("--metadata-source", "ddl", option, "initdb")
+        with pytest.raises(ValueError, match="unknown step initdb"):
+            run(config, steps_for(config))
+
+
+def test_unselected_steps_use_their_last_output(
+    make_config: ConfigFactory, caplog: pytest.LogCaptureFixture
+) -> None:
+    """a step which isn't selected passes on the output it recorded last time"""
+    config = make_config("--metadata-source", "ddl")
+    model = run(config, steps_for(config))
+    config = make_config(
+        "--metadata-source",
+        "ddl",
+        "--force",
+        "--steps",
+        "rename_base_and_add_docstrings",
+        "--steps",
+        "write_output",
+    )
+    with caplog.at_level(logging.INFO, logger="modelgen.pipeline"):
+        assert run(config, steps_for(config)) == model
+
+    assert "sqlacodegen not selected, using its last output" in caplog.text
+    assert "black not selected, using its last output" in caplog.text
+    assert any(
+        record.getMessage().endswith("; rename_base_and_add_docstrings")
+        for record in caplog.records
+    )
+
+
+def test_unselected_step_without_output(make_config: ConfigFactory) -> None:
+    """a step can only be skipped once it has recorded an output"""
+    config = make_config("--metadata-source", "ddl", "--skip", "sqlacodegen")
+    with pytest.raises(ValueError, match="step sqlacodegen is not selected"):
+        run(config, steps_for(config))
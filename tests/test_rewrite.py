@@ -0,0 +1,57 @@
+"""tests for the rewrite of the generated model"""
+
+from modelgen.lookup import exec_model
+from modelgen.pipeline import run, steps_for
+from modelgen.rewrite import rename_base_and_add_docstrings
+
+from .conftest import ConfigFactory
+
+
+def test_partitioning_added_to_table_args(make_config: ConfigFactory) -> None:
+    """the partitioning of a class's table is added to its __table_args__"""
+    config = make_config(
+        "--metadata-source",
+        "ddl",
+        "--partition-by",
+        "measurement:RANGE (measurement_date)",
+    )
+    model = vars(exec_model(run(config, steps_for(config))))
+    measurement = model["Measurement"].__table__
+
+    assert measurement.dialect_options["postgresql"]["partition_by"] == (
+        "RANGE (measurement_date)"
+    )
+    # the other table arguments are kept
+    assert {index.name for index in measurement.indexes} == {
+        "idx_measurement_concept_id_1",
+        "idx_measurement_person_id_1",
+    }
+    assert (
+        model["Person"].__table__.dialect_options["postgresql"]["partition_by"] is None
+    )
+
+
+def test_core_metadata_renamed(make_config: ConfigFactory) -> None:
+    """
+    only the module's MetaData object and the Table calls' MetaData argument are
+    renamed, not attributes or keywords which happen to be called metadata
+    """
+    config = make_config("--generator", "tables", "--metadata-name", "cdm_metadata")
+    source = (
+        "from sqlalchemy import Column, Integer, MetaData, Table\n"
+        "\n"
+        "metadata = MetaData()\n"
+        "\n"
+        "t_person = Table(\n"
+        "    'person', metadata, Column('person_id', Integer), info={'metadata': 1}\n"
+        ")\n"
+        "tables = t_person.metadata.tables\n"
+        "other = dict(metadata=None)\n"
+    )
+    model = rename_base_and_add_docstrings(config, source)
+
+    assert "cdm_metadata = MetaData()" in model
+    assert "Table(\n    'person', cdm_metadata," in model
+    assert "t_person.metadata.tables" in model
+    assert "dict(metadata=None)" in model
+    assert "{'metadata': 1}" in model
@@ -0,0 +1,119 @@
+"""tests for the generated read-only row types module"""
+
+import datetime
+import importlib.util
+import types
+from typing import Iterator, Optional
+
+import pytest
+from sqlalchemy import Connection, create_engine, text
+
+from modelgen.formatting import format_file
+from modelgen.rowtypes import rows_source
+
+MODEL = """\
+import datetime
+from typing import Optional
+
+from sqlalchemy import Date, Integer, String
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Person(Base):
+    __tablename__ = "person"
+
+    person_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    birth_date: Mapped[Optional[datetime.date]] = mapped_column(Date)
+    source_value: Mapped[Optional[str]] = mapped_column("person_source_value", String)
+
+
+class Vocabulary(Base):
+    __tablename__ = "vocabulary"
+
+    vocabulary_id: Mapped[str] = mapped_column(String, primary_key=True)
+"""
+
+
+@pytest.fixture(name="rows")
+def fixture_rows(tmp_path) -> types.ModuleType:
+    """write and import the row types module of the small model above"""
+    path = tmp_path / "model_rows.py"
+    path.write_text(format_file(rows_source(MODEL)), encoding="utf8")
+    spec = importlib.util.spec_from_file_location("modelgen_test_rows", path)
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(name="cnxn")
+def fixture_cnxn() -> Iterator[Connection]:
+    """a sqlite connection holding a person and a vocabulary"""
+    with create_engine("sqlite://").connect() as cnxn:
+        cnxn.execute(
+            text(
+                "CREATE TABLE person (person_id INTEGER, birth_date DATE, "
+                "person_source_value TEXT, gender TEXT)"
+            )
+        )
+        cnxn.execute(text("INSERT INTO person VALUES (1, '1970-01-01', 'p1', 'F')"))
+        cnxn.execute(text("CREATE TABLE vocabulary (vocabulary_id TEXT, name TEXT)"))
+        cnxn.execute(text("INSERT INTO vocabulary VALUES ('RxNorm', 'RxNorm')"))
+        yield cnxn
+
+
+def test_row_types_mirror_the_model(rows: types.ModuleType) -> None:
+    """each table class gets a row type with its fields and column names"""
+    assert set(rows.row_types) == {"person", "vocabulary"}
+    assert rows.PersonRow._fields == ("person_id", "birth_date", "source_value")
+    assert rows.row_columns[rows.PersonRow] == (
+        "person_id",
+        "birth_date",
+        "person_source_value",
+    )
+    assert rows.PersonRow.__annotations__ == {
+        "person_id": int,
+        "birth_date": Optional[datetime.date],
+        "source_value": Optional[str],
+    }
+
+
+def test_rows_in_field_order(rows: types.ModuleType, cnxn: Connection) -> None:
+    """a result holding exactly the row type's columns is used as it is"""
+    result = cnxn.execute(
+        text("SELECT person_id, birth_date, person_source_value FROM person")
+    )
+    assert list(rows.rows_as(rows.PersonRow, result)) == [
+        rows.PersonRow(1, "1970-01-01", "p1")
+    ]
+
+
+def test_rows_reordered_with_extra_columns(
+    rows: types.ModuleType, cnxn: Connection
+) -> None:
+    """the columns are matched by name, in any order and among others"""
+    result = cnxn.execute(
+        text("SELECT gender, person_source_value, person_id, birth_date FROM person")
+    )
+    (row,) = rows.rows_as(rows.PersonRow, result)
+    assert row == rows.PersonRow(1, "1970-01-01", "p1")
+    assert row.source_value == "p1"
+
+
+def test_single_column_rows(rows: types.ModuleType, cnxn: Connection) -> None:
+    """a row type with one field is built from the one matching column"""
+    result = cnxn.execute(text("SELECT name, vocabulary_id FROM vocabulary"))
+    assert list(rows.rows_as(rows.VocabularyRow, result)) == [
+        rows.VocabularyRow("RxNorm")
+    ]
+
+
+def test_missing_columns(rows: types.ModuleType, cnxn: Connection) -> None:
+    """a result lacking one of the row type's columns is refused"""
+    result = cnxn.execute(text("SELECT person_id, birth_date FROM person"))
+    with pytest.raises(ValueError, match="person_source_value"):
+        rows.rows_as(rows.PersonRow, result)
@@ -0,0 +1,104 @@
+"""tests for the documentation page parser"""
+
+import os
+
+import pytest
+
+from modelgen.cache import HTTPCache
+from modelgen.rtfm import (
+    get_omopcdm_descriptions,
+    parse_descriptions,
+    parse_descriptions_bs4,
+)
+
+from .conftest import REPO_DIR
+
+PAGE_PATH = os.path.join(REPO_DIR, "benchmarks", "fixtures", "cdm54.html")
+SECTION = '<div class="section level3 tabset tabset-pills">'
+
+
+def section(name: str, body: str) -> str:
+    """return the html of a table section with the given name and body"""
+    return f"{SECTION}<h3>{name}</h3>{body}</div>"
+
+
+@pytest.fixture(name="page", scope="module")
+def fixture_page() -> bytes:
+    """the CDM v5.4 documentation page"""
+    with open(PAGE_PATH, "rb") as fh:
+        return fh.read()
+
+
+def test_parser_matches_reference(page: bytes) -> None:
+    """the streaming parser agrees with the BeautifulSoup parser on the real page"""
+    descriptions = parse_descriptions(page)
+
+    assert len(descriptions) == 39
+    assert descriptions == parse_descriptions_bs4(page)
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        pytest.param(
+            section(
+                "PERSON",
+                "<p>Table Description</p><p>first</p><p>second</p>"
+                "<table><tr><td><p>field</p></td></tr></table><p>after</p>",
+            ),
+            id="paragraphs",
+        ),
+        pytest.param(
+            section(
+                "person",
+                "<p>Table Description</p><p>a <b>bold</b> <!-- hidden --> word</p>"
+                "<p>   </p><p>x &amp; y<br>z</p><table></table>",
+            ),
+            id="markup",
+        ),
+        pytest.param(
+            section(
+                "death",
+                "<div><p>Table Description</p><p>one</p></span></div>"
+                "<p>outside</p><table></table>",
+            ),
+            id="nested",
+        ),
+        pytest.param(
+            '<div class="section level3">not a table</div>'
+            + section("note", "<p>Table Description</p><p>text</p><table></table>"),
+            id="other-sections",
+        ),
+        pytest.param(
+            section("note", "<p>Table Description</p><p>unclosed <i>italic</p>"),
+            id="unclosed",
+        ),
+    ],
+)
+def test_parser_matches_reference_on_markup(html: str) -> None:
+    """the streaming parser builds the text the way BeautifulSoup does"""
+    content = html.encode("utf8")
+
+    assert parse_descriptions(content) == parse_descriptions_bs4(content)
+
+
+def test_section_without_description() -> None:
+    """a table section without a table description is an error"""
+    with pytest.raises(ValueError, match="without a name or table description"):
+        parse_descriptions(section("person", "<p>no description</p>").encode())
+
+
+def test_parsed_descriptions_are_cached(page: bytes, tmp_path) -> None:
+    """the descriptions are parsed once per page content"""
+    cache = HTTPCache(str(tmp_path), offline=True)
+    url = "https://example.invalid/cdm54.html"
+    cache.write_entry(
+        url,
+        {"url": url, "sha256": cache.put_object(page), "validated": 0},
+    )
+
+    descriptions = get_omopcdm_descriptions(url, cache)
+
+    assert descriptions == parse_descriptions(page)
+    assert len(os.listdir(tmp_path / "parsed")) == 1
+    assert get_omopcdm_descriptions(url, cache) == descriptions
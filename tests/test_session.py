@@ -0,0 +1,45 @@
+"""tests for the generated asyncio engine and session factory module"""
+
+import importlib.util
+import types
+
+import pytest
+
+from modelgen.formatting import format_file
+from modelgen.session import session_source
+
+from .conftest import ConfigFactory
+
+
+@pytest.fixture(name="session_module")
+def fixture_session_module(make_config: ConfigFactory, tmp_path) -> types.ModuleType:
+    """write and import the session factory module"""
+    config = make_config("--async-model", "--async-pool-size", "4")
+    path = tmp_path / "model_session.py"
+    path.write_text(format_file(session_source(config)), encoding="utf8")
+    spec = importlib.util.spec_from_file_location("modelgen_test_session", path)
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_pool_sizing(session_module: types.ModuleType) -> None:
+    """the pool sizing defaults come from the config"""
+    assert session_module.POOL_SIZE == 4
+    assert session_module.MAX_OVERFLOW == 20
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("postgresql://u@db/cdm", "postgresql+asyncpg://u@db/cdm"),
+        ("postgresql+psycopg2://u@db/cdm", "postgresql+asyncpg://u@db/cdm"),
+        ("postgresql+psycopg://u@db/cdm", "postgresql+psycopg://u@db/cdm"),
+        ("postgresql+asyncpg://u@db/cdm", "postgresql+asyncpg://u@db/cdm"),
+        ("sqlite+aiosqlite:///cdm.db", "sqlite+aiosqlite:///cdm.db"),
+    ],
+)
+def test_async_url(session_module: types.ModuleType, url: str, expected: str) -> None:
+    """the synchronous postgresql drivers are swapped for asyncpg, others are kept"""
+    assert session_module.async_url(url).render_as_string() == expected
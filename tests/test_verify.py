@@ -0,0 +1,85 @@
+"""tests for checking the written model against the database"""
+
+import json
+import os
+from typing import List
+
+import pytest
+
+from modelgen.dbinit import get_engine
+from modelgen.pipeline import run, steps_for
+from modelgen.verify import compare_table
+
+from .conftest import ConfigFactory
+
+
+def table_schema(*columns: str) -> dict:
+    """return the description of a table with the given integer columns"""
+    return {
+        "columns": {name: {"type": "INTEGER", "nullable": False} for name in columns},
+        "primary_key": {"name": None, "columns": []},
+        "foreign_keys": {},
+        "indexes": {},
+        "partition_by": None,
+    }
+
+
+def test_column_order_compared_when_declared() -> None:
+    """the column order only differs from the database's when the model declares it"""
+    model = table_schema("b", "a")
+    database = table_schema("a", "b")
+
+    assert not compare_table("t", model, database)
+    assert compare_table("t", model, database, ("b", "a")) == [
+        {
+            "table": "t",
+            "kind": "column_order",
+            "name": None,
+            "model": ["b", "a"],
+            "database": ["a", "b"],
+        }
+    ]
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        pytest.param([], id="declarative"),
+        pytest.param(["--generator", "tables"], id="tables"),
+        pytest.param(["--output-layout", "package"], id="package"),
+    ],
+)
+def test_generated_model_verifies(
+    make_config: ConfigFactory, database: List[str], args: List[str]
+) -> None:
+    """a freshly generated model matches the database it was generated from"""
+    config = make_config(*database, "--verify", *args)
+    run(config, steps_for(config))
+
+    with open(os.path.join(config.log_dir, "verify.json"), encoding="utf8") as fh:
+        report = json.load(fh)
+    assert report["ok"]
+    assert report["tables"] == 45
+
+
+def test_changed_column_order_is_reported(
+    make_config: ConfigFactory, database: List[str]
+) -> None:
+    """a Core table whose columns the database holds in another order differs"""
+    config = make_config(*database, "--verify", "--generator", "tables")
+    run(config, steps_for(config))
+    with get_engine(config).connect() as cnxn, cnxn.begin():
+        cnxn.exec_driver_sql("DROP TABLE cohort")
+        cnxn.exec_driver_sql(
+            "CREATE TABLE cohort (subject_id integer NOT NULL, "
+            "cohort_definition_id integer NOT NULL, "
+            "cohort_start_date varchar(30) NOT NULL, "
+            "cohort_end_date varchar(30) NOT NULL, "
+            "CONSTRAINT eh_composite_pk_cohort PRIMARY KEY (cohort_definition_id, "
+            "subject_id, cohort_start_date, cohort_end_date))"
+        )
+
+    with pytest.raises(ValueError, match="differs from the database in 1 places"):
+        run(config, steps_for(config))
+    with open(os.path.join(config.log_dir, "verify.json"), encoding="utf8") as fh:
+        assert json.load(fh)["differences"][0]["kind"] == "column_order"